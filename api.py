@@ -0,0 +1,235 @@
+"""
+Headless HTTP API for news search and post optimization.
+
+Runs the same core functions as the Streamlit pages (the shared news
+cache, DuckDuckGo client pool, Gemini model and response cache) without
+a script rerun per request:
+
+    uvicorn api:app --workers 1 --port 8000
+
+Endpoints (JSON in, JSON out):
+
+- GET  /health
+- GET  /news?topic=Technology&keywords=&region=wt-wt&time_filter=d&max_results=10
+- POST /posts/optimize  {"post_content", "target_audience", "theme", "tone", "hashtag_count", "hashtag_mode",
+                         "regenerate", "stream"}
+- POST /posts/edit      {"original_post", "optimized_post", "edit_instructions", ..., "session_id", "stream"}
+
+With "stream": true the post endpoints answer with newline-delimited JSON:
+{"delta": "..."} lines as Gemini generates (text to append), a
+{"replace": "..."} line when the text so far changes other than by
+appending (e.g. when hashtags are swapped in at the end), then one
+{"done": true, "content": ..., "timing": ...} line.
+"""
+import asyncio
+import json
+import os
+
+import anyio
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from ddgs_client import SearchUnavailableError, get_client
+from post_optimizer import DEFAULT_SETTINGS, HASHTAG_MODES, optimize_edited_post, optimize_instagram_post
+from searcher import MAX_RESULTS, MIN_RESULTS, NEWS_CACHE_TTLS, REGIONS, build_query, cached_news
+
+# Blocking calls (searches, Gemini generations) running at once; the rest wait for a slot
+API_WORKERS = int(os.getenv("THINKWHY_API_WORKERS", "64"))
+
+# Same bound as the post form's "Number of Hashtags" (results use the search page's MIN/MAX_RESULTS)
+MAX_HASHTAGS = 30
+
+_limiter = None
+
+
+class BadRequest(Exception):
+    """A request the API refuses with 400."""
+
+
+def limiter():
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(API_WORKERS)
+    return _limiter
+
+
+async def call_blocking(fn, *args, **kwargs):
+    """Run a blocking core function on a worker thread, at most API_WORKERS at a time."""
+    return await anyio.to_thread.run_sync(lambda: fn(*args, **kwargs), limiter=limiter())
+
+
+def error(status, message):
+    return JSONResponse({"error": message}, status_code=status)
+
+
+def _int(value, name, low, high):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be an integer")
+    if not low <= number <= high:
+        raise BadRequest(f"{name} must be between {low} and {high}")
+    return number
+
+
+def _region(value):
+    """Accept a DuckDuckGo region code ("us-en") or a region name from the search page ("United States")."""
+    if value in REGIONS:
+        return REGIONS[value]
+    if value in REGIONS.values():
+        return value
+    raise BadRequest(f"unknown region {value!r}")
+
+
+async def health(request):
+    return JSONResponse({"status": "ok", "duckduckgo": get_client().snapshot()})
+
+
+async def news(request):
+    params = request.query_params
+    try:
+        topic = params.get("topic", "").strip()
+        if not topic:
+            raise BadRequest("topic is required")
+        time_filter = params.get("time_filter", "d")
+        if time_filter not in NEWS_CACHE_TTLS:
+            raise BadRequest(f"time_filter must be one of {', '.join(NEWS_CACHE_TTLS)}")
+        region = _region(params.get("region", "wt-wt"))
+        max_results = _int(params.get("max_results", 10), "max_results", MIN_RESULTS, MAX_RESULTS)
+    except BadRequest as e:
+        return error(400, str(e))
+
+    try:
+        # What get_news does on the search page, with failures as HTTP errors instead of st.error
+        articles = await call_blocking(
+            cached_news, build_query(topic, params.get("keywords", "")), region, time_filter, max_results,
+            category=topic
+        )
+    except SearchUnavailableError as e:
+        return error(503, str(e))
+    except Exception as e:
+        return error(502, f"Error fetching news: {e}")
+    return JSONResponse({"count": len(articles), "articles": [article.to_dict() for article in articles]})
+
+
+async def _post_request(request, required):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise BadRequest("body must be JSON")
+    if not isinstance(body, dict):
+        raise BadRequest("body must be a JSON object")
+    for name in required:
+        if not str(body.get(name, "")).strip():
+            raise BadRequest(f"{name} is required")
+    settings = {name: body.get(name, default) for name, default in DEFAULT_SETTINGS.items()}
+    settings["hashtag_count"] = _int(settings["hashtag_count"], "hashtag_count", 1, MAX_HASHTAGS)
+    # Omitted means the server's default (post_optimizer.HASHTAG_MODE)
+    settings["hashtag_mode"] = body.get("hashtag_mode")
+    if settings["hashtag_mode"] is not None and settings["hashtag_mode"] not in HASHTAG_MODES:
+        raise BadRequest(f"hashtag_mode must be one of {', '.join(HASHTAG_MODES)}")
+    return body, settings
+
+
+async def generate(optimize, args, kwargs, stream):
+    """
+    Run an optimize function with timing, as JSON or as an NDJSON stream of deltas.
+
+    The generation runs on a worker thread; its on_chunk callback hands each
+    chunk to the event loop through a queue.
+    """
+    timing = {}
+    if not stream:
+        try:
+            content = await call_blocking(optimize, *args, timing=timing, raise_errors=True, **kwargs)
+        except Exception as e:
+            return error(502, f"Error: {e}")
+        return JSONResponse({"content": content, "timing": timing})
+
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+
+    def on_chunk(text):
+        loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+    async def body():
+        task = asyncio.ensure_future(
+            call_blocking(optimize, *args, on_chunk=on_chunk, timing=timing, raise_errors=True, **kwargs)
+        )
+        shown = ""
+
+        def update(text):
+            # Chunks normally extend the text so far; anything else (e.g. hashtags
+            # swapped in at the end) replaces what the client has
+            nonlocal shown
+            if text.startswith(shown):
+                line = _line({"delta": text[len(shown):]}) if len(text) > len(shown) else None
+            elif shown.startswith(text):
+                return None
+            else:
+                line = _line({"replace": text})
+            shown = text
+            return line
+
+        while True:
+            getter = asyncio.ensure_future(chunks.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                line = update(getter.result())
+                if line is not None:
+                    yield line
+                continue
+            getter.cancel()
+            # Chunks queued just before the task finished
+            while not chunks.empty():
+                line = update(chunks.get_nowait())
+                if line is not None:
+                    yield line
+            try:
+                content = task.result()
+            except Exception as e:
+                yield _line({"done": True, "error": f"Error: {e}"})
+                return
+            line = update(content)
+            if line is not None:
+                yield line
+            yield _line({"done": True, "content": content, "timing": timing})
+            return
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def _line(payload):
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+async def optimize(request):
+    try:
+        body, settings = await _post_request(request, ["post_content"])
+    except BadRequest as e:
+        return error(400, str(e))
+    args = [body["post_content"], settings["target_audience"], settings["theme"], settings["tone"],
+            settings["hashtag_count"]]
+    kwargs = {"regenerate": bool(body.get("regenerate")), "hashtag_mode": settings["hashtag_mode"]}
+    return await generate(optimize_instagram_post, args, kwargs, bool(body.get("stream")))
+
+
+async def edit(request):
+    try:
+        body, settings = await _post_request(request, ["original_post", "optimized_post", "edit_instructions"])
+    except BadRequest as e:
+        return error(400, str(e))
+    args = [body["original_post"], body["optimized_post"], body["edit_instructions"], settings["target_audience"],
+            settings["theme"], settings["tone"], settings["hashtag_count"]]
+    kwargs = {"regenerate": bool(body.get("regenerate")), "session_id": body.get("session_id"),
+              "hashtag_mode": settings["hashtag_mode"]}
+    return await generate(optimize_edited_post, args, kwargs, bool(body.get("stream")))
+
+
+app = Starlette(routes=[
+    Route("/health", health),
+    Route("/news", news),
+    Route("/posts/optimize", optimize, methods=["POST"]),
+    Route("/posts/edit", edit, methods=["POST"])
+])
@@ -0,0 +1,246 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from article import Article
+from cache import CACHE_DIR
+
+# Location of the local article archive (override with THINKWHY_ARCHIVE_PATH)
+ARCHIVE_PATH = os.getenv("THINKWHY_ARCHIVE_PATH", os.path.join(CACHE_DIR, "archive.sqlite3"))
+
+# The writer thread commits whenever this many rows are queued or FLUSH_INTERVAL passes
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 1.0
+
+# BM25 column weights for (title, body, source)
+BM25_WEIGHTS = (10.0, 1.0, 2.0)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE NOT NULL,
+    title TEXT,
+    body TEXT,
+    source TEXT,
+    image TEXT,
+    date TEXT,
+    ts REAL,
+    region TEXT,
+    category TEXT,
+    first_seen REAL,
+    last_seen REAL
+);
+CREATE INDEX IF NOT EXISTS articles_ts ON articles (ts);
+CREATE INDEX IF NOT EXISTS articles_source ON articles (source);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, body, source, content='articles', content_rowid='id'
+);
+
+-- Keep the external-content FTS index in sync with the articles table
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts (rowid, title, body, source) VALUES (new.id, new.title, new.body, new.source);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, body, source)
+    VALUES ('delete', old.id, old.title, old.body, old.source);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE OF title, body, source ON articles BEGIN
+    INSERT INTO articles_fts (articles_fts, rowid, title, body, source)
+    VALUES ('delete', old.id, old.title, old.body, old.source);
+    INSERT INTO articles_fts (rowid, title, body, source) VALUES (new.id, new.title, new.body, new.source);
+END;
+"""
+
+UPSERT = """
+INSERT INTO articles (url, title, body, source, image, date, ts, region, category, first_seen, last_seen)
+VALUES (:url, :title, :body, :source, :image, :date, :ts, :region, :category, :seen, :seen)
+ON CONFLICT (url) DO UPDATE SET
+    title = excluded.title,
+    body = excluded.body,
+    source = excluded.source,
+    image = COALESCE(excluded.image, articles.image),
+    date = excluded.date,
+    ts = excluded.ts,
+    region = COALESCE(articles.region, excluded.region),
+    category = COALESCE(articles.category, excluded.category),
+    last_seen = excluded.last_seen
+"""
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query that matches every word (as a prefix)."""
+    words = [w for w in text.replace('"', " ").split() if w]
+    return " ".join(f'"{w}"*' for w in words)
+
+
+class NewsArchive:
+    """
+    Local SQLite archive of every article the app has fetched, with FTS5 search.
+
+    ingest() only queues rows. A background writer thread upserts them in
+    batches, so archiving adds almost nothing to the search path.
+    """
+
+    def __init__(self, path=ARCHIVE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._db.commit()
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "write_errors": 0}
+        self._writer = threading.Thread(target=self._write_loop, name="archive-writer", daemon=True)
+        self._writer.start()
+
+    def ingest(self, articles, region=None, category=None):
+        """Queue articles for upsert into the archive. Returns immediately."""
+        seen = time.time()
+        count = 0
+        for article in articles:
+            if not article.url:
+                continue
+            self._queue.put({
+                "url": article.url,
+                "title": article.title,
+                "body": article.body,
+                "source": article.source,
+                "image": article.image or None,
+                "date": article.date,
+                "ts": article.timestamp,
+                "region": region,
+                "category": category,
+                "seen": seen
+            })
+            count += 1
+        with self._lock:
+            self.stats["queued"] += count
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL
+            while len(batch) < BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        rows = [row for row in batch if row is not None]
+        if not rows:
+            return
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.executemany(UPSERT, rows)
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+            except sqlite3.Error:
+                self.stats["write_errors"] += 1
+
+    def flush(self):
+        """Block until every queued article has been written."""
+        # A sentinel wakes the writer so it does not wait out FLUSH_INTERVAL
+        self._queue.put(None)
+        self._queue.join()
+
+    def search(self, text="", since=None, until=None, sources=None, limit=50):
+        """
+        Search the archive, best BM25 match first (newest first when text is empty).
+
+        since/until are datetimes and sources is a list of source names.
+        Returns Article records (with their region), ranked as above.
+        """
+        where = []
+        params = []
+        match = fts_query(text)
+        if match:
+            sql = (
+                "SELECT a.*, bm25(articles_fts, ?, ?, ?) AS rank "
+                "FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid"
+            )
+            params.extend(BM25_WEIGHTS)
+            where.append("articles_fts MATCH ?")
+            params.append(match)
+            order = "rank"
+        else:
+            sql = "SELECT a.*, NULL AS rank FROM articles a"
+            order = "a.ts DESC"
+        if since is not None:
+            where.append("a.ts >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            where.append("a.ts < ?")
+            params.append(until.timestamp())
+        if sources:
+            where.append(f"a.source IN ({', '.join('?' for _ in sources)})")
+            params.extend(sources)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order} LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [
+            Article(
+                row["title"] or "",
+                row["url"],
+                row["source"] or "Unknown source",
+                body=row["body"] or "",
+                image=row["image"] or "",
+                date=row["date"] or "",
+                timestamp=row["ts"],
+                region=row["region"]
+            )
+            for row in rows
+        ]
+
+    def texts(self, limit=5000):
+        """Return (title, body, category) of the most recently seen articles, for the hashtag index."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT title, body, category FROM articles ORDER BY last_seen DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row[0] or "", row[1] or "", row[2]) for row in rows]
+
+    def top_sources(self, limit=200):
+        """Return the most frequent sources, for filter widgets."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT source FROM articles WHERE source IS NOT NULL "
+                "GROUP BY source ORDER BY COUNT(*) DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def snapshot(self):
+        """Return ingestion counters plus the archive size."""
+        with self._lock:
+            total = self._db.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            stats = dict(self.stats)
+        return dict(stats, articles=total, pending=self._queue.qsize())
+
+
+def get_archive():
+    """Return the process-wide news archive."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = NewsArchive()
+        return _instance
@@ -0,0 +1,110 @@
+import datetime
+import sys
+
+from dedup import canonicalize_url
+
+# How cards show publication dates
+DISPLAY_DATE_FORMAT = "%b %d, %Y • %I:%M %p"
+
+
+def parse_date(date):
+    """Return the POSIX timestamp of an ISO 8601 date string, or None if it isn't one."""
+    try:
+        return datetime.datetime.fromisoformat(date.replace('Z', '+00:00')).timestamp()
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+class Article:
+    """
+    One news article, normalized when it is fetched.
+
+    Built from a DuckDuckGo result dict with from_dict(). The publication
+    date is parsed once into timestamp and display_date, the URL is
+    canonicalized once and the source name is interned, so cached result
+    sets are compact and reruns only read attributes. Records are shared
+    between sessions through the cache: use replace() instead of mutating.
+    """
+
+    __slots__ = ("title", "url", "source", "body", "image", "timestamp", "display_date", "canonical_url",
+                 "region", "alternates", "_raw_date")
+
+    def __init__(self, title, url, source, body="", image="", date="", timestamp=None, region=None,
+                 alternates=()):
+        self.title = title
+        self.url = url
+        self.source = sys.intern(source)
+        self.body = body
+        self.image = image
+        self.timestamp = parse_date(date) if timestamp is None else timestamp
+        # The ISO string is rebuilt from timestamp on demand; only unparseable dates are kept as given
+        self._raw_date = date if self.timestamp is None else None
+        if self.timestamp is not None:
+            # DuckDuckGo dates are UTC, and cards show them as such
+            self.display_date = datetime.datetime.fromtimestamp(self.timestamp, datetime.timezone.utc).strftime(
+                DISPLAY_DATE_FORMAT
+            )
+        else:
+            self.display_date = date or "Unknown date"
+        canonical = canonicalize_url(url)
+        # Share the URL string when canonicalizing changes nothing
+        self.canonical_url = url if canonical == url else canonical
+        self.region = region
+        self.alternates = alternates
+
+    @classmethod
+    def from_dict(cls, article):
+        """Normalize a DuckDuckGo result dict."""
+        return cls(
+            article.get("title") or "",
+            article.get("url") or "",
+            article.get("source") or "Unknown source",
+            body=article.get("body") or "",
+            image=article.get("image") or "",
+            date=article.get("date") or "",
+            region=article.get("region"),
+            alternates=article.get("alternates") or ()
+        )
+
+    @property
+    def date(self):
+        """The publication date as an ISO 8601 string (as DuckDuckGo sends it)."""
+        if self.timestamp is None:
+            return self._raw_date
+        return datetime.datetime.fromtimestamp(self.timestamp, datetime.timezone.utc).isoformat()
+
+    def replace(self, **changes):
+        """Return a copy with some fields changed (e.g. region or alternates)."""
+        copy = object.__new__(Article)
+        for name in Article.__slots__:
+            setattr(copy, name, changes[name] if name in changes else getattr(self, name))
+        return copy
+
+    def to_dict(self):
+        """The article as a DuckDuckGo-style dict (for JSON responses)."""
+        article = {
+            "date": self.date,
+            "title": self.title,
+            "body": self.body,
+            "url": self.url,
+            "image": self.image,
+            "source": self.source
+        }
+        if self.region is not None:
+            article["region"] = self.region
+        if self.alternates:
+            article["alternates"] = list(self.alternates)
+        return article
+
+    def __reduce__(self):
+        # Only the fetched fields are pickled; the derived ones are rebuilt (without date parsing) on load
+        return Article, (self.title, self.url, self.source, self.body, self.image, self._raw_date or "",
+                         self.timestamp, self.region, self.alternates)
+
+    def __repr__(self):
+        return f"Article({self.title!r}, {self.url!r}, {self.source!r})"
+
+
+def normalize(articles):
+    """Turn DuckDuckGo result dicts into Article records."""
+    return [Article.from_dict(article) for article in articles]
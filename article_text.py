@@ -0,0 +1,284 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from cache import get_cache, make_key
+from tracing import span
+
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = (3, 8)  # (connect, read) seconds
+
+# Requests to the same site at once; the rest of the pool keeps working on other hosts
+PER_HOST_LIMIT = 2
+
+# Pages larger than this are not read any further
+MAX_PAGE_BYTES = 3 * 1024 * 1024
+
+# Extracted text is cached for this long; pages that fail are not retried for FAILURE_TTL
+TEXT_TTL = 7 * 24 * 60 * 60
+FAILURE_TTL = 15 * 60
+
+# Paragraphs shorter than this are mostly bylines, captions and buttons
+MIN_PARAGRAPH_CHARS = 40
+
+# Text handed to the post optimizer is cut at a paragraph boundary past this length
+MAX_POST_CHARS = 4000
+
+# Elements whose text is never article text
+SKIPPED_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "aside", "form", "figure", "svg",
+                "button", "template"}
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class _ParagraphParser(HTMLParser):
+    """Collects <p> text, separately for paragraphs inside <article> elements."""
+
+    def __init__(self):
+        super().__init__()
+        self.paragraphs = []
+        self.article_paragraphs = []
+        self._skip_depth = 0
+        self._article_depth = 0
+        self._paragraph = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "article":
+            self._article_depth += 1
+        elif tag == "p" and not self._skip_depth:
+            self._end_paragraph()
+            self._paragraph = []
+        elif tag == "br" and self._paragraph is not None:
+            self._paragraph.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "article":
+            self._end_paragraph()
+            self._article_depth = max(0, self._article_depth - 1)
+        elif tag == "p":
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self._paragraph is not None and not self._skip_depth:
+            self._paragraph.append(data)
+
+    def _end_paragraph(self):
+        if self._paragraph is None:
+            return
+        text = " ".join("".join(self._paragraph).split())
+        self._paragraph = None
+        if len(text) >= MIN_PARAGRAPH_CHARS:
+            self.paragraphs.append(text)
+            if self._article_depth:
+                self.article_paragraphs.append(text)
+
+
+def extract_text(html):
+    """Return the main text of an article page as paragraphs separated by blank lines ("" if none)."""
+    parser = _ParagraphParser()
+    parser.feed(html)
+    parser.close()
+    parser._end_paragraph()
+    # Prefer the <article> element when the page marks one up with real text in it
+    article = "\n\n".join(parser.article_paragraphs)
+    if len(article) >= 3 * MIN_PARAGRAPH_CHARS:
+        return article
+    return "\n\n".join(parser.paragraphs)
+
+
+def post_from_article(article, text=None):
+    """The post content for an article: its title, its text (or the search snippet) and a link."""
+    text = text or article.body
+    if len(text) > MAX_POST_CHARS:
+        cut = text.rfind("\n\n", 0, MAX_POST_CHARS)
+        text = text[:cut if cut > 0 else MAX_POST_CHARS]
+    return f"{article.title}\n\n{text}\n\nSource: {article.source} ({article.url})"
+
+
+class ArticleTextFetcher:
+    """
+    Fetches article pages and extracts their text, concurrently and in the background.
+
+    One pooled HTTP session serves every fetch, with at most PER_HOST_LIMIT
+    requests per site at a time. Fetches wait in a queue until their site
+    has a free slot, so pool workers never sit blocked on a busy site, and
+    get() moves its page to the front of the queue ahead of prefetches.
+    Extracted text goes to the shared "article_text" cache, so a page is
+    fetched once per TEXT_TTL whichever session asks, and concurrent
+    requests for the same page share one fetch.
+    """
+
+    def __init__(self, workers=FETCH_WORKERS, per_host=PER_HOST_LIMIT):
+        # requests is imported here rather than at module level to keep app start-up light
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (compatible; ThinkWhyNewsAgent/1.0)"
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="article-text")
+        self.cache = get_cache("article_text", max_entries=512)
+        self.workers = workers
+        self.per_host = per_host
+
+        # Reentrant: waking a waiter on a finished fetch can run code that submits again
+        self._lock = threading.RLock()
+        # url -> Future, for fetches that are queued or running
+        self._pending = {}
+        # Queued urls in the order they will start, and fetches running per host
+        self._queue = []
+        self._running = {}
+        self.stats = {"prefetched": 0, "fetched": 0, "failed": 0, "bytes_downloaded": 0, "waited": 0,
+                      "wait_timeouts": 0}
+
+    def _count(self, stat, amount=1):
+        with self._lock:
+            self.stats[stat] += amount
+
+    def _download(self, url):
+        with self.session.get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            if "html" not in response.headers.get("Content-Type", "html"):
+                raise ValueError("not an HTML page")
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > MAX_PAGE_BYTES:
+                    break
+            # Without a charset header requests assumes Latin-1, but pages are almost always UTF-8
+            encoding = response.encoding if "charset" in response.headers.get("Content-Type", "").lower() else "utf-8"
+        self._count("bytes_downloaded", len(data))
+        return bytes(data).decode(encoding, errors="replace")
+
+    def _fetch(self, url):
+        with span("article.fetch"):
+            text = extract_text(self._download(url))
+        if not text:
+            raise ValueError("no article text found")
+        self._count("fetched")
+        return text
+
+    def load(self, url):
+        """Return the article text for url, fetching it if needed ("" when the page has none or fails)."""
+        key = make_key("text", url)
+        try:
+            return self.cache.get_or_fetch(key, lambda: self._fetch(url), TEXT_TTL)
+        except Exception:
+            self._count("failed")
+            # Remember the failure briefly so every rerun does not hit the site again
+            self.cache.set(key, "", FAILURE_TTL)
+            return ""
+
+    def cached(self, url):
+        """Return the cached text for url ("" for a known failure), or None if it has not been fetched."""
+        value, state = self.cache.lookup(make_key("text", url))
+        return value if state is not None else None
+
+    def _submit(self, url, urgent=False):
+        # Caller must hold the lock
+        future = self._pending.get(url)
+        if future is None:
+            future = self._pending[url] = Future()
+        elif url not in self._queue or not urgent:
+            return future
+        else:
+            self._queue.remove(url)
+        if urgent:
+            self._queue.insert(0, url)
+        else:
+            self._queue.append(url)
+        self._dispatch()
+        return future
+
+    def _dispatch(self):
+        # Caller must hold the lock. Starts queued fetches, in queue order, while
+        # a worker is idle and their host is under per_host
+        position = 0
+        while position < len(self._queue) and sum(self._running.values()) < self.workers:
+            url = self._queue[position]
+            host = urlsplit(url).netloc.lower()
+            if self._running.get(host, 0) >= self.per_host:
+                position += 1
+                continue
+            del self._queue[position]
+            self._running[host] = self._running.get(host, 0) + 1
+            self.executor.submit(self._run, url, host)
+
+    def _run(self, url, host):
+        try:
+            text, error = self.load(url), None
+        except Exception as e:
+            text, error = None, e
+        with self._lock:
+            future = self._pending.pop(url)
+            self._running[host] -= 1
+            if not self._running[host]:
+                del self._running[host]
+            self._dispatch()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(text)
+
+    def prefetch(self, urls):
+        """Start fetching the text of urls in the background, skipping ones already cached or in flight."""
+        for url in urls:
+            if not url or url.startswith("#"):
+                continue
+            with self._lock:
+                if url in self._pending:
+                    continue
+            if self.cached(url) is not None:
+                continue
+            with self._lock:
+                self._submit(url)
+                self.stats["prefetched"] += 1
+
+    def get(self, url, timeout=None):
+        """
+        Return the article text for url: cached, or from a fetch (running or
+        new) that finishes within timeout seconds. None if it does not.
+        """
+        text = self.cached(url)
+        if text is not None:
+            return text
+        with self._lock:
+            future = self._submit(url, urgent=True)
+        self._count("waited")
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            self._count("wait_timeouts")
+            return None
+
+    def snapshot(self):
+        """Return counters plus how many fetches are queued or running."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._pending)
+        return stats
+
+
+def get_text_fetcher():
+    """Return the process-wide article text fetcher."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = ArticleTextFetcher()
+        return _instance
+
+
+def set_text_fetcher(fetcher):
+    """Replace the process-wide fetcher (e.g. with one built on a stand-in); returns the previous one."""
+    global _instance
+    with _instance_lock:
+        previous, _instance = _instance, fetcher
+        return previous
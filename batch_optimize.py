@@ -0,0 +1,274 @@
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from post_optimizer import DEFAULT_SETTINGS, optimize_instagram_post
+from rate_limit import TokenBucket
+
+# Posts optimized at the same time
+BATCH_WORKERS = 4
+
+# Gemini quota for the whole run (defaults match the gemini-2.0-flash free tier)
+REQUESTS_PER_MINUTE = 15
+TOKENS_PER_MINUTE = 1_000_000
+
+# Each bucket can burst this many seconds' worth of its budget
+BURST_SECONDS = 10
+
+# Token estimate per request: the prompt (template plus post) and a 3-4 paragraph answer
+CHARS_PER_TOKEN = 4
+PROMPT_TEMPLATE_TOKENS = 200
+OUTPUT_TOKEN_ESTIMATE = 600
+
+# Retries with full-jitter exponential backoff
+MAX_RETRIES = 4
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# Accepted column names for each field, in order of preference
+FIELD_ALIASES = {
+    "post_content": ("post_content", "post", "content", "text"),
+    "target_audience": ("target_audience", "audience"),
+    "theme": ("theme",),
+    "tone": ("tone",),
+    "hashtag_count": ("hashtag_count", "hashtags")
+}
+
+
+def _field(row, name):
+    for alias in FIELD_ALIASES[name]:
+        value = row.get(alias)
+        if value not in (None, ""):
+            return value
+    return DEFAULT_SETTINGS.get(name, "")
+
+
+def read_items(path):
+    """
+    Read posts and their settings from a CSV or JSONL file.
+
+    Each row needs a post (post_content/post/content/text column) and may set
+    target_audience, theme, tone, hashtag_count and id; ids default to the row number.
+    Rows that cannot be used (unparseable JSON, no post, a hashtag_count that is
+    not a number) are kept with an error, so they are reported instead of
+    stopping the batch.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            rows = []
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError as e:
+                    # Kept in place of the row and reported like a failed post
+                    rows.append(e)
+        else:
+            rows = list(csv.DictReader(f))
+    items = []
+    for number, row in enumerate(rows, start=1):
+        error = None
+        if not isinstance(row, dict):
+            error = f"invalid JSON: {row}" if isinstance(row, ValueError) else "row is not a JSON object"
+            row = {}
+        item = {
+            "id": str(row.get("id") or number),
+            "post_content": str(_field(row, "post_content")),
+            "target_audience": _field(row, "target_audience"),
+            "theme": _field(row, "theme"),
+            "tone": _field(row, "tone"),
+            "hashtag_count": DEFAULT_SETTINGS["hashtag_count"]
+        }
+        count = _field(row, "hashtag_count")
+        try:
+            item["hashtag_count"] = int(str(count).strip() or DEFAULT_SETTINGS["hashtag_count"])
+        except ValueError:
+            error = error or f"invalid hashtag_count {count!r}"
+        if error:
+            item["error"] = error
+        items.append(item)
+    return items
+
+
+def completed_ids(path):
+    """Return the ids already optimized successfully in an earlier run's output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A crash can leave a half-written last line
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+def estimate_tokens(item):
+    """Rough Gemini token cost of optimizing one item, for the tokens-per-minute budget."""
+    return PROMPT_TEMPLATE_TOKENS + len(item["post_content"]) // CHARS_PER_TOKEN + OUTPUT_TOKEN_ESTIMATE
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+class BatchOptimizer:
+    """
+    Optimizes many posts with bounded concurrency inside Gemini's rate limits.
+
+    Every attempt spends one token from a requests-per-minute bucket and its
+    estimated size from a tokens-per-minute bucket before it is sent. Failed
+    attempts are retried with jittered backoff. Results are handed to the
+    caller as they complete, so they can be written out (and checkpointed)
+    one at a time.
+    """
+
+    def __init__(self, workers=BATCH_WORKERS, requests_per_minute=REQUESTS_PER_MINUTE,
+                 tokens_per_minute=TOKENS_PER_MINUTE, max_retries=MAX_RETRIES, regenerate=False,
+                 optimize=optimize_instagram_post):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.regenerate = regenerate
+        self.optimize = optimize
+        self.requests = TokenBucket(requests_per_minute / 60.0, max(1.0, requests_per_minute * BURST_SECONDS / 60.0))
+        self.tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute * BURST_SECONDS / 60.0)
+        self._lock = threading.Lock()
+
+    def _acquire_budget(self, item):
+        self.requests.acquire()
+        # A request bigger than the whole burst waits for a full bucket instead of forever
+        self.tokens.acquire(min(estimate_tokens(item), self.tokens.capacity))
+
+    def process(self, item):
+        """Optimize one item, retrying failures. Returns its result record."""
+        record = {"id": item["id"], "status": "error", "retries": 0}
+        if item.get("error"):
+            record["error"] = item["error"]
+            return record
+        if not item["post_content"].strip():
+            record["error"] = "empty post"
+            return record
+
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            self._acquire_budget(item)
+            timing = {}
+            try:
+                output = self.optimize(
+                    item["post_content"],
+                    item["target_audience"],
+                    item["theme"],
+                    item["tone"],
+                    item["hashtag_count"],
+                    regenerate=self.regenerate,
+                    timing=timing,
+                    raise_errors=True
+                )
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    record["error"] = str(e)
+                    break
+                attempt += 1
+                record["retries"] = attempt
+                time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+                continue
+            record.update({
+                "status": "ok",
+                "output": output,
+                "ttft_ms": timing.get("ttft_ms"),
+                "cached": timing.get("cached", False)
+            })
+            break
+        record["latency_ms"] = round((time.perf_counter() - start) * 1000)
+        return record
+
+    def run(self, items):
+        """Optimize items concurrently, yielding each result record as it completes."""
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="optimize") as executor:
+            futures = [executor.submit(self.process, item) for item in items]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def summarize(records, skipped, elapsed):
+    """Build the run summary: counts, throughput, latency percentiles and per-item details."""
+    finished = [r for r in records if r["status"] == "ok"]
+    latencies = [r["latency_ms"] for r in records if "latency_ms" in r]
+    ttfts = [r["ttft_ms"] for r in finished if not r.get("cached")]
+    return {
+        "items": len(records),
+        "succeeded": len(finished),
+        "failed": len(records) - len(finished),
+        "skipped_from_checkpoint": skipped,
+        "cached": sum(1 for r in finished if r.get("cached")),
+        "retries": sum(r["retries"] for r in records),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_per_minute": round(len(finished) / elapsed * 60, 2) if elapsed > 0 else None,
+        "latency_p50_ms": _percentile(latencies, 0.5),
+        "latency_p95_ms": _percentile(latencies, 0.95),
+        "latency_max_ms": max(latencies) if latencies else None,
+        "ttft_p50_ms": _percentile(ttfts, 0.5),
+        "per_item": [
+            {"id": r["id"], "status": r["status"], "latency_ms": r.get("latency_ms"), "retries": r["retries"]}
+            for r in records
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimize a batch of Instagram posts from a CSV or JSONL file.")
+    parser.add_argument("input", help="CSV or JSONL file with a post column plus optional target_audience, "
+                                      "theme, tone, hashtag_count and id")
+    parser.add_argument("-o", "--output", required=True,
+                        help="JSONL file results are appended to; doubles as the checkpoint")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="posts optimized at the same time")
+    parser.add_argument("--rpm", type=float, default=REQUESTS_PER_MINUTE, help="Gemini requests per minute")
+    parser.add_argument("--tpm", type=float, default=TOKENS_PER_MINUTE, help="Gemini tokens per minute")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="retries per post after a failure")
+    parser.add_argument("--regenerate", action="store_true", help="skip the response cache")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    args = parser.parse_args()
+
+    items = read_items(args.input)
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    done = completed_ids(args.output)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"{len(pending)} posts to optimize ({len(items) - len(pending)} already done)", file=sys.stderr)
+
+    optimizer = BatchOptimizer(
+        workers=args.workers,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=args.retries,
+        regenerate=args.regenerate
+    )
+    records = []
+    start = time.perf_counter()
+    with open(args.output, "a", encoding="utf-8") as out:
+        for record in optimizer.run(pending):
+            # One flushed line per post: a crash loses at most the posts still in flight
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            records.append(record)
+            print(f"[{len(records)}/{len(pending)}] {record['id']}: {record['status']} "
+                  f"in {record.get('latency_ms')} ms, {record['retries']} retries", file=sys.stderr)
+
+    print(json.dumps(summarize(records, len(items) - len(pending), time.perf_counter() - start), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Throughput benchmark for the HTTP API (api.py), optionally next to the
+Streamlit front end doing the same searches.
+
+The API runs under uvicorn in a child process with the DuckDuckGo and
+Gemini stand-ins from benchmarks/fakes.py. Client threads send requests
+back to back (no think time), with one keep-alive connection per thread,
+for each concurrency level and scenario:
+
+- news: GET /news over the popular categories and regions (mostly cache hits after the first pass)
+- optimize: POST /posts/optimize, 80% new posts
+- stream: POST /posts/optimize with "stream": true; time to first delta and to the final line
+
+--compare-streamlit runs the news scenario through the Streamlit page as
+well (one websocket session per client, see benchmarks/load.py).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load import CATEGORY_WEIGHTS, POPULAR_REGIONS, POSTS, Level, User, free_port, start_server  # noqa: E402
+from stats import git_revision, summarize  # noqa: E402
+
+SCENARIOS = ["news", "optimize", "stream"]
+SERVER_START_TIMEOUT = 60
+
+
+def start_api(args):
+    """Launch uvicorn with the fake backends in a child process; returns (process, base url)."""
+    port = free_port()
+    env = dict(os.environ, THINKWHY_CACHE_DIR=tempfile.mkdtemp(prefix="thinkwhy-api-"), GEMINI_API_KEY="benchmark")
+    command = [sys.executable, os.path.abspath(__file__), "--serve", str(port),
+               "--ddg-latency-ms", str(args.ddg_latency_ms), "--gemini-ttft-ms", str(args.gemini_ttft_ms),
+               "--gemini-chunk-ms", str(args.gemini_chunk_ms)]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited: {process.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            with urllib.request.urlopen(f"{base}/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, base
+        except OSError:
+            time.sleep(0.3)
+    process.kill()
+    raise RuntimeError("API did not become healthy in time")
+
+
+def serve(args):
+    """Child process: install the stand-ins and serve api.app."""
+    import fakes
+    import uvicorn
+
+    fakes.install(
+        ddgs_profile=fakes.LatencyProfile(args.ddg_latency_ms, args.ddg_latency_ms * 0.4, seed=1),
+        gemini_profile=fakes.LatencyProfile(args.gemini_ttft_ms, args.gemini_ttft_ms * 0.3, seed=2),
+        chunk_ms=args.gemini_chunk_ms
+    )
+    import api
+
+    uvicorn.run(api.app, host="127.0.0.1", port=args.serve, log_level="warning", access_log=False)
+
+
+def news_request(session, base, rng):
+    import searcher
+
+    regions = list(POPULAR_REGIONS)
+    params = {
+        "topic": rng.choices(searcher.NEWS_AREAS, CATEGORY_WEIGHTS)[0],
+        "region": rng.choices(regions, list(POPULAR_REGIONS.values()))[0],
+        "max_results": 10
+    }
+    response = session.get(f"{base}/news", params=params, timeout=60)
+    return response.status_code == 200, None
+
+
+def _post_body(rng, stream):
+    post = rng.choice(POSTS)
+    if rng.random() < 0.8:
+        post += f" #{uuid.uuid4().hex[:6]}"
+    return {"post_content": post, "tone": rng.choice(["Friendly", "Casual", "Professional"]), "stream": stream}
+
+
+def optimize_request(session, base, rng):
+    response = session.post(f"{base}/posts/optimize", json=_post_body(rng, False), timeout=120)
+    return response.status_code == 200, None
+
+
+def stream_request(session, base, rng):
+    start = time.perf_counter()
+    first_delta_ms = None
+    ok = False
+    with session.post(f"{base}/posts/optimize", json=_post_body(rng, True), stream=True, timeout=120) as response:
+        for line in response.iter_lines():
+            if not line:
+                continue
+            message = json.loads(line)
+            if first_delta_ms is None and "delta" in message:
+                first_delta_ms = (time.perf_counter() - start) * 1000
+            if message.get("done"):
+                ok = "error" not in message
+    return ok and response.status_code == 200, first_delta_ms
+
+
+REQUESTS = {"news": news_request, "optimize": optimize_request, "stream": stream_request}
+
+
+def run_api_level(base, scenario, clients, duration, seed):
+    import requests
+
+    latencies, first_deltas = [], []
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(number):
+        rng = random.Random(seed * 1000 + number)
+        with requests.Session() as session:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    ok, first_delta_ms = REQUESTS[scenario](session, base, rng)
+                except Exception:
+                    ok, first_delta_ms = False, None
+                ms = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(ms)
+                    counts["ok" if ok else "failed"] += 1
+                    if first_delta_ms is not None:
+                        first_deltas.append(first_delta_ms)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = counts["ok"] + counts["failed"]
+    report = {
+        "clients": clients,
+        "requests": total,
+        "requests_per_second": round(total / elapsed, 1),
+        "error_rate": round(counts["failed"] / total, 4) if total else 1.0,
+        "latency_ms": summarize(latencies)
+    }
+    if first_deltas:
+        report["first_delta_ms"] = summarize(first_deltas)
+    return report
+
+
+def run_streamlit_level(url, clients, duration, seed):
+    """The news scenario through the Streamlit page: back-to-back searches per session."""
+    options = argparse.Namespace(seed=seed, step_timeout=60, think_ms=0)
+    level = Level(clients)
+
+    async def client(number, deadline):
+        user = User(number, url, options, level)
+        await user.session.connect()
+        try:
+            while time.monotonic() < deadline:
+                await user.search()
+        finally:
+            await user.session.close()
+
+    async def run():
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(client(n, deadline) for n in range(clients)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    report = level.report(time.perf_counter() - start, None)
+    return {
+        "clients": clients,
+        "requests": report["requests"],
+        "requests_per_second": report["requests_per_second"],
+        "error_rate": report["error_rate"],
+        "latency_ms": report["latency_ms"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API throughput with fake backends.")
+    parser.add_argument("--clients", default="1,8,32,64", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level and scenario")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--compare-streamlit", action="store_true",
+                        help="also run the news scenario through the Streamlit page (needs websockets)")
+    parser.add_argument("--ddg-latency-ms", type=float, default=250)
+    parser.add_argument("--gemini-ttft-ms", type=float, default=600)
+    parser.add_argument("--gemini-chunk-ms", type=float, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    levels = [int(n) for n in args.clients.split(",")]
+    results = {}
+    process, base = start_api(args)
+    try:
+        for scenario in args.scenarios:
+            results[f"api.{scenario}"] = []
+            for clients in levels:
+                report = run_api_level(base, scenario, clients, args.duration, args.seed)
+                results[f"api.{scenario}"].append(report)
+                print(f"api {scenario:9} {clients:4} clients: {report['requests_per_second']:8.1f} req/s, "
+                      f"p95 {report['latency_ms'].get('p95', 0):7.0f} ms, errors {report['error_rate']:.1%}",
+                      file=sys.stderr)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    if args.compare_streamlit:
+        load_args = argparse.Namespace(ddg_latency_ms=args.ddg_latency_ms, gemini_ttft_ms=args.gemini_ttft_ms,
+                                       gemini_chunk_ms=args.gemini_chunk_ms, error_rate=0.0, recording=None,
+                                       throttled=False)
+        process, url = start_server(load_args)
+        try:
+            results["streamlit.news"] = []
+            for clients in levels:
+                report = run_streamlit_level(url, clients, args.duration, args.seed)
+                results["streamlit.news"].append(report)
+                print(f"streamlit news      {clients:4} clients: {report['requests_per_second']:8.1f} req/s, "
+                      f"p95 {report['latency_ms'].get('p95', 0):7.0f} ms, errors {report['error_rate']:.1%}",
+                      file=sys.stderr)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "config": {name: value for name, value in vars(args).items() if name not in ("output", "serve")},
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Microbenchmark: raw DuckDuckGo result dicts vs Article records (article.py).
+
+For result sets of each size, built from benchmarks/fakes.py rows:
+
+- memory: tracemalloc size of --sets cached result sets, as loaded back from
+  the cache's disk tier (pickle), and their pickled size
+- rerun: CPU to prepare every card of one result set for rendering, as the
+  search page does on each rerun (dicts: .get() per field plus date parsing
+  and formatting; records: attribute reads)
+- sort: ordering a result set newest first (dicts parse every date)
+- normalize: the one-time cost of turning a result set into records
+"""
+import argparse
+import datetime
+import json
+import os
+import pickle
+import sys
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+from article import normalize  # noqa: E402
+
+RESULT_COUNTS = [10, 30, 100]
+
+
+def ddgs_dicts(count, seed):
+    """Result dicts shaped like DDGS.news() output, decoded from JSON like the real ones."""
+    return json.loads(json.dumps([
+        {
+            "date": datetime.datetime.fromtimestamp(row["date"], datetime.timezone.utc).isoformat(),
+            "title": row["title"],
+            "body": row["excerpt"],
+            "url": row["url"],
+            "image": row["image"],
+            "source": row["source"]
+        }
+        for row in fakes.make_articles(f"records {seed}", count=count, seed=seed)
+    ]))
+
+
+def dict_card(article):
+    """What render_article did per card before records: five lookups and a date parse."""
+    title = article.get("title", "No title")
+    url = article.get("url", "#")
+    source = article.get("source", "Unknown source")
+    date = article.get("date", "Unknown date")
+    body = article.get("body", "No description available")
+    try:
+        date = datetime.datetime.fromisoformat(date.replace('Z', '+00:00')).strftime("%b %d, %Y • %I:%M %p")
+    except ValueError:
+        pass
+    return title, url, source, date, body
+
+
+def record_card(article):
+    return article.title or "No title", article.url or "#", article.source, article.display_date, article.body
+
+
+def dict_sort_key(article):
+    try:
+        return datetime.datetime.fromisoformat(article.get("date", "").replace('Z', '+00:00')).timestamp()
+    except (ValueError, AttributeError):
+        return float("-inf")
+
+
+def record_sort_key(article):
+    return article.timestamp if article.timestamp is not None else float("-inf")
+
+
+def traced_kb(build):
+    tracemalloc.start()
+    try:
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return round(size / 1024, 1)
+
+
+def per_call_us(fn, number):
+    return round(min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6, 2)
+
+
+def bench(count, sets, number):
+    dict_sets = [ddgs_dicts(count, seed) for seed in range(sets)]
+    record_sets = [normalize(articles) for articles in dict_sets]
+    dict_blobs = [pickle.dumps(articles, protocol=pickle.HIGHEST_PROTOCOL) for articles in dict_sets]
+    record_blobs = [pickle.dumps(articles, protocol=pickle.HIGHEST_PROTOCOL) for articles in record_sets]
+    dicts, records = dict_sets[0], record_sets[0]
+    return {
+        "memory_kb_per_set": {
+            "dicts": round(traced_kb(lambda: [pickle.loads(blob) for blob in dict_blobs]) / sets, 1),
+            "records": round(traced_kb(lambda: [pickle.loads(blob) for blob in record_blobs]) / sets, 1)
+        },
+        "pickle_bytes_per_set": {
+            "dicts": sum(map(len, dict_blobs)) // sets,
+            "records": sum(map(len, record_blobs)) // sets
+        },
+        "rerun_us_per_set": {
+            "dicts": per_call_us(lambda: [dict_card(a) for a in dicts], number),
+            "records": per_call_us(lambda: [record_card(a) for a in records], number)
+        },
+        "sort_us_per_set": {
+            "dicts": per_call_us(lambda: sorted(dicts, key=dict_sort_key, reverse=True), number),
+            "records": per_call_us(lambda: sorted(records, key=record_sort_key, reverse=True), number)
+        },
+        "normalize_us_per_set": per_call_us(lambda: normalize(dicts), number)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare raw article dicts with Article records.")
+    parser.add_argument("--sets", type=int, default=200, help="cached result sets held in memory")
+    parser.add_argument("--number", type=int, default=200, help="timing loop iterations")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = {str(count): bench(count, args.sets, args.number) for count in RESULT_COUNTS}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
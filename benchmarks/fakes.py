@@ -0,0 +1,371 @@
+"""
+Local stand-ins for DuckDuckGo and Gemini, for benchmarks and load tests.
+
+FakeDDGS mimics the parts of duckduckgo_search.DDGS the app uses (news(),
+_get_vqd() and _get_url() on the news.js endpoint). FakeGenerativeModel
+mimics google.generativeai.GenerativeModel (generate_content(stream=...)
+and start_chat()), and follows the prompt's hashtag instruction. Both are
+deterministic for a given seed and add configurable latency, jitter and
+errors.
+
+RecordedDDGS replays real DuckDuckGo results saved with record_responses(),
+falling back to synthetic results for searches that were not recorded.
+FakeTextFetcher serves synthetic article pages instead of downloading them.
+
+install() wires them into the process-wide clients through
+ddgs_client.set_client(), post_optimizer.set_model() and
+article_text.set_text_fetcher().
+"""
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+from duckduckgo_search.exceptions import RatelimitException
+
+SOURCES = [
+    "Reuters", "Associated Press", "BBC News", "The Guardian", "Bloomberg", "CNN",
+    "Al Jazeera", "NPR", "Financial Times", "The Verge", "TechCrunch", "Nikkei Asia"
+]
+
+WORDS = (
+    "market policy climate energy election court research health startup launch "
+    "growth report growth data security model city storm league vaccine trade "
+    "budget talks deal rally record study space chip network strike summit"
+).split()
+
+# DuckDuckGo's news.js returns this many results per page
+PAGE_SIZE = 30
+
+# The hashtag instructions post_optimizer.plan_hashtags writes, most specific first
+NO_HASHTAGS_RE = re.compile(r"Do not include any hashtags")
+HASHTAG_COUNT_RE = re.compile(r"exactly (?:these )?(\d+) (?:relevant )?hashtags(?: and no others)?:?((?: #\w+)*)")
+
+
+class LatencyProfile:
+    """Latency (ms) with uniform jitter and an error rate, sampled from a seeded RNG."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Sleep for one sampled latency."""
+        with self._lock:
+            ms = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        if ms > 0:
+            time.sleep(ms / 1000)
+
+    def fails(self):
+        """Whether this call should fail."""
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+def _seed(*parts):
+    return int.from_bytes(hashlib.sha256(repr(parts).encode("utf-8")).digest()[:8], "big")
+
+
+def estimate_tokens(text):
+    """About four characters per token, as for English text."""
+    return max(1, len(text) // 4)
+
+
+def make_articles(query, region="wt-wt", count=PAGE_SIZE * 4, duplicate_rate=0.15, image_rate=0.0, seed=0):
+    """
+    Build count news.js-style rows for a query, newest first.
+
+    About duplicate_rate of them re-run an earlier story under another
+    source, with tracking parameters on the URL, like syndicated copies do.
+    About image_rate of them carry an image URL; these point at an unroutable
+    host, so leave it at 0 unless thumbnail fetching is what's being measured.
+    """
+    rng = random.Random(_seed(query, region, seed))
+    now = time.time()
+    rows = []
+    for i in range(count):
+        if rows and rng.random() < duplicate_rate:
+            original = rng.choice(rows)
+            title = original["title"]
+            excerpt = original["excerpt"]
+            url = f"{original['url']}?utm_source=feed&ref=syndication{i}"
+        else:
+            title = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12))).capitalize()
+            excerpt = " ".join(rng.choice(WORDS) for _ in range(rng.randint(25, 45))) + "."
+            url = f"https://news.example.com/{region}/{_seed(query, i) % 10 ** 10}"
+        rows.append({
+            "date": int(now - i * rng.randint(60, 900)),
+            "title": title,
+            "excerpt": excerpt,
+            "url": url,
+            "image": f"https://img.example.com/{i}.jpg" if rng.random() < image_rate else "",
+            "source": rng.choice(SOURCES)
+        })
+    return rows
+
+
+class _Response:
+    def __init__(self, payload):
+        self.content = json.dumps(payload).encode("utf-8")
+
+
+class FakeDDGS:
+    """Stand-in for duckduckgo_search.DDGS with synthetic news results."""
+
+    def __init__(self, profile=None, results_per_query=PAGE_SIZE * 4, duplicate_rate=0.15, image_rate=0.0, seed=0):
+        self.profile = profile or LatencyProfile()
+        self.results_per_query = results_per_query
+        self.duplicate_rate = duplicate_rate
+        self.image_rate = image_rate
+        self.seed = seed
+        self.calls = 0
+
+    def _request(self):
+        self.calls += 1
+        self.profile.delay()
+        if self.profile.fails():
+            raise RatelimitException("fake DuckDuckGo rate limit")
+
+    def _rows(self, query, region):
+        return make_articles(query, region, self.results_per_query, self.duplicate_rate, self.image_rate, self.seed)
+
+    def _get_vqd(self, query):
+        self._request()
+        return f"vqd-{_seed(query) % 10 ** 8}"
+
+    def _get_url(self, method, url, params=None, **kwargs):
+        self._request()
+        start = int(params.get("s", 0))
+        rows = self._rows(params["q"], params.get("l", "wt-wt"))
+        page = rows[start:start + PAGE_SIZE]
+        has_more = start + PAGE_SIZE < len(rows)
+        return _Response({
+            "results": page,
+            "next": f"news.js?q={params['q']}&s={start + PAGE_SIZE}&o=json" if has_more else None
+        })
+
+    def news(self, keywords, region="wt-wt", safesearch="moderate", timelimit=None, max_results=None):
+        self._request()
+        rows = self._rows(keywords, region)[:max_results or PAGE_SIZE]
+        return [
+            {
+                "date": datetime.datetime.fromtimestamp(row["date"], datetime.timezone.utc).isoformat(),
+                "title": row["title"],
+                "body": row["excerpt"],
+                "url": row["url"],
+                "image": row["image"],
+                "source": row["source"]
+            }
+            for row in rows
+        ]
+
+
+def recording_key(query, region):
+    return f"{region}|{query.lower()}"
+
+
+class RecordedDDGS(FakeDDGS):
+    """FakeDDGS serving recorded news.js rows (see record_responses) where it has them."""
+
+    def __init__(self, recording, profile=None, results_per_query=PAGE_SIZE * 4, duplicate_rate=0.15, seed=0):
+        super().__init__(profile, results_per_query, duplicate_rate, seed=seed)
+        self.recording = recording
+
+    def _rows(self, query, region):
+        rows = self.recording.get(recording_key(query, region))
+        if rows is None:
+            return super()._rows(query, region)
+        return rows
+
+
+def load_recording(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_responses(searches, path, pages=2):
+    """
+    Run (query, region) searches against the live DuckDuckGo and save up to
+    pages pages of each as news.js rows, for RecordedDDGS.
+    """
+    import ddgs_client
+
+    client = ddgs_client.get_client()
+    recording = {}
+    for query, region in searches:
+        rows = []
+        for number, page in enumerate(client.iter_news_pages(query, region, "d"), 1):
+            rows.extend({
+                "date": int(datetime.datetime.fromisoformat(article["date"]).timestamp()),
+                "title": article["title"],
+                "excerpt": article["body"],
+                "url": article["url"],
+                "image": article["image"] or "",
+                "source": article["source"]
+            } for article in page)
+            if number >= pages:
+                break
+        recording[recording_key(query, region)] = rows
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(recording, f, ensure_ascii=False)
+    return recording
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text]
+
+
+class _Stream:
+    """
+    A streaming response: chunks arrive first_token latency apart, then
+    chunk_ms apart, plus token_ms per output token of each chunk.
+    """
+
+    def __init__(self, model, prompt_tokens, words):
+        self._model = model
+        self._prompt_tokens = prompt_tokens
+        self._words = words
+        self.usage_metadata = None
+        self.text = ""
+
+    def __iter__(self):
+        self._model.first_token.delay()
+        per_chunk = max(1, len(self._words) // self._model.chunks)
+        for start in range(0, len(self._words), per_chunk):
+            text = " ".join(self._words[start:start + per_chunk]) + " "
+            delay = self._model.token_ms * estimate_tokens(text) + (self._model.chunk_ms if start else 0)
+            if delay:
+                time.sleep(delay / 1000)
+            self.text += text
+            yield _Chunk(text)
+        self.usage_metadata = _UsageMetadata(self._prompt_tokens, estimate_tokens(" ".join(self._words)))
+
+
+class FakeChat:
+    """Stand-in for google.generativeai.ChatSession."""
+
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content, stream=False):
+        context = sum(len(str(part)) for turn in self.history for part in turn["parts"])
+        response = self.model._respond(str(content), context_chars=context, stream=stream)
+        self.history.append({"role": "user", "parts": [content]})
+        return response
+
+
+class FakeGenerativeModel:
+    """Stand-in for google.generativeai.GenerativeModel that streams synthetic posts."""
+
+    def __init__(self, first_token=None, chunk_ms=20.0, chunks=8, output_words=180, seed=0, token_ms=0.0):
+        self.first_token = first_token or LatencyProfile()
+        self.chunk_ms = chunk_ms
+        self.token_ms = token_ms
+        self.chunks = chunks
+        self.output_words = output_words
+        self.seed = seed
+        self.calls = 0
+
+    def _respond(self, prompt, context_chars=0, stream=False):
+        self.calls += 1
+        if self.first_token.fails():
+            self.first_token.delay()
+            raise RuntimeError("429 Resource has been exhausted (fake Gemini quota)")
+        rng = random.Random(_seed(prompt, self.calls, self.seed))
+        words = [rng.choice(WORDS) for _ in range(self.output_words)]
+        words += self._hashtags(prompt, rng)
+        response = _Stream(self, estimate_tokens(prompt) + context_chars // 4, words)
+        if not stream:
+            for _ in response:
+                pass
+        return response
+
+    @staticmethod
+    def _hashtags(prompt, rng):
+        """The hashtags the prompt asks for: none, the listed ones (completed with made-up ones) or 10."""
+        if NO_HASHTAGS_RE.search(prompt):
+            return []
+        match = HASHTAG_COUNT_RE.search(prompt)
+        if match is None:
+            return [f"#{rng.choice(WORDS)}" for _ in range(10)]
+        listed = match.group(2).split()
+        return listed + [f"#{rng.choice(WORDS)}{rng.choice(WORDS)}" for _ in range(int(match.group(1)) - len(listed))]
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        return self._respond(str(prompt), stream=stream)
+
+    def start_chat(self, history=None, **kwargs):
+        return FakeChat(self, history)
+
+
+def fake_article_page(url, paragraphs=8):
+    """A synthetic article page for url, with navigation and a footer around the text."""
+    rng = random.Random(_seed(url))
+    body = "".join(
+        "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(25, 60))).capitalize() + ".</p>"
+        for _ in range(paragraphs)
+    )
+    return (f"<html><head><title>{url}</title><script>var x = 1;</script></head><body>"
+            f"<nav><p>Home World Business Technology Sport Culture Opinion</p></nav>"
+            f"<article><h1>{rng.choice(WORDS).capitalize()}</h1>{body}</article>"
+            f"<footer><p>Copyright Example News. All rights reserved. Terms and privacy.</p></footer></body></html>")
+
+
+def fake_text_fetcher(profile=None):
+    """An article_text.ArticleTextFetcher that builds pages locally, after a sampled delay."""
+    import article_text
+
+    profile = profile or LatencyProfile()
+
+    class FakeTextFetcher(article_text.ArticleTextFetcher):
+        def _download(self, url):
+            profile.delay()
+            if profile.fails():
+                raise ConnectionError("fake article host unreachable")
+            return fake_article_page(url)
+
+    return FakeTextFetcher()
+
+
+def install(ddgs_profile=None, gemini_profile=None, results_per_query=PAGE_SIZE * 4, unthrottled=True,
+            chunk_ms=20.0, recording=None, page_profile=None, token_ms=0.0):
+    """
+    Point the app's DuckDuckGo client and Gemini model at the stand-ins.
+
+    With unthrottled, the client's token bucket is effectively disabled so
+    benchmarks measure the app rather than the production rate limits.
+    With a recording (see load_recording), recorded searches are replayed.
+    Article pages for "Create AI Post" are generated locally after page_profile delays.
+    token_ms adds Gemini decode time per output token, so longer answers take longer.
+    Returns (client, model).
+    """
+    import article_text
+    import ddgs_client
+    import post_optimizer
+
+    limits = {"requests_per_second": 1e9, "burst": 1e9} if unthrottled else {}
+    client = ddgs_client.DDGSClient(
+        factory=lambda: (FakeDDGS(ddgs_profile, results_per_query) if recording is None
+                         else RecordedDDGS(recording, ddgs_profile, results_per_query)),
+        **limits
+    )
+    ddgs_client.set_client(client)
+    model = FakeGenerativeModel(gemini_profile, chunk_ms=chunk_ms, token_ms=token_ms)
+    post_optimizer.set_model(model)
+    article_text.set_text_fetcher(fake_text_fetcher(page_profile))
+    return client, model
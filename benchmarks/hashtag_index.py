@@ -0,0 +1,200 @@
+"""
+Benchmark: local hashtag index (hashtags.py) vs hashtags written by Gemini.
+
+Seeds a throwaway chat store and archive with synthetic past posts and
+articles on a few themes, builds the index from them the way the app does,
+then measures:
+
+- build: time to load the documents and build the index, and its size
+- suggest: per-post suggestion latency, and how many suggested tags belong
+  to the post's theme
+- modes: optimize round trips against the fake Gemini in each hashtag mode
+  ("gemini", "suggest", "local"): prompt and output tokens, time to first
+  token, total time, time spent picking hashtags, and how much the hashtags
+  of two generations for the same post overlap (Jaccard)
+
+The fake Gemini follows the prompt's hashtag instruction and takes
+--gemini-token-ms per output token, so fewer hashtags to write means a
+shorter, faster answer, as with the real model.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Everything the app persists goes to a throwaway directory; set before the app modules are imported
+os.environ["THINKWHY_CACHE_DIR"] = tempfile.mkdtemp(prefix="thinkwhy-bench-")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+from stats import summarize  # noqa: E402
+
+# Words and the hashtags people use for them, per theme of the post form
+THEMES = {
+    "Travel": ("beach flight hotel island sunset passport adventure mountains backpacking roadtrip",
+               ["Travel", "Wanderlust", "TravelGram", "BeachLife", "Adventure", "ExploreMore", "RoadTrip"]),
+    "Food": ("recipe dinner pasta kitchen chef flavor bakery dessert brunch coffee",
+             ["Foodie", "Recipe", "HomeCooking", "Yummy", "Brunch", "CoffeeLover", "FoodPhotography"]),
+    "Fitness": ("workout gym running strength cardio marathon yoga protein training stretch",
+                ["Fitness", "Workout", "GymLife", "FitFam", "Running", "Yoga", "HealthyLiving"]),
+    "Technology": ("startup software chip launch developer cloud model data robot gadget",
+                   ["Tech", "Startup", "AI", "Innovation", "Developer", "Gadgets", "FutureTech"]),
+    "Business": ("market growth revenue customers founder strategy hiring sales funding brand",
+                 ["Business", "Entrepreneur", "SmallBusiness", "Marketing", "Leadership", "Growth"]),
+    "Fashion": ("outfit style denim runway jacket vintage sneakers collection designer trend",
+                ["Fashion", "OOTD", "Style", "StreetStyle", "Vintage", "FashionWeek"])
+}
+FILLER = "amazing great really love this weekend friends morning finally share little moment".split()
+AUDIENCES = ["General", "Young Adults", "Professionals", "Travel Enthusiasts", "Foodies", "Tech Enthusiasts"]
+MODES = ["gemini", "suggest", "local"]
+
+
+def make_text(rng, theme, words=60):
+    vocabulary = THEMES[theme][0].split()
+    return " ".join(rng.choice(vocabulary if rng.random() < 0.4 else FILLER) for _ in range(words)).capitalize() + "."
+
+
+def seed_sources(posts, articles, seed=0):
+    """Write synthetic optimized posts to the chat store and articles to the archive."""
+    from archive import get_archive
+    from article import Article
+    from chat_store import get_chat_store
+
+    rng = random.Random(seed)
+    store = get_chat_store()
+    for i in range(posts):
+        theme = rng.choice(list(THEMES))
+        tags = rng.sample(THEMES[theme][1], rng.randint(3, 6))
+        content = make_text(rng, theme) + "\n\n" + " ".join(f"#{tag}" for tag in tags)
+        store.save(f"bench-{i // 10}", i % 10 * 2 + 1, {
+            "role": "assistant",
+            "content": content,
+            "request": {"kind": "optimize", "args": ["", rng.choice(AUDIENCES), theme, "Friendly", len(tags)]}
+        })
+    archive = get_archive()
+    for theme in THEMES:
+        rows = []
+        for i in range(articles // len(THEMES)):
+            title = " ".join(rng.sample(THEMES[theme][0].split(), 4)).capitalize()
+            rows.append(Article(title, f"https://news.example.com/{theme}/{i}", rng.choice(fakes.SOURCES),
+                                body=make_text(rng, theme, 30), timestamp=time.time() - i * 60))
+        archive.ingest(rows, category=theme)
+    archive.flush()
+
+
+def bench_build():
+    import hashtags
+
+    start = time.perf_counter()
+    index = hashtags.build_index()
+    elapsed = (time.perf_counter() - start) * 1000
+    hashtags.set_hashtag_index(index)
+    return index, dict(index.snapshot(), total_ms=round(elapsed, 1))
+
+
+def bench_suggest(index, queries, count, seed=1):
+    rng = random.Random(seed)
+    times, on_theme, suggested = [], 0, 0
+    for _ in range(queries):
+        theme = rng.choice(list(THEMES))
+        text = make_text(rng, theme)
+        start = time.perf_counter()
+        tags = index.suggest(text, count, rng.choice(AUDIENCES), theme)
+        times.append((time.perf_counter() - start) * 1000)
+        theme_tags = {tag.lower() for tag in THEMES[theme][1]} | set(THEMES[theme][0].split())
+        suggested += len(tags)
+        on_theme += sum(tag[1:].lower() in theme_tags for tag in tags)
+    return {
+        "ms": summarize(times),
+        "avg_suggested": round(suggested / queries, 1),
+        "on_theme_rate": round(on_theme / suggested, 3) if suggested else None
+    }
+
+
+def jaccard(a, b):
+    a, b = {tag.lower() for tag in a}, {tag.lower() for tag in b}
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def bench_modes(reps, count, seed=2):
+    import hashtags
+    import post_optimizer
+
+    rng = random.Random(seed)
+    posts = [(theme, make_text(rng, theme, 40) + f" ({uuid.uuid4().hex[:6]})")
+             for theme in (rng.choice(list(THEMES)) for _ in range(reps))]
+    report = {}
+    for mode in MODES:
+        samples = {"total_ms": [], "ttft_ms": [], "hashtag_ms": [], "prompt_tokens": [], "output_tokens": []}
+        overlap, errors = [], 0
+        for theme, post in posts:
+            generations = []
+            for _ in range(2):
+                timing = {}
+                try:
+                    text = post_optimizer.optimize_instagram_post(post, "General", theme, "Friendly", count,
+                                                                  regenerate=True, timing=timing, raise_errors=True,
+                                                                  hashtag_mode=mode)
+                except Exception:
+                    errors += 1
+                    continue
+                generations.append(hashtags.extract_hashtags(text))
+                for name, values in samples.items():
+                    values.append(timing.get(name, 0))
+            if len(generations) == 2:
+                overlap.append(jaccard(*generations))
+        report[mode] = {
+            "total_ms": summarize(samples["total_ms"]),
+            "ttft_ms": summarize(samples["ttft_ms"]),
+            "hashtag_ms": summarize(samples["hashtag_ms"]),
+            "avg_prompt_tokens": round(sum(samples["prompt_tokens"]) / len(samples["prompt_tokens"]), 1)
+            if samples["prompt_tokens"] else None,
+            "avg_output_tokens": round(sum(samples["output_tokens"]) / len(samples["output_tokens"]), 1)
+            if samples["output_tokens"] else None,
+            "hashtag_overlap": round(sum(overlap) / len(overlap), 3) if overlap else None,
+            "errors": errors
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare local hashtag suggestions with Gemini-written hashtags.")
+    parser.add_argument("--posts", type=int, default=2000, help="past optimized posts in the chat store")
+    parser.add_argument("--articles", type=int, default=3000, help="articles in the archive")
+    parser.add_argument("--queries", type=int, default=500, help="posts to time suggestions for")
+    parser.add_argument("--reps", type=int, default=10, help="posts to optimize in each mode (twice each)")
+    parser.add_argument("--hashtags", type=int, default=20, help="hashtags per post")
+    parser.add_argument("--gemini-ttft-ms", type=float, default=600, help="Gemini time to first chunk")
+    parser.add_argument("--gemini-jitter-ms", type=float, default=0)
+    parser.add_argument("--gemini-token-ms", type=float, default=4, help="Gemini decode time per output token")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    fakes.install(gemini_profile=fakes.LatencyProfile(args.gemini_ttft_ms, args.gemini_jitter_ms, seed=2),
+                  chunk_ms=0, token_ms=args.gemini_token_ms)
+    print("seeding chat store and archive...", file=sys.stderr)
+    seed_sources(args.posts, args.articles)
+    index, build = bench_build()
+    report = {
+        "config": {name: value for name, value in vars(args).items() if name != "output"},
+        "build": build,
+        "suggest": bench_suggest(index, args.queries, args.hashtags),
+        "modes": bench_modes(args.reps, args.hashtags)
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
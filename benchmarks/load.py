@@ -0,0 +1,496 @@
+"""
+Load test: many simulated newsroom users against a real Streamlit server.
+
+The app (searcher.py and its pages) runs in a child process. There,
+DuckDuckGo and Gemini are replaced by the stand-ins in benchmarks/fakes.py,
+or by real search results recorded earlier with --record and replayed
+with --recording. Every simulated user is a Streamlit session: a websocket
+speaking the browser's protobuf protocol. Widgets, reruns and callbacks
+therefore run exactly as they do for a real visitor, with every session
+sharing the process-wide caches and pools.
+
+Users loop over two flows, with think time between steps:
+
+- search: pick a category and region (sometimes keywords), search, sometimes "Load more"
+- optimize: open the post helper, optimize a post, sometimes ask for an edit
+
+Concurrency is stepped through --users. Each level reports:
+- requests (script runs) per second
+- latency percentiles per step
+- errors
+- server memory per session
+
+The ramp stops at the first level that misses the p95 target
+(--slo-p95-ms) or the error budget (--max-error-rate). That level is
+where one server process falls over.
+
+Needs the websockets package (pip install websockets).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stats import git_revision, summarize  # noqa: E402
+
+DEFAULT_USERS = "1,2,4,8,16,32"
+
+# Share of flows that are searches; the rest optimize posts
+SEARCH_SHARE = 0.7
+
+# Some categories and regions are searched far more than others
+CATEGORY_WEIGHTS = [10, 8, 6, 6, 5, 4, 3, 3, 2, 2]
+POPULAR_REGIONS = {"Global": 5, "United States": 4, "India": 4, "United Kingdom": 2}
+
+KEYWORDS = ["AI", "elections", "inflation", "climate", "chips", "football", "vaccines", "startups", "oil", "space"]
+
+POSTS = [
+    "We're opening our second coffee shop downtown next week, with fresh pastries, local beans and a reading corner.",
+    "Just finished my first half marathon! Months of early mornings, sore legs and a lot of bananas finally paid off.",
+    "Our team shipped the new dashboard today. It's faster, cleaner and finally has the dark mode you all asked for.",
+    "Spent the weekend hiking the coast trail with friends. Foggy mornings, sunny afternoons and the best fish tacos ever."
+]
+
+EDIT_INSTRUCTIONS = ["Make it shorter", "Make it more casual", "Add a question for followers", "Focus on the community"]
+
+SERVER_START_TIMEOUT = 60
+
+
+def rss_kb(pid):
+    """Resident memory of a process in kilobytes (Linux only; None elsewhere)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class Session:
+    """One simulated browser tab: a Streamlit session over the websocket protocol."""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.page = None
+        self.query = ""
+        self.widgets = {}  # label -> widgets with that label in the last run, in page order
+        self._values = {}  # widget id -> WidgetState, resent on every rerun like the browser does
+        self._ws = None
+
+    async def connect(self):
+        import websockets
+
+        self._ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def rerun(self, triggers=()):
+        """Run the page script; returns a list of error messages shown on the page."""
+        from streamlit.proto.Alert_pb2 import Alert
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = self.query
+        message.rerun_script.page_name = self.page
+        message.rerun_script.widget_states.widgets.extend(list(self._values.values()) + list(triggers))
+        await self._ws.send(message.SerializeToString())
+
+        elements = []
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self._ws.recv(), self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                elements.append(forward.delta.new_element)
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    # st.rerun(): the server starts the next run by itself
+                    elements = []
+                    continue
+                break
+
+        self.widgets = {}
+        errors = []
+        for element in elements:
+            kind = element.WhichOneof("type")
+            proto = getattr(element, kind)
+            if kind == "exception":
+                errors.append(proto.message)
+            elif kind == "alert" and proto.format == Alert.ERROR:
+                errors.append(proto.body)
+            elif kind == "markdown" and '">Error: ' in proto.body:
+                # A failed optimization is shown in the post bubble
+                errors.append(proto.body)
+            elif hasattr(proto, "id") and hasattr(proto, "label") and proto.id:
+                self.widgets.setdefault(proto.label, []).append(proto)
+        return errors
+
+    async def open(self, page, query=""):
+        """Navigate to a page ("" for the news page, "post_helper", ...)."""
+        self.page = page
+        self.query = query
+        self._values = {}
+        return await self.rerun()
+
+    def set(self, label, value):
+        """Set a widget's value for the next rerun, like typing or picking in the browser."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget = self.widgets[label][0]
+        state = WidgetState(id=widget.id)
+        kind = type(widget).__name__
+        if kind == "Slider":
+            state.double_array_value.data[:] = [value]
+        elif kind == "Checkbox":
+            state.bool_value = value
+        else:
+            # Text inputs, text areas, selectboxes and radios all send strings
+            state.string_value = str(value)
+        self._values[widget.id] = state
+
+    async def click(self, label, index=-1):
+        """Press a button (or form submit button) and rerun."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget = self.widgets[label][index]
+        return await self.rerun([WidgetState(id=widget.id, trigger_value=True)])
+
+
+class User:
+    """A simulated user with its own session, random stream and think time."""
+
+    def __init__(self, number, url, args, level):
+        self.rng = random.Random(args.seed * 1000 + number)
+        self.session = Session(url, args.step_timeout)
+        self.chat_id = uuid.uuid4().hex
+        self.think_ms = args.think_ms
+        self.level = level
+
+    async def think(self):
+        if self.think_ms > 0:
+            await asyncio.sleep(self.rng.expovariate(1000 / self.think_ms))
+
+    async def step(self, name, action):
+        """Time one script run; failures are recorded, not raised."""
+        start = time.perf_counter()
+        try:
+            errors = await action
+        except Exception as e:
+            errors = [f"{type(e).__name__}: {e}"]
+        self.level.record(name, (time.perf_counter() - start) * 1000, errors)
+        return not errors
+
+    async def search(self):
+        import searcher
+
+        session = self.session
+        if session.page != "" and not await self.step("news.open", session.open("")):
+            return
+        await self.think()
+        session.set("📋 Select News Category", self.rng.choices(searcher.NEWS_AREAS, CATEGORY_WEIGHTS)[0])
+        if self.rng.random() < 0.05:
+            # Occasionally fan out to every region at once
+            region = searcher.ALL_REGIONS
+        else:
+            regions = list(searcher.REGIONS)
+            region = self.rng.choices(regions, [POPULAR_REGIONS.get(r, 1) for r in regions])[0]
+        session.set("🌎 Select Region", region)
+        session.set("🔍 Add Specific Keywords (optional)",
+                    self.rng.choice(KEYWORDS) if self.rng.random() < 0.3 else "")
+        session.set("📊 Maximum Number of Results", self.rng.choice([10, 20, 30]))
+        if not await self.step("news.search", session.click("🔎 Search News")):
+            return
+        if self.rng.random() < 0.3 and "⬇️ Load more results" in session.widgets:
+            await self.think()
+            await self.step("news.load_more", session.click("⬇️ Load more results"))
+
+    async def optimize(self):
+        session = self.session
+        if session.page != "post_helper":
+            if not await self.step("post.open", session.open("post_helper", f"session={self.chat_id}")):
+                return
+        await self.think()
+        session.set("Target Audience", "General")
+        session.set("Tone of Voice", self.rng.choice(["Friendly", "Casual", "Professional", "Enthusiastic"]))
+        post = self.rng.choice(POSTS)
+        if self.rng.random() < 0.8:
+            # Most posts are new; the rest repeat a common one and hit the response cache
+            post += f" #{uuid.uuid4().hex[:6]}"
+        session.set("Paste your Instagram post here:", post)
+        if not await self.step("post.optimize", session.click("✨ Optimize Post")):
+            return
+        if self.rng.random() < 0.4 and "Edit" in session.widgets:
+            await self.think()
+            if not await self.step("post.open_edit", session.click("Edit")):
+                return
+            session.set("Edit Instructions (What would you like to change?)", self.rng.choice(EDIT_INSTRUCTIONS))
+            await self.step("post.edit", session.click("Re-Optimize Post"))
+
+    async def run(self, deadline):
+        # Spread arrivals so a level doesn't start with every user clicking at once
+        await asyncio.sleep(self.rng.uniform(0, min(2.0, self.think_ms / 1000)))
+        start = time.perf_counter()
+        try:
+            await self.session.connect()
+        except Exception as e:
+            self.level.record("connect", (time.perf_counter() - start) * 1000, [str(e)])
+            return
+        try:
+            while time.monotonic() < deadline:
+                if self.rng.random() < SEARCH_SHARE:
+                    await self.search()
+                else:
+                    await self.optimize()
+                await self.think()
+        finally:
+            await self.session.close()
+
+
+class Level:
+    """Measurements for one concurrency level."""
+
+    def __init__(self, users):
+        self.users = users
+        self.steps = {}
+        self.errors = []
+        self.rss_samples = []
+
+    def record(self, name, ms, errors):
+        self.steps.setdefault(name, {"ms": [], "errors": 0})
+        self.steps[name]["ms"].append(ms)
+        if errors:
+            self.steps[name]["errors"] += 1
+            self.errors.extend(errors[:1])
+
+    async def sample_memory(self, pid, interval=0.5):
+        while True:
+            self.rss_samples.append(rss_kb(pid))
+            await asyncio.sleep(interval)
+
+    def report(self, elapsed, rss_before):
+        runs = [ms for step in self.steps.values() for ms in step["ms"]]
+        failed = sum(step["errors"] for step in self.steps.values())
+        report = {
+            "users": self.users,
+            "duration_s": round(elapsed, 1),
+            "requests": len(runs),
+            "requests_per_second": round(len(runs) / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(failed / len(runs), 4) if runs else 1.0,
+            "latency_ms": summarize(runs),
+            "steps": {
+                name: dict(summarize(step["ms"]), errors=step["errors"])
+                for name, step in sorted(self.steps.items())
+            },
+            "sample_errors": sorted(set(e[:200] for e in self.errors))[:5]
+        }
+        samples = [kb for kb in self.rss_samples if kb is not None]
+        if rss_before is not None and samples:
+            report["server_rss_mb"] = {"before": round(rss_before / 1024, 1), "peak": round(max(samples) / 1024, 1)}
+            report["rss_per_session_mb"] = round((max(samples) - rss_before) / 1024 / self.users, 2)
+        return report
+
+
+async def run_level(url, users, args, server_pid):
+    level = Level(users)
+    rss_before = rss_kb(server_pid) if server_pid else None
+    sampler = asyncio.ensure_future(level.sample_memory(server_pid)) if server_pid else None
+    deadline = time.monotonic() + args.duration
+    start = time.perf_counter()
+    await asyncio.gather(*(User(n, url, args, level).run(deadline) for n in range(users)))
+    elapsed = time.perf_counter() - start
+    if sampler is not None:
+        sampler.cancel()
+    return level.report(elapsed, rss_before)
+
+
+def breach(report, args):
+    """Why a level counts as fallen over, or None if it held up."""
+    if report["error_rate"] > args.max_error_rate:
+        return f"error rate {report['error_rate']:.1%} > {args.max_error_rate:.1%}"
+    p95 = report["latency_ms"].get("p95")
+    if p95 is not None and p95 > args.slo_p95_ms:
+        return f"p95 {p95:.0f} ms > {args.slo_p95_ms:.0f} ms"
+    return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    """Launch the app with the fake backends in a child process; returns (process, websocket url)."""
+    port = free_port()
+    data_dir = tempfile.mkdtemp(prefix="thinkwhy-load-")
+    env = dict(os.environ, THINKWHY_CACHE_DIR=data_dir, GEMINI_API_KEY="load-test")
+    command = [sys.executable, os.path.abspath(__file__), "--serve", str(port),
+               "--ddg-latency-ms", str(args.ddg_latency_ms), "--gemini-ttft-ms", str(args.gemini_ttft_ms),
+               "--gemini-chunk-ms", str(args.gemini_chunk_ms), "--error-rate", str(args.error_rate)]
+    if args.recording:
+        command += ["--recording", os.path.abspath(args.recording)]
+    if args.throttled:
+        command.append("--throttled")
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited: {process.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, f"ws://127.0.0.1:{port}/_stcore/stream"
+        except OSError:
+            time.sleep(0.3)
+    process.kill()
+    raise RuntimeError("server did not become healthy in time")
+
+
+def serve(args):
+    """Child process: install the stand-ins and run the Streamlit server in this process."""
+    import fakes
+    from streamlit.web import bootstrap
+
+    fakes.install(
+        ddgs_profile=fakes.LatencyProfile(args.ddg_latency_ms, args.ddg_latency_ms * 0.4, args.error_rate, seed=1),
+        gemini_profile=fakes.LatencyProfile(args.gemini_ttft_ms, args.gemini_ttft_ms * 0.3, args.error_rate, seed=2),
+        unthrottled=not args.throttled,
+        chunk_ms=args.gemini_chunk_ms,
+        recording=fakes.load_recording(args.recording) if args.recording else None
+    )
+    bootstrap.load_config_options({
+        "server.port": args.serve,
+        "server.address": "127.0.0.1",
+        "server.headless": True,
+        "server.fileWatcherType": "none",
+        "browser.gatherUsageStats": False
+    })
+    bootstrap.run(os.path.join(ROOT, "searcher.py"), False, [], {})
+
+
+def record(path):
+    """Save live results for the most common searches (every category in the popular regions)."""
+    import fakes
+    import searcher
+
+    searches = [(searcher.build_query(area), searcher.REGIONS[region])
+                for area in searcher.NEWS_AREAS for region in POPULAR_REGIONS]
+    recording = fakes.record_responses(searches, path)
+    print(f"recorded {sum(len(rows) for rows in recording.values())} results for {len(recording)} searches to {path}",
+          file=sys.stderr)
+
+
+async def warm_up(url, args):
+    """One unmeasured pass through both flows, so imports and first-use setup don't count against level 1."""
+    user = User(-1, url, args, Level(1))
+    user.think_ms = 0
+    await user.session.connect()
+    try:
+        await user.search()
+        await user.optimize()
+    finally:
+        await user.session.close()
+
+
+async def ramp(url, args, server_pid):
+    await warm_up(url, args)
+    levels = []
+    capacity = {"max_healthy_users": None, "breaking_users": None, "reason": None}
+    for users in [int(n) for n in args.users.split(",")]:
+        print(f"{users} users for {args.duration:.0f} s...", file=sys.stderr)
+        report = await run_level(url, users, args, server_pid)
+        levels.append(report)
+        reason = breach(report, args)
+        print(f"  {report['requests_per_second']:.1f} req/s, p95 {report['latency_ms'].get('p95', 0):.0f} ms, "
+              f"errors {report['error_rate']:.1%}" + (f" -> FAILED ({reason})" if reason else ""), file=sys.stderr)
+        if reason is not None:
+            capacity.update(breaking_users=users, reason=reason)
+            if not args.keep_going:
+                break
+        elif capacity["breaking_users"] is None:
+            capacity["max_healthy_users"] = users
+    return levels, capacity
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent users against the app and find its capacity.")
+    parser.add_argument("--users", default=DEFAULT_USERS, help="comma-separated concurrency levels to step through")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--think-ms", type=float, default=1000, help="mean pause between a user's actions")
+    parser.add_argument("--slo-p95-ms", type=float, default=3000, help="p95 script-run latency a level must stay under")
+    parser.add_argument("--max-error-rate", type=float, default=0.02, help="error budget per level")
+    parser.add_argument("--step-timeout", type=float, default=60, help="seconds before a script run counts as failed")
+    parser.add_argument("--keep-going", action="store_true", help="run every level even after one fails")
+    parser.add_argument("--ddg-latency-ms", type=float, default=250)
+    parser.add_argument("--gemini-ttft-ms", type=float, default=600)
+    parser.add_argument("--gemini-chunk-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="failure rate of both fake backends")
+    parser.add_argument("--throttled", action="store_true", help="keep the production DuckDuckGo rate limits")
+    parser.add_argument("--recording", help="replay search results saved with --record")
+    parser.add_argument("--record", metavar="PATH", help="save live DuckDuckGo results for common searches and exit")
+    parser.add_argument("--url", help="load an already running server (ws://host:port/_stcore/stream) instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    if args.record:
+        record(args.record)
+        return
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args)
+    try:
+        levels, capacity = asyncio.run(ramp(url, args, process.pid if process else None))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "config": {name: value for name, value in vars(args).items() if name not in ("output", "serve", "record")},
+        "capacity": capacity,
+        "levels": levels
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Microbenchmark: near-duplicate collapsing (dedup.py).
+
+For result sets of each size, built from benchmarks/fakes.py rows (whose
+small vocabulary makes many articles share LSH buckets):
+
+- fingerprint: SimHash of every article with an empty memo
+- cold / warm: collapse_duplicates with an empty memo, and again with every
+  fingerprint memoized (reruns and cached result sets)
+- stream: StreamingDeduplicator.add() per article, with each page of
+  fakes.PAGE_SIZE fingerprinted up front the way searcher.py does
+- stories and same_as_stream: the number of stories, and whether the
+  streaming and batch paths grouped the articles identically
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+import dedup  # noqa: E402
+from article import Article  # noqa: E402
+
+RESULT_COUNTS = [100, 1000, 3000]
+
+
+def make_articles(count, seed):
+    return [
+        Article(row["title"], row["url"], row["source"], body=row["excerpt"])
+        for row in fakes.make_articles(f"dedup {seed}", count=count, seed=seed)
+    ]
+
+
+def forget_fingerprints():
+    with dedup._fingerprint_memo_lock:
+        dedup._fingerprint_memo.clear()
+
+
+def best_ms(fn, repeat, setup=forget_fingerprints):
+    best = float("inf")
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 2), result
+
+
+def stream(articles):
+    deduplicator = dedup.StreamingDeduplicator()
+    for start in range(0, len(articles), fakes.PAGE_SIZE):
+        page = articles[start:start + fakes.PAGE_SIZE]
+        dedup.simhash_fingerprints(page)
+        for article in page:
+            deduplicator.add(article)
+    return deduplicator.leads
+
+
+def bench(count, repeat):
+    articles = make_articles(count, seed=count)
+    fingerprint_ms, _ = best_ms(lambda: dedup.simhash_fingerprints(articles), repeat)
+    cold_ms, collapsed = best_ms(lambda: dedup.collapse_duplicates(articles), repeat)
+    warm_ms, _ = best_ms(lambda: dedup.collapse_duplicates(articles), repeat, setup=lambda: None)
+    stream_ms, leads = best_ms(lambda: stream(articles), repeat)
+    return {
+        "fingerprint_ms": fingerprint_ms,
+        "collapse_cold_ms": cold_ms,
+        "collapse_warm_ms": warm_ms,
+        "stream_ms": stream_ms,
+        "stream_us_per_article": round(stream_ms * 1000 / count, 1),
+        "stories": len(collapsed),
+        "same_as_stream": [(a.url, len(a.alternates)) for a in collapsed] == [(a.url, len(a.alternates)) for a in leads]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time near-duplicate collapsing.")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    dedup.simhash_fingerprints(make_articles(10, seed=0))  # NumPy import and lookup tables
+    report = {str(count): bench(count, args.repeat) for count in RESULT_COUNTS}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
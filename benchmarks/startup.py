@@ -0,0 +1,104 @@
+"""
+Cold-start benchmark for both Streamlit pages.
+
+Every sample runs in a fresh Python process, like a new container or worker:
+
+- import_ms: executing the page module's top level (its imports and setup), without main()
+- first_render_ms: the first full script run of the page under Streamlit's AppTest
+
+Pass --compare REF to measure another git revision (checked out into a
+temporary worktree) next to the working tree, e.g. --compare HEAD~1.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = {
+    "news": "searcher.py",
+    "post_helper": os.path.join("pages", "post_helper.py")
+}
+
+IMPORT_SNIPPET = """
+import runpy, sys, time
+sys.path.insert(0, ".")
+start = time.perf_counter()
+runpy.run_path({path!r}, run_name="startup_benchmark")
+print((time.perf_counter() - start) * 1000)
+"""
+
+RENDER_SNIPPET = """
+import sys, time
+sys.path.insert(0, ".")
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({path!r}, default_timeout=60)
+start = time.perf_counter()
+app.run()
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def _sample(tree, snippet, path, env):
+    result = subprocess.run(
+        [sys.executable, "-c", snippet.format(path=path)],
+        cwd=tree, env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(tree, runs):
+    """Return {page: {metric: {median, min}}} for the checkout at tree."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, THINKWHY_CACHE_DIR=cache_dir, GEMINI_API_KEY="startup-benchmark")
+        report = {}
+        for page, path in PAGES.items():
+            report[page] = {}
+            for metric, snippet in (("import_ms", IMPORT_SNIPPET), ("first_render_ms", RENDER_SNIPPET)):
+                # One discarded run so bytecode compilation is not counted
+                _sample(tree, snippet, path, env)
+                samples = [_sample(tree, snippet, path, env) for _ in range(runs)]
+                report[page][metric] = {
+                    "median": round(statistics.median(samples), 1),
+                    "min": round(min(samples), 1)
+                }
+    return report
+
+
+def measure_revision(ref, runs):
+    """Measure a git revision in a temporary worktree."""
+    with tempfile.TemporaryDirectory() as parent:
+        tree = os.path.join(parent, "tree")
+        subprocess.run(["git", "worktree", "add", "--detach", tree, ref], cwd=ROOT, check=True, capture_output=True)
+        try:
+            return measure(tree, runs)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=ROOT, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and first-render time of both pages.")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--compare", metavar="REF", help="git revision to measure as the 'before' column")
+    args = parser.parse_args()
+
+    results = {"after": measure(ROOT, args.runs)}
+    if args.compare:
+        results["before"] = measure_revision(args.compare, args.runs)
+
+    for page in PAGES:
+        for metric in ("import_ms", "first_render_ms"):
+            line = f"{page:12} {metric:16} {results['after'][page][metric]['median']:9.1f} ms"
+            if "before" in results:
+                line = (f"{page:12} {metric:16} {results['before'][page][metric]['median']:9.1f} ms"
+                        f" -> {results['after'][page][metric]['median']:9.1f} ms")
+            print(line, file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
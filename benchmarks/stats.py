@@ -0,0 +1,30 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(samples):
+    """Latency summary in milliseconds."""
+    samples = sorted(samples)
+    if not samples:
+        return {"n": 0}
+    return {
+        "n": len(samples),
+        "p50": round(samples[len(samples) // 2], 2),
+        "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        "p99": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+        "mean": round(statistics.fmean(samples), 2),
+        "max": round(samples[-1], 2)
+    }
+
+
+def git_revision():
+    """Short hash of the checked out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,295 @@
+"""
+Offline performance suite: search, page rendering and post optimization
+against the local stand-ins in benchmarks/fakes.py.
+
+Nothing touches the network. Caches, the archive and the chat store live
+in a temporary directory. Results are printed (or written with --output)
+as JSON so runs can be compared release to release.
+
+Scenarios:
+
+- search: cold (cache miss) and warm (cache hit) get_news, plus streamed
+  time-to-first-article, for each result count
+- news_page: AppTest render of searcher.py, initial and after a search, per page size
+- post: optimize round trips (fresh and cached), TTFT, and chat-session edits
+- post_page: AppTest render of the post helper with histories of different lengths
+- memory: tracemalloc peak for a search render and a long-history post page
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Everything the app persists goes to a throwaway directory; set before the app modules are imported
+os.environ["THINKWHY_CACHE_DIR"] = tempfile.mkdtemp(prefix="thinkwhy-bench-")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+sys.path.insert(0, ROOT)
+
+import fakes  # noqa: E402
+from stats import git_revision, summarize  # noqa: E402
+
+SEARCH_RESULT_COUNTS = [10, 30, 100]
+PAGE_SIZES = [10, 30]
+HISTORY_LENGTHS = [0, 20, 100, 500]
+
+
+def timed(fn):
+    """Run fn() and return (result, elapsed_ms)."""
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def bench_search(reps):
+    import searcher
+
+    report = {}
+    for count in SEARCH_RESULT_COUNTS:
+        cold, warm, first_article, stream_total, errors = [], [], [], [], 0
+        for rep in range(reps):
+            query = f"bench {count} {rep} {uuid.uuid4().hex[:6]}"
+            try:
+                _, ms = timed(lambda: searcher.cached_news(query, max_results=count))
+                cold.append(ms)
+                _, ms = timed(lambda: searcher.cached_news(query, max_results=count))
+                warm.append(ms)
+            except Exception:
+                errors += 1
+
+            start = time.perf_counter()
+            first = None
+            try:
+                for _ in searcher.stream_news(f"stream {rep} {uuid.uuid4().hex[:6]}", max_results=count):
+                    if first is None:
+                        first = (time.perf_counter() - start) * 1000
+            except Exception:
+                errors += 1
+                continue
+            first_article.append(first)
+            stream_total.append((time.perf_counter() - start) * 1000)
+        report[str(count)] = {
+            "cold_ms": summarize(cold),
+            "warm_ms": summarize(warm),
+            "stream_first_article_ms": summarize(first_article),
+            "stream_total_ms": summarize(stream_total),
+            "errors": errors
+        }
+    return report
+
+
+def _news_app():
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_file(os.path.join(ROOT, "searcher.py"), default_timeout=120)
+
+
+def bench_news_page(reps):
+    report = {"initial_ms": [], "search_ms": {str(size): [] for size in PAGE_SIZES},
+              "load_more_ms": [], "exceptions": 0}
+    for rep in range(reps):
+        app = _news_app()
+        _, ms = timed(app.run)
+        report["initial_ms"].append(ms)
+        for size in PAGE_SIZES:
+            app.text_input[0].set_value(f"render {rep} {size} {uuid.uuid4().hex[:6]}")
+            app.slider[0].set_value(size)
+            app.button[0].click()
+            _, ms = timed(app.run)
+            report["search_ms"][str(size)].append(ms)
+            report["exceptions"] += len(app.exception)
+        more = [b for b in app.button if "Load more" in b.label]
+        if more:
+            more[0].click()
+            _, ms = timed(app.run)
+            report["load_more_ms"].append(ms)
+    report["initial_ms"] = summarize(report["initial_ms"])
+    report["search_ms"] = {size: summarize(samples) for size, samples in report["search_ms"].items()}
+    report["load_more_ms"] = summarize(report["load_more_ms"])
+    return report
+
+
+def bench_post(reps):
+    import post_optimizer
+
+    post = ("We're opening our second coffee shop downtown next week, with fresh pastries, "
+            "local beans and a reading corner. Come say hi!")
+    fresh, cached, ttft, edits_full, edits_session, errors = [], [], [], [], [], 0
+    for rep in range(reps):
+        timing = {}
+        try:
+            text, ms = timed(lambda: post_optimizer.optimize_instagram_post(
+                post, "General", "Food", "Friendly", 10, regenerate=True, timing=timing, raise_errors=True))
+        except Exception:
+            errors += 1
+            continue
+        fresh.append(ms)
+        ttft.append(timing["ttft_ms"])
+        _, ms = timed(lambda: post_optimizer.optimize_instagram_post(post, "General", "Food", "Friendly", 10))
+        cached.append(ms)
+
+        # Three rounds of edits in one conversation: the first sends the full prompt, the rest use the session
+        session_id = uuid.uuid4().hex
+        current = text
+        for round_number in range(3):
+            timing = {}
+            instructions = f"Round {round_number}: make it shorter ({uuid.uuid4().hex[:6]})"
+            try:
+                current, ms = timed(lambda: post_optimizer.optimize_edited_post(
+                    post, current, instructions, "General", "Food", "Friendly", 10,
+                    timing=timing, raise_errors=True, session_id=session_id))
+            except Exception:
+                errors += 1
+                break
+            (edits_session if timing["edit_mode"] == "session" else edits_full).append(ms)
+    usage = post_optimizer.edit_token_usage()
+    return {
+        "optimize_fresh_ms": summarize(fresh),
+        "optimize_cached_ms": summarize(cached),
+        "ttft_ms": summarize(ttft),
+        "edit_full_prompt_ms": summarize(edits_full),
+        "edit_session_ms": summarize(edits_session),
+        "edit_prompt_tokens": {
+            "full": usage["full"]["avg_prompt_tokens"],
+            "session": usage["session"]["avg_prompt_tokens"]
+        },
+        "errors": errors
+    }
+
+
+def _seed_history(length):
+    """Store a conversation of length messages and return its session id."""
+    from chat_store import get_chat_store
+
+    session_id = uuid.uuid4().hex
+    store = get_chat_store()
+    for position in range(length):
+        if position % 2 == 0:
+            message = {"role": "user", "content": f"Post {position} " + "about our coffee shop " * 8}
+        else:
+            message = {"role": "assistant", "content": "Optimized post " + "with hashtags #coffee " * 40,
+                       "timing": {"ttft_ms": 300, "total_ms": 2000, "cached": False}}
+        store.save(session_id, position, message)
+    return session_id
+
+
+def _post_app(session_id):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "pages", "post_helper.py"), default_timeout=120)
+    app.query_params["session"] = session_id
+    return app
+
+
+def bench_post_page(reps):
+    report = {}
+    for length in HISTORY_LENGTHS:
+        session_id = _seed_history(length)
+        first, rerun = [], []
+        for _ in range(reps):
+            app = _post_app(session_id)
+            _, ms = timed(app.run)
+            first.append(ms)
+            _, ms = timed(app.run)
+            rerun.append(ms)
+        report[str(length)] = {"first_render_ms": summarize(first), "rerun_ms": summarize(rerun)}
+    return report
+
+
+def bench_memory():
+    def peak_kb(fn):
+        tracemalloc.start()
+        try:
+            fn()
+            return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        finally:
+            tracemalloc.stop()
+
+    def search_render():
+        app = _news_app()
+        app.run()
+        app.text_input[0].set_value(f"memory {uuid.uuid4().hex[:6]}")
+        app.slider[0].set_value(30)
+        app.button[0].click()
+        app.run()
+
+    long_history = _seed_history(max(HISTORY_LENGTHS))
+    report = {
+        "news_search_render_peak_kb": peak_kb(search_render),
+        "post_page_long_history_peak_kb": peak_kb(lambda: _post_app(long_history).run())
+    }
+    try:
+        import resource
+
+        # ru_maxrss is in kilobytes on Linux
+        report["process_max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        pass
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks with local DuckDuckGo and Gemini fakes.")
+    parser.add_argument("--reps", type=int, default=5, help="repetitions per measurement")
+    parser.add_argument("--ddg-latency-ms", type=float, default=250, help="latency of each DuckDuckGo request")
+    parser.add_argument("--ddg-jitter-ms", type=float, default=100)
+    parser.add_argument("--ddg-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-ttft-ms", type=float, default=600, help="Gemini time to first chunk")
+    parser.add_argument("--gemini-jitter-ms", type=float, default=200)
+    parser.add_argument("--gemini-chunk-ms", type=float, default=40, help="delay between streamed chunks")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--throttled", action="store_true",
+                        help="keep the production DuckDuckGo rate limits instead of disabling them")
+    parser.add_argument("--only", nargs="*", choices=["search", "news_page", "post", "post_page", "memory"],
+                        help="run only these scenarios")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    client, model = fakes.install(
+        ddgs_profile=fakes.LatencyProfile(args.ddg_latency_ms, args.ddg_jitter_ms, args.ddg_error_rate, seed=1),
+        gemini_profile=fakes.LatencyProfile(args.gemini_ttft_ms, args.gemini_jitter_ms, args.gemini_error_rate, seed=2),
+        unthrottled=not args.throttled,
+        chunk_ms=args.gemini_chunk_ms
+    )
+
+    scenarios = {
+        "search": lambda: bench_search(args.reps),
+        "news_page": lambda: bench_news_page(args.reps),
+        "post": lambda: bench_post(args.reps),
+        "post_page": lambda: bench_post_page(args.reps),
+        "memory": bench_memory
+    }
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "config": {name: value for name, value in vars(args).items() if name not in ("output", "only")},
+        "results": {}
+    }
+    for name, run in scenarios.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"running {name}...", file=sys.stderr)
+        report["results"][name] = run()
+    report["results"]["clients"] = {"duckduckgo": client.snapshot(), "gemini_calls": model.calls}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from singleflight import SingleFlight
+
+# Directory for on-disk caches (override with THINKWHY_CACHE_DIR)
+CACHE_DIR = os.getenv("THINKWHY_CACHE_DIR", ".cache")
+
+# Limits on each cache's SQLite tier; past either one, the entries that expire
+# soonest are deleted first
+MAX_DISK_ENTRIES = 10000
+MAX_DISK_BYTES = 256 * 1024 * 1024
+
+# Expired entries are purged from the SQLite tier on open and every this many writes
+PURGE_EVERY = 100
+
+# Process-wide registry so every Streamlit session shares the same caches
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def make_key(*parts):
+    """Build a stable cache key from the given parts."""
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """
+    In-process LRU backed by a SQLite tier, with TTLs and stale-while-revalidate.
+
+    Entries are fresh until their TTL runs out. After that they stay "stale"
+    for a grace period, during which they are still served immediately while
+    a background refresh fetches a new value.
+
+    Concurrent misses on the same key share one fetch (see self.flight).
+
+    The SQLite tier drops entries past their grace period and stays within
+    max_disk_entries rows and max_disk_bytes of values.
+    """
+
+    def __init__(self, name, max_entries=256, db_path=None, max_disk_entries=MAX_DISK_ENTRIES,
+                 max_disk_bytes=MAX_DISK_BYTES):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._writes = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.flight = SingleFlight()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "error_fallbacks": 0,
+            "purged": 0,
+        }
+
+        if db_path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            db_path = os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value BLOB, expires_at REAL, stale_until REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_stale_until ON cache (stale_until)")
+            self._purge()
+            self._db.commit()
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def _remember(self, key, entry):
+        # Caller must hold the lock
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _purge(self):
+        """Delete expired entries, then the soonest to expire while over the limits. Caller must hold the lock."""
+        purged = self._db.execute("DELETE FROM cache WHERE stale_until < ?", (time.time(),)).rowcount
+        rows = self._db.execute(
+            "SELECT key, LENGTH(value) FROM cache ORDER BY stale_until DESC"
+        ).fetchall()
+        kept_bytes = 0
+        for position, (key, size) in enumerate(rows):
+            kept_bytes += size or 0
+            if position >= self.max_disk_entries or kept_bytes > self.max_disk_bytes:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                purged += 1
+        self.stats["purged"] += purged
+
+    def lookup(self, key):
+        """
+        Return (value, state) where state is "fresh", "stale" or None for a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now < entry[1]:
+                self._memory.move_to_end(key)
+                tier = "memory_hits"
+            else:
+                # Another process (e.g. the prefetch scheduler) may have refreshed the disk tier
+                entry = None
+                row = self._db.execute(
+                    "SELECT value, expires_at, stale_until FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (pickle.loads(row[0]), row[1], row[2])
+                    self._remember(key, entry)
+                    tier = "disk_hits"
+
+        if entry is None or now >= entry[2]:
+            self._count("misses")
+            return None, None
+        if now < entry[1]:
+            self._count(tier)
+            return entry[0], "fresh"
+        self._count("stale_hits")
+        return entry[0], "stale"
+
+    def peek(self, key):
+        """Return the stored value for key however old it is, or None. Does not touch the counters."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                return entry[0]
+            row = self._db.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """Store a value that is fresh for ttl seconds and servable stale for stale_ttl more."""
+        expires_at = time.time() + ttl
+        entry = (value, expires_at, expires_at + stale_ttl)
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, entry)
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, stale_until) VALUES (?, ?, ?, ?)",
+                (key, blob, entry[1], entry[2]),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY == 0:
+                self._purge()
+            self._db.commit()
+
+    def invalidate(self, key):
+        """Drop a key from both tiers."""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _refresh(self, key, fetch, ttl, stale_ttl):
+        try:
+            self.set(key, fetch(), ttl, stale_ttl)
+            self._count("refreshes")
+        except Exception:
+            self._count("refresh_errors")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def refresh_in_background(self, key, fetch, ttl, stale_ttl=0):
+        """Start a background refresh of key unless one is already running."""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(
+            target=self._refresh, args=(key, fetch, ttl, stale_ttl), daemon=True
+        ).start()
+
+    def get_or_fetch(self, key, fetch, ttl, stale_ttl=0, stale_if_error=False, on_progress=None):
+        """
+        Return the cached value for key, calling fetch() on a miss.
+
+        Stale entries are returned right away and refreshed in a background thread.
+        With stale_if_error, a failing fetch() falls back to any stored value,
+        however old, before the error is raised.
+
+        A miss while another caller is already fetching key waits for that
+        fetch and shares its value or error. Such callers get on_progress()
+        for whatever the running fetch publishes through self.flight.publish(key, ...).
+        """
+        value, state = self.lookup(key)
+        if state == "fresh":
+            return value
+
+        if state == "stale":
+            self.refresh_in_background(key, fetch, ttl, stale_ttl)
+            return value
+
+        def fetch_and_store():
+            value = fetch()
+            self.set(key, value, ttl, stale_ttl)
+            return value
+
+        try:
+            return self.flight.do(key, fetch_and_store, on_progress)
+        except Exception:
+            fallback = self.peek(key) if stale_if_error else None
+            if fallback is None:
+                raise
+            self._count("error_fallbacks")
+            return fallback
+
+    def snapshot(self):
+        """Return a copy of the hit/miss counters plus current sizes and coalesced fetches."""
+        flight = self.flight.snapshot()
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (lookups - stats["misses"]) / lookups if lookups else 0.0
+        stats["coalesced"] = flight["coalesced"]
+        stats["in_flight"] = flight["in_flight"]
+        return stats
+
+
+def get_cache(name, **kwargs):
+    """Return the process-wide cache with the given name, creating it on first use."""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = TieredCache(name, **kwargs)
+        return _caches[name]
@@ -0,0 +1,92 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_DIR
+
+# Location of the post helper's chat history (override with THINKWHY_CHAT_PATH)
+CHAT_PATH = os.getenv("THINKWHY_CHAT_PATH", os.path.join(CACHE_DIR, "chat_history.sqlite3"))
+
+# Conversations untouched for this long are deleted when the store opens (seconds)
+CHAT_RETENTION = 30 * 24 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (session_id, position)
+);
+CREATE INDEX IF NOT EXISTS messages_updated ON messages (updated_at);
+"""
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class ChatStore:
+    """
+    Post helper conversations in SQLite, one row per message.
+
+    Messages are addressed by (session_id, position), where position counts
+    from 0 over the whole conversation, so the page only needs to keep a
+    window of recent messages in memory and can read older ones on demand.
+    """
+
+    def __init__(self, path=CHAT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._db.execute("DELETE FROM messages WHERE updated_at < ?", (time.time() - CHAT_RETENTION,))
+            self._db.commit()
+
+    def save(self, session_id, position, message):
+        """Insert or replace the message at position."""
+        data = json.dumps(message, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO messages (session_id, position, data, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, position, data, time.time()),
+            )
+            self._db.commit()
+
+    def count(self, session_id):
+        """Return the number of messages in the conversation."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+
+    def load(self, session_id, start, end):
+        """Return the messages with start <= position < end, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM messages WHERE session_id = ? AND position >= ? AND position < ? "
+                "ORDER BY position",
+                (session_id, start, end),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def recent(self, role, limit):
+        """Return up to limit messages with role from every conversation, most recently updated first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM messages WHERE json_extract(data, '$.role') = ? ORDER BY updated_at DESC LIMIT ?",
+                (role, limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def get_chat_store():
+    """Return the process-wide chat store."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = ChatStore()
+        return _instance
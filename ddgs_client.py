@@ -0,0 +1,329 @@
+import datetime
+import json
+import math
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from rate_limit import TokenBucket
+from tracing import current_span, traced
+
+# duckduckgo_search is imported on first use so pages that never search don't pay for it
+
+# Long-lived DDGS clients shared by every session in the process. Large enough for a
+# multi-region fan-out (searcher.MULTI_REGION_WORKERS is capped at this) plus a few other searches
+POOL_SIZE = 16
+
+# Process-wide budget for HTTP requests to DuckDuckGo. The burst covers one
+# multi-region fan-out (a vqd request plus one page for each of the 10 regions)
+REQUESTS_PER_SECOND = 2.0
+REQUEST_BURST = 20
+TOKEN_TIMEOUT = 20  # seconds to wait for budget before giving up
+
+# Retries with full-jitter exponential backoff
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Circuit breaker: open after this many failed calls in a row, probe again after RESET_TIMEOUT
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 60
+
+# DuckDuckGo returns roughly this many news results per page
+NEWS_PAGE_SIZE = 30
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class SearchUnavailableError(Exception):
+    """Base class for searches refused by the client itself, without calling DuckDuckGo."""
+
+
+class CircuitOpenError(SearchUnavailableError):
+    """Raised instead of calling DuckDuckGo while the circuit breaker is open."""
+
+
+class BudgetExhaustedError(SearchUnavailableError):
+    """Raised when no request budget frees up within TOKEN_TIMEOUT."""
+
+
+class CircuitBreaker:
+    """
+    Classic closed/open/half-open breaker.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected. Once reset_timeout has passed, a single probe call is let
+    through (half-open) while the others are still rejected; its success
+    closes the circuit, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _due(self):
+        # Caller must hold the lock
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+
+    def allow(self):
+        """Whether a call may go ahead; in half-open, only the caller that gets the probe is allowed."""
+        with self._lock:
+            self._due()
+            if self.state == "half_open":
+                if self.probing:
+                    return False
+                self.probing = True
+            return self.state != "open"
+
+    def rejecting(self):
+        """Whether allow() would refuse a call right now, without taking the half-open probe."""
+        with self._lock:
+            self._due()
+            return self.state == "open" or (self.state == "half_open" and self.probing)
+
+    def release(self):
+        """Give up the probe without an outcome (the call never reached DuckDuckGo)."""
+        with self._lock:
+            self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.probing = False
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class DDGSClient:
+    """
+    Shared DuckDuckGo client: a pool of long-lived DDGS instances behind a
+    process-wide token bucket, with retries and a circuit breaker.
+
+    factory() creates the pooled instances (DDGS by default); benchmarks pass
+    a stand-in with the same news(), _get_vqd() and _get_url() methods.
+    """
+
+    def __init__(self, pool_size=POOL_SIZE, requests_per_second=REQUESTS_PER_SECOND,
+                 burst=REQUEST_BURST, max_retries=MAX_RETRIES, factory=None):
+        self.max_retries = max_retries
+        self.factory = factory
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.breaker = CircuitBreaker()
+        # Instances are created lazily; None marks a free slot without one yet
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(None)
+        self._lock = threading.Lock()
+        # Seconds each thread has spent waiting for a free pool slot (see pool_wait_ms)
+        self._waits = threading.local()
+        self._latencies = deque(maxlen=500)
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "errors": 0,
+            "ratelimited": 0,
+            "retries": 0,
+            "circuit_rejections": 0,
+            "budget_timeouts": 0
+        }
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    @contextmanager
+    def connection(self):
+        """Borrow a DDGS instance from the pool."""
+        start = time.perf_counter()
+        ddgs = self._pool.get()
+        self._waits.total = getattr(self._waits, "total", 0.0) + time.perf_counter() - start
+        if ddgs is None:
+            if self.factory is not None:
+                ddgs = self.factory()
+            else:
+                from duckduckgo_search import DDGS
+
+                ddgs = DDGS()
+        try:
+            yield ddgs
+        except BaseException:
+            # Start the next borrower on a fresh client (new cookies and fingerprint)
+            ddgs = None
+            raise
+        finally:
+            self._pool.put(ddgs)
+
+    @traced("ddgs.call")
+    def call(self, fn, cost=1):
+        """
+        Run fn(ddgs) with rate limiting, retries and the circuit breaker.
+
+        cost is the number of HTTP requests fn makes, taken from the token bucket.
+        """
+        from duckduckgo_search.exceptions import DuckDuckGoSearchException, RatelimitException
+
+        if not self.breaker.allow():
+            self._count("circuit_rejections")
+            raise CircuitOpenError("DuckDuckGo circuit is open after repeated failures; try again shortly")
+        self._count("calls")
+
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(cost, timeout=TOKEN_TIMEOUT):
+                self.breaker.release()
+                self._count("budget_timeouts")
+                raise BudgetExhaustedError("Too many searches in progress; try again shortly")
+            try:
+                with self.connection() as ddgs:
+                    # Latency is DuckDuckGo's, not the wait for a free slot
+                    start = time.perf_counter()
+                    result = fn(ddgs)
+            except DuckDuckGoSearchException as e:
+                self._count("errors")
+                if isinstance(e, RatelimitException):
+                    self._count("ratelimited")
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                attempt += 1
+                self._count("retries")
+                time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+                continue
+            except Exception:
+                self._count("errors")
+                self.breaker.record_failure()
+                raise
+            with self._lock:
+                self._latencies.append((time.perf_counter() - start) * 1000)
+            self._count("successes")
+            self.breaker.record_success()
+            current_span().set(retries=attempt)
+            return result
+
+    def pool_wait_ms(self):
+        """Total time the calling thread has waited for pool slots, in milliseconds (compare two readings)."""
+        return getattr(self._waits, "total", 0.0) * 1000
+
+    def news(self, query, region="wt-wt", time_filter="d", max_results=10):
+        """DDGS.news() through the shared pool, limits and retries."""
+        # One request for the vqd token plus one per result page
+        pages = min(5, max(1, math.ceil((max_results or NEWS_PAGE_SIZE) / NEWS_PAGE_SIZE)))
+        return self.call(
+            lambda ddgs: list(ddgs.news(
+                query,
+                region=region,
+                safesearch="off",
+                timelimit=time_filter,
+                max_results=max_results
+            )),
+            cost=1 + pages
+        )
+
+    def iter_news_pages(self, query, region="wt-wt", time_filter="d", offset=0):
+        """
+        Yield pages (lists) of news articles from DuckDuckGo as each response arrives.
+
+        DDGS.news() only returns once every page is in, so this walks the same
+        news.js endpoint one page at a time. Articles are normalized the same
+        way DDGS.news() does it. Each page is its own pooled, rate-limited and
+        retried call, so a suspended generator does not hold a connection.
+        offset starts the walk that many results in, to continue a search
+        whose first results were already fetched.
+        Falls back to a single DDGS.news() page when the client does not
+        expose its request helpers.
+        """
+        from duckduckgo_search.utils import _normalize, _normalize_url
+
+        with self.connection() as ddgs:
+            paged = hasattr(ddgs, "_get_vqd") and hasattr(ddgs, "_get_url")
+        if not paged:
+            # This duckduckgo_search version hides its request helpers; fall back to one page
+            yield self.news(query, region, time_filter, max_results=None)
+            return
+
+        vqd = self.call(lambda ddgs: ddgs._get_vqd(query))
+        payload = {
+            "l": region,
+            "o": "json",
+            "noamp": "1",
+            "q": query,
+            "vqd": vqd,
+            "p": "-2"  # safesearch off
+        }
+        if time_filter:
+            payload["df"] = time_filter
+        if offset:
+            payload["s"] = str(offset)
+
+        seen_urls = set()
+        while True:
+            response = self.call(
+                lambda ddgs: json.loads(ddgs._get_url("GET", "https://duckduckgo.com/news.js", params=payload).content)
+            )
+            page = []
+            for row in response.get("results", []):
+                if row["url"] in seen_urls:
+                    continue
+                seen_urls.add(row["url"])
+                page.append({
+                    "date": datetime.datetime.fromtimestamp(row["date"], datetime.timezone.utc).isoformat(),
+                    "title": row["title"],
+                    "body": _normalize(row["excerpt"]),
+                    "url": _normalize_url(row["url"]),
+                    "image": _normalize_url(row.get("image")),
+                    "source": row["source"]
+                })
+            yield page
+
+            next_page = response.get("next")
+            if next_page is None:
+                return
+            payload["s"] = next_page.split("s=")[-1].split("&")[0]
+
+    def snapshot(self):
+        """Return call counters, error rate, latency percentiles and circuit state."""
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = sorted(self._latencies)
+        attempts = stats["successes"] + stats["errors"]
+        stats["error_rate"] = round(stats["errors"] / attempts, 3) if attempts else 0.0
+        if latencies:
+            stats["latency_p50_ms"] = round(latencies[len(latencies) // 2], 1)
+            stats["latency_p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1)
+        stats["circuit"] = self.breaker.state
+        stats["budget_tokens"] = round(self.bucket.available(), 2)
+        return stats
+
+
+def get_client():
+    """Return the process-wide DuckDuckGo client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DDGSClient()
+        return _client
+
+
+def set_client(client):
+    """Replace the process-wide client (e.g. with one built on a stand-in); returns the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+        return previous
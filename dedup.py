@@ -0,0 +1,414 @@
+import string
+import threading
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# numpy is imported inside the functions that need it, so importing this module stays cheap
+
+# Query parameters that only track the click and never change the page
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid",
+    "ocid", "cmpid", "cmp", "ref", "ref_src", "referrer", "src", "smid",
+    "ito", "guccounter", "guce_referrer", "guce_referrer_sig", "_ga",
+    "outputtype", "amp", "ncid", "taid", "yptr"
+}
+TRACKING_PREFIXES = ("utm_", "at_", "pk_", "mtm_", "__twitter")
+
+# Host prefixes for mobile/AMP mirrors of the same site
+MIRROR_SUBDOMAINS = ("www.", "m.", "mobile.", "amp.", "amp-")
+
+# SimHash settings: 64-bit fingerprints split into LSH_BANDS bands.
+# Two fingerprints within MAX_HAMMING_DISTANCE (< LSH_BANDS) bits always share a band.
+SIMHASH_BITS = 64
+LSH_BANDS = 6
+MAX_HAMMING_DISTANCE = 5
+
+# Title words count more than body words when fingerprinting
+TITLE_WEIGHT = 3
+
+# Fingerprints use at most this many tokens per article (title first, then body)
+MAX_TOKENS = 48
+
+# Only the start of the body is fingerprinted; wire copies diverge further down
+BODY_CHARS = 300
+
+# Common words that carry no signal about which story an article covers
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "for",
+    "by", "with", "from", "as", "is", "are", "was", "were", "be", "been", "it",
+    "its", "this", "that", "after", "over", "into", "says", "said", "will", "has",
+    "have", "had", "not", "new", "news"
+}
+
+# Upper bound on memoized fingerprints before the memo is reset
+FINGERPRINT_MEMO_SIZE = 50000
+
+# Articles kept per LSH bucket. Text with little variety (boilerplate, very short
+# items) can pile thousands of articles into one band value; past this size the
+# bucket stops taking members, so candidate checks stay linear. Such articles are
+# still found through their other bands
+MAX_BUCKET_SIZE = 32
+
+# Tokens are hashed on at most this many leading characters
+MAX_TOKEN_CHARS = 24
+
+# 64-bit FNV-1a, applied to the code points of each token
+FNV_OFFSET = 0xcbf29ce484222325
+FNV_PRIME = 0x100000001b3
+
+# Punctuation and whitespace become spaces before text is split into words
+_PUNCTUATION = str.maketrans({c: " " for c in string.punctuation + string.whitespace + "‘’“”—–…\u00a0\u2009\u200b\u202f"})
+
+# Band edges partition all 64 bits, e.g. widths 11/10/11/11/10/11 for 6 bands
+_BAND_EDGES = [round(band * SIMHASH_BITS / LSH_BANDS) for band in range(LSH_BANDS + 1)]
+
+# (title, body prefix) -> fingerprint, shared by every session in the process
+_fingerprint_memo = {}
+_fingerprint_memo_lock = threading.Lock()
+
+# Hashes of STOPWORDS and the byte -> bit lanes table, computed on first use
+_stopword_hashes = None
+_spread = None
+
+
+@lru_cache(maxsize=65536)
+def canonicalize_url(url):
+    """Normalize a news URL so syndicated, AMP, mobile and tracked variants compare equal."""
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+
+    host = parts.netloc.lower()
+    if host.endswith(":80") or host.endswith(":443"):
+        host = host.rsplit(":", 1)[0]
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in MIRROR_SUBDOMAINS:
+            if host.startswith(prefix) and host.count(".") > 1:
+                host = host[len(prefix):]
+                stripped = True
+
+    # Drop AMP path segments such as /amp/story or /story/amp or /story.amp
+    segments = [s for s in parts.path.split("/") if s and s.lower() != "amp"]
+    path = "/".join(segments)
+    if path.lower().endswith(".amp"):
+        path = path[:-4]
+    elif path.lower().endswith(".amp.html"):
+        path = path[:-9] + ".html"
+
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+
+    return urlunsplit(("https", host, "/" + path if path else "", urlencode(query), ""))
+
+
+def _token_hashes(texts):
+    """
+    Split texts into words and hash them, without a Python object per word.
+
+    The texts are lowercased and joined into one string whose code points
+    are scanned with NumPy for word boundaries; each word's FNV-1a hash is
+    built one character position at a time across all words at once.
+    Returns (hashes, documents): uint64 hashes in text order and the index
+    of the text each word came from.
+    """
+    import numpy as np
+
+    # Texts are joined with a space; a word starting before a text's end belongs to it
+    ends = np.cumsum([len(text) + 1 for text in texts])
+    joined = " ".join(texts).lower()
+    if texts and len(joined) != ends[-1] - 1:
+        # A few characters (e.g. "İ") change length when lowercased
+        texts = [text.lower() for text in texts]
+        ends = np.cumsum([len(text) + 1 for text in texts])
+        joined = " ".join(texts)
+    joined = joined.translate(_PUNCTUATION)
+    codes = np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    # Spaces and control characters end words
+    in_word = np.concatenate(([False], codes > 32, [False]))
+    boundaries = np.diff(in_word.view(np.int8))
+    starts = np.flatnonzero(boundaries == 1)
+    lengths = np.flatnonzero(boundaries == -1) - starts
+    documents = np.searchsorted(ends, starts, side="right")
+
+    # Longest words first, so the words still being hashed at each position are a prefix
+    order = np.argsort(-lengths, kind="stable")
+    starts, lengths = starts[order], lengths[order]
+    remaining = np.searchsorted(-lengths, -np.arange(1, MAX_TOKEN_CHARS + 1), side="right")
+    hashes = np.full(len(starts), FNV_OFFSET, dtype=np.uint64)
+    prime = np.uint64(FNV_PRIME)
+    with np.errstate(over="ignore"):
+        for k, count in enumerate(remaining):
+            if not count:
+                break
+            active = hashes[:count]
+            active ^= codes[starts[:count] + k]
+            active *= prime
+    unsorted = np.empty_like(hashes)
+    unsorted[order] = hashes
+    return unsorted, documents
+
+
+def _stopwords():
+    global _stopword_hashes
+    if _stopword_hashes is None:
+        _stopword_hashes = _token_hashes([" ".join(sorted(STOPWORDS))])[0]
+    return _stopword_hashes
+
+
+def _popcount(values):
+    """Number of set bits in each element of a uint64 array."""
+    import numpy as np
+
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+    with np.errstate(over="ignore"):
+        return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def _spread_table():
+    """Maps a byte to a uint64 with bit i of the byte in the low bit of byte i."""
+    import numpy as np
+
+    return np.array([sum(((value >> i) & 1) << (8 * i) for i in range(8)) for value in range(256)], dtype=np.uint64)
+
+
+def _compute_fingerprints(texts):
+    """Vectorized SimHash over a list of (title, body) pairs."""
+    import numpy as np
+
+    n = len(texts)
+    title_hashes, title_documents = _token_hashes([title for title, _ in texts])
+    body_hashes, body_documents = _token_hashes([body[:BODY_CHARS] for _, body in texts])
+    hashes = np.concatenate((title_hashes, body_hashes))
+    documents = np.concatenate((title_documents, body_documents))
+    weights = np.concatenate((np.full(len(title_hashes), TITLE_WEIGHT, dtype=np.uint64),
+                              np.ones(len(body_hashes), dtype=np.uint64)))
+    keep = ~np.isin(hashes, _stopwords())
+    hashes, documents, weights = hashes[keep], documents[keep], weights[keep]
+
+    # Each distinct word counts once per article, at its first occurrence (so title words win)
+    with np.errstate(over="ignore"):
+        keys = hashes ^ (documents.astype(np.uint64) * np.uint64(0x9e3779b97f4a7c15))
+    order = np.argsort(keys)
+    keys = keys[order]
+    runs = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    first = np.sort(np.minimum.reduceat(order, runs)) if len(order) else order
+    # Titles then bodies are each in article order, so a stable sort by article just merges them
+    first = first[np.argsort(documents[first], kind="stable")]
+    hashes, documents, weights = hashes[first], documents[first], weights[first]
+    # At most MAX_TOKENS words per article
+    rank = np.arange(len(documents)) - np.searchsorted(documents, documents)
+    keep = rank < MAX_TOKENS
+    hashes, documents, weights = hashes[keep], documents[keep], weights[keep]
+
+    set_weight = np.zeros((n, SIMHASH_BITS // 8), dtype=np.uint64)
+    if len(hashes):
+        global _spread
+        if _spread is None:
+            _spread = _spread_table()
+        # Each hash byte becomes eight 8-bit counters in one uint64; an article
+        # adds at most MAX_TOKENS * TITLE_WEIGHT (< 256) to a counter, so they never carry
+        lanes = (_spread[hashes.view(np.uint8).reshape(-1, 8)] * weights[:, None]).T.copy()
+        # Words are grouped by article, so each article's counts are one segment sum
+        present, offsets = np.unique(documents, return_index=True)
+        set_weight[present] = np.add.reduceat(lanes, offsets, axis=1).T
+    set_weight = set_weight.view(np.uint8).reshape(n, SIMHASH_BITS).astype(np.int32)
+    total_weight = np.bincount(documents, weights=weights, minlength=n)
+    # A fingerprint bit is on when most of the article's token weight has it on
+    on = (2 * set_weight > total_weight[:, None]) & (total_weight[:, None] > 0)
+    return np.packbits(on, axis=1, bitorder="little").view(np.uint64).ravel()
+
+
+def simhash_fingerprints(articles):
+    """
+    Return 64-bit SimHash fingerprints for the articles as a uint64 array.
+
+    They are memoized per (title, body), so re-deduplicating cached or
+    accumulated result sets only pays for new articles.
+    """
+    import numpy as np
+
+    texts = [(a.title, a.body[:BODY_CHARS]) for a in articles]
+    with _fingerprint_memo_lock:
+        known = {text: _fingerprint_memo[text] for text in texts if text in _fingerprint_memo}
+    missing = list({text for text in texts if text not in known})
+    if missing:
+        computed = dict(zip(missing, _compute_fingerprints(missing).tolist()))
+        known.update(computed)
+        with _fingerprint_memo_lock:
+            if len(_fingerprint_memo) + len(computed) > FINGERPRINT_MEMO_SIZE:
+                _fingerprint_memo.clear()
+            _fingerprint_memo.update(computed)
+    return np.array([known[text] for text in texts], dtype=np.uint64)
+
+
+def band_keys(fingerprint):
+    """The LSH bucket keys of one fingerprint (an int), one per band."""
+    # Each band's values are offset so one dict can hold every band's buckets
+    return [band << 16 | (fingerprint >> low) & ((1 << (high - low)) - 1)
+            for band, (low, high) in enumerate(zip(_BAND_EDGES, _BAND_EDGES[1:]))]
+
+
+def _earliest_matches(fingerprints, max_distance):
+    """
+    For each article, the earliest article before it whose fingerprint is
+    within max_distance bits, among the first MAX_BUCKET_SIZE members of the
+    LSH buckets they share (-1 for none). Articles without a fingerprint
+    never match.
+    """
+    import numpy as np
+
+    n = len(fingerprints)
+    match = np.full(n, -1, dtype=np.int64)
+    positions = np.flatnonzero(fingerprints)
+    firsts, seconds = [], []
+    for band, (low, high) in enumerate(zip(_BAND_EDGES, _BAND_EDGES[1:])):
+        keys = (fingerprints[positions] >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+        # Members of each bucket in arrival order
+        order = positions[np.lexsort((positions, keys))]
+        keys = np.sort(keys)
+        group_start = np.searchsorted(keys, keys)
+        rank = np.arange(len(order)) - group_start
+        # The r-th member of a bucket (kept while r < MAX_BUCKET_SIZE) is a candidate for every later member
+        for r in range(min(MAX_BUCKET_SIZE, int(rank.max(initial=-1)) + 1)):
+            later = np.flatnonzero(rank > r)
+            firsts.append(order[group_start[later] + r])
+            seconds.append(order[later])
+    if not firsts:
+        return match
+    firsts, seconds = np.concatenate(firsts), np.concatenate(seconds)
+    close = _popcount(fingerprints[firsts] ^ fingerprints[seconds]) <= max_distance
+    firsts, seconds = firsts[close], seconds[close]
+    if len(firsts):
+        # Smallest first per second: sort by (second, first) and take each group's head
+        order = np.lexsort((firsts, seconds))
+        heads = np.unique(seconds[order], return_index=True)[1]
+        match[seconds[order][heads]] = firsts[order][heads]
+    return match
+
+
+class _ClusterIndex:
+    """
+    Assigns articles, one at a time, to story clusters.
+
+    It applies the rules of cluster_articles to one article at a time, with
+    the same MAX_BUCKET_SIZE members kept per bucket, so the two agree.
+    """
+
+    def __init__(self, max_distance=MAX_HAMMING_DISTANCE):
+        self.max_distance = max_distance
+        self.clusters = []
+        self._fingerprints = []
+        self._cluster_of = []
+        self._urls = {}
+        self._buckets = {}
+
+    def add(self, canonical, fingerprint):
+        """Place an article; returns (cluster, is_new)."""
+        position = len(self._cluster_of)
+        match = self._urls.get(canonical) if canonical else None
+        # Articles without any text have no fingerprint to compare
+        keys = band_keys(fingerprint) if fingerprint else ()
+        if match is None and fingerprint:
+            candidates = set()
+            for key in keys:
+                candidates.update(self._buckets.get(key, ()))
+            for other in sorted(candidates):
+                if bin(fingerprint ^ self._fingerprints[other]).count("1") <= self.max_distance:
+                    match = other
+                    break
+
+        if match is None:
+            cluster, is_new = len(self.clusters), True
+            self.clusters.append([position])
+        else:
+            cluster, is_new = self._cluster_of[match], False
+            self.clusters[cluster].append(position)
+        self._cluster_of.append(cluster)
+        self._fingerprints.append(fingerprint)
+        if canonical:
+            self._urls.setdefault(canonical, position)
+        for key in keys:
+            members = self._buckets.setdefault(key, [])
+            if len(members) < MAX_BUCKET_SIZE:
+                members.append(position)
+        return cluster, is_new
+
+
+def cluster_articles(articles, max_distance=MAX_HAMMING_DISTANCE):
+    """
+    Group articles that are the same story.
+
+    An article joins the cluster of the earliest article before it with the
+    same canonical URL or, failing that, of the earliest one whose SimHash
+    fingerprint is within max_distance bits, found through banded LSH
+    buckets (two fingerprints within max_distance < LSH_BANDS bits always
+    share a band). Returns a list of clusters (lists of indices), ordered by each cluster's
+    first article.
+    """
+    near = _earliest_matches(simhash_fingerprints(articles), max_distance).tolist()
+    first_with_url = {}
+    clusters = []
+    cluster_of = []
+    for i, article in enumerate(articles):
+        canonical = article.canonical_url
+        match = first_with_url.setdefault(canonical, i) if canonical else i
+        if match == i:
+            match = near[i]
+        if match < 0:
+            cluster_of.append(len(clusters))
+            clusters.append([i])
+        else:
+            cluster_of.append(cluster_of[match])
+            clusters[cluster_of[match]].append(i)
+    return clusters
+
+
+def _alternate(article):
+    return {"source": article.source, "title": article.title, "url": article.url}
+
+
+def collapse_duplicates(articles, max_distance=MAX_HAMMING_DISTANCE):
+    """
+    Collapse each cluster of duplicate articles into its first article.
+
+    The kept article is a copy with an alternates list holding the source,
+    title and url of every other copy of the story.
+    """
+    return [
+        articles[cluster[0]].replace(alternates=[_alternate(articles[i]) for i in cluster[1:]])
+        for cluster in cluster_articles(articles, max_distance)
+    ]
+
+
+class StreamingDeduplicator:
+    """
+    Incremental version of collapse_duplicates for articles that arrive one at a time.
+
+    add() returns None when the article starts a new story, or the position of
+    the earlier lead article it duplicates. Fed the same articles in the same
+    order, it groups them exactly as collapse_duplicates does.
+    """
+
+    def __init__(self, max_distance=MAX_HAMMING_DISTANCE):
+        self.leads = []
+        self._index = _ClusterIndex(max_distance)
+
+    def add(self, article):
+        fingerprint = int(simhash_fingerprints([article])[0])
+        cluster, is_new = self._index.add(article.canonical_url, fingerprint)
+        if not is_new:
+            self.leads[cluster].alternates.append(_alternate(article))
+            return cluster
+        # A copy, since the record itself may be shared through the cache
+        self.leads.append(article.replace(alternates=[]))
+        return None
@@ -0,0 +1,155 @@
+import re
+import time
+from collections import namedtuple
+
+# numpy is imported inside the methods that need it, so importing this module stays cheap
+
+# Sort orders offered over fetched results; "relevance" keeps DuckDuckGo's order
+SORTS = {
+    "Relevance": "relevance",
+    "Newest first": "newest",
+    "Oldest first": "oldest",
+    "Source (A–Z)": "source"
+}
+
+# Date windows (seconds back from now, None for any time)
+WINDOWS = {
+    "Any time": None,
+    "Last hour": 60 * 60,
+    "Last 6 hours": 6 * 60 * 60,
+    "Last 24 hours": 24 * 60 * 60,
+    "Last week": 7 * 24 * 60 * 60
+}
+
+# Keyword masks kept before the memo is reset (they go stale whenever articles are added)
+WORD_MASK_MEMO_SIZE = 256
+
+# Words for keyword filtering: runs of letters and digits, so "ai" does not match "said"
+WORD_PATTERN = re.compile(r"\w+")
+
+FacetView = namedtuple("FacetView", ["articles", "source_counts", "window_counts", "elapsed_ms"])
+
+
+class FacetIndex:
+    """
+    Column store over a growing list of Article records for filtering,
+    sorting and facet counts without another search.
+
+    Source codes and timestamps are kept as NumPy arrays, rebuilt only when
+    articles were added; the set of lowercased title and body words is kept
+    per article for filtering by keyword, with a mask memoized per word. Facet counts are disjunctive: source counts
+    ignore the source filter and window counts ignore the window, so they
+    say what picking that value would show.
+    """
+
+    def __init__(self):
+        self.articles = []
+        self.sources = []
+        self._source_codes = {}
+        self._codes = []
+        self._timestamps = []
+        self._words = []
+        self._arrays = None
+        self._word_masks = {}
+
+    def __len__(self):
+        return len(self.articles)
+
+    def sync(self, articles):
+        """Index articles appended to the list since the last call (the list only grows)."""
+        added = articles[len(self.articles):]
+        for article in added:
+            code = self._source_codes.setdefault(article.source, len(self.sources))
+            if code == len(self.sources):
+                self.sources.append(article.source)
+            self.articles.append(article)
+            self._codes.append(code)
+            self._timestamps.append(article.timestamp if article.timestamp is not None else float("nan"))
+            self._words.append(frozenset(WORD_PATTERN.findall(f"{article.title}\n{article.body}".lower())))
+        if added:
+            self._word_masks.clear()
+        return self
+
+    def _columns(self):
+        import numpy as np
+
+        if self._arrays is None or len(self._arrays[0]) != len(self.articles):
+            self._arrays = (np.array(self._codes, dtype=np.int32), np.array(self._timestamps, dtype=np.float64))
+        return self._arrays
+
+    def _keyword_mask(self, keyword):
+        """Articles whose title or body has every word of keyword (as a whole word), or None for no keyword."""
+        import numpy as np
+
+        mask = None
+        for word in set(WORD_PATTERN.findall(keyword.lower())):
+            word_mask = self._word_masks.get(word)
+            if word_mask is None:
+                if len(self._word_masks) >= WORD_MASK_MEMO_SIZE:
+                    self._word_masks.clear()
+                word_mask = self._word_masks[word] = np.fromiter(
+                    (word in words for words in self._words), dtype=bool, count=len(self._words)
+                )
+            mask = word_mask if mask is None else mask & word_mask
+        return mask
+
+    def source_totals(self):
+        """Every indexed source with its article count, most articles first."""
+        import numpy as np
+
+        counts = np.bincount(self._columns()[0], minlength=len(self.sources)).tolist()
+        return dict(sorted(zip(self.sources, counts), key=lambda item: (-item[1], item[0])))
+
+    def query(self, sources=(), window=None, keyword="", sort="relevance", now=None):
+        """
+        Return a FacetView of the articles matching every filter, in the given order.
+
+        sources limits the result to those source names, window to articles
+        published within that many seconds before now, and keyword to
+        articles mentioning all of its words.
+        """
+        import numpy as np
+
+        start = time.perf_counter()
+        codes, timestamps = self._columns()
+        now = time.time() if now is None else now
+        everything = np.ones(len(self.articles), dtype=bool)
+
+        keyword_mask = self._keyword_mask(keyword)
+        if keyword_mask is None:
+            keyword_mask = everything
+        source_mask = everything
+        if sources:
+            wanted = [self._source_codes[s] for s in sources if s in self._source_codes]
+            source_mask = np.isin(codes, wanted)
+        with np.errstate(invalid="ignore"):
+            # Undated articles (NaN) fall outside every window
+            window_masks = {
+                label: everything if seconds is None else timestamps >= now - seconds
+                for label, seconds in WINDOWS.items()
+            }
+            window_mask = everything if window is None else timestamps >= now - window
+
+        source_counts = np.bincount(codes[keyword_mask & window_mask], minlength=len(self.sources)).tolist()
+        window_base = keyword_mask & source_mask
+        window_counts = {label: int(np.count_nonzero(window_base & mask)) for label, mask in window_masks.items()}
+
+        positions = np.flatnonzero(keyword_mask & source_mask & window_mask)
+        if sort == "newest":
+            # NaN sorts last either way, so undated articles come last
+            positions = positions[np.argsort(-timestamps[positions], kind="stable")]
+        elif sort == "oldest":
+            positions = positions[np.argsort(timestamps[positions], kind="stable")]
+        elif sort == "source":
+            # Alphabetical rank of each source code, newest first within a source
+            ranks = np.empty(len(self.sources), dtype=np.int32)
+            ranks[sorted(range(len(self.sources)), key=lambda code: self.sources[code].lower())] = \
+                np.arange(len(self.sources))
+            positions = positions[np.lexsort((-timestamps[positions], ranks[codes[positions]]))]
+
+        return FacetView(
+            [self.articles[i] for i in positions.tolist()],
+            dict(zip(self.sources, source_counts)),
+            window_counts,
+            (time.perf_counter() - start) * 1000
+        )
@@ -0,0 +1,342 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+from tracing import span
+
+# numpy is imported inside the functions that need it, so importing this module stays cheap
+
+# Rebuild the index from the chat history and archive this often (in the background; seconds)
+INDEX_TTL = 10 * 60
+
+# Most past posts and archived articles read per build, newest first
+MAX_POSTS = 5000
+MAX_ARTICLES = 5000
+
+# Tags kept in the index (the co-occurrence matrix is MAX_TAGS x MAX_TAGS float32)
+MAX_TAGS = 1024
+
+# Archived articles have no hashtags: each is tagged with up to this many of its most
+# distinctive title words, and such a word becomes a tag once MIN_ARTICLE_TAG_DOCS articles share it
+ARTICLE_TAGS = 3
+MIN_ARTICLE_TAG_DOCS = 2
+
+# Articles weigh less than posts, whose hashtags people actually chose
+ARTICLE_WEIGHT = 0.5
+
+# How much each signal counts towards a tag's score
+CONTENT_WEIGHT = 1.0
+DIRECT_WEIGHT = 0.5
+COOCCURRENCE_WEIGHT = 0.3
+LABEL_WEIGHT = 0.2
+POPULARITY_WEIGHT = 0.05
+
+# Best content matches whose co-occurring tags are boosted
+COOCCURRENCE_SEEDS = 5
+
+HASHTAG_RE = re.compile(r"#(\w+)")
+WORD_RE = re.compile(r"[a-z][a-z0-9']{2,}")
+
+STOPWORDS = frozenset("""
+about above after again against all also and any are aren't because been before being below between both but
+can can't cannot could did didn't does doesn't doing don't down during each even ever every few for from further
+get gets got had has hasn't have haven't having her here hers herself him himself his how however into isn't it's
+its itself just let's like made make many may more most much must new not now off once one only other our ours
+ourselves out over own per said same say says she should since some still such than that that's the their theirs
+them themselves then there these they this those through too under until upon very via was wasn't way well were
+weren't what when where which while who whom why will with within without won't would yet you your yours yourself
+yourselves year years today week first two three back next last time people post posts
+""".split())
+
+# One post or article as the index sees it: its text, its hashtags (None for articles, which
+# are tagged from their titles), the audience/theme it was written for (or the article's
+# category) and how much it counts
+Document = namedtuple("Document", ["text", "tags", "labels", "weight"])
+
+
+def extract_hashtags(text):
+    """Return the hashtags in text, without the #, in order of appearance."""
+    return HASHTAG_RE.findall(text)
+
+
+def strip_hashtags(text):
+    """Return text without its hashtags."""
+    return HASHTAG_RE.sub(" ", text)
+
+
+def tokenize(text):
+    """Lowercase content words of text (hashtags, short words and stopwords left out)."""
+    return [word for word in WORD_RE.findall(strip_hashtags(text).lower()) if word not in STOPWORDS]
+
+
+def term_weights(counts, idf):
+    """L2-normalized TF-IDF weights ({term: weight}) for a Counter of terms, skipping unknown terms."""
+    weights = {term: (1 + math.log(count)) * idf[term] for term, count in counts.items() if term in idf}
+    norm = math.sqrt(sum(w * w for w in weights.values()))
+    return {term: w / norm for term, w in weights.items()} if norm else {}
+
+
+class HashtagIndex:
+    """
+    Hashtag suggestions from past posts and archived news, without Gemini.
+
+    Each tag is represented by the TF-IDF centroid of the documents carrying
+    it, stored column-wise over terms (a CSR layout: the rows of a post's
+    terms are gathered and summed with np.bincount). A post's score for a
+    tag adds its cosine similarity to that centroid, a bonus when the post
+    mentions the tag word itself, the tags that co-occur with its best
+    matches, how often the tag was used for the same audience and theme,
+    and a little popularity.
+    """
+
+    def __init__(self, documents=()):
+        import numpy as np
+
+        start = time.perf_counter()
+        documents = list(documents)
+        tokens = [Counter(tokenize(document.text)) for document in documents]
+        df = Counter(term for counts in tokens for term in counts)
+        total = len(documents)
+        self.idf = {term: math.log((1 + total) / (1 + count)) + 1 for term, count in df.items()}
+
+        # Articles are tagged with their most distinctive title words that other articles share
+        tag_sets = []
+        for document in documents:
+            if document.tags is not None:
+                tag_sets.append({tag.lower() for tag in document.tags})
+                continue
+            title = document.text.split("\n", 1)[0]
+            candidates = {term for term in tokenize(title) if df[term] >= MIN_ARTICLE_TAG_DOCS}
+            tag_sets.append(set(sorted(candidates, key=lambda term: (-self.idf[term], term))[:ARTICLE_TAGS]))
+
+        # Display form of each tag: its most common spelling in posts (articles only have lowercase words)
+        spellings = Counter(tag for document in documents if document.tags for tag in document.tags)
+        post_tags = {tag.lower() for tag in spellings}
+        tag_docs = Counter(tag for tags in tag_sets for tag in tags)
+        kept = [tag for tag, count in tag_docs.most_common()
+                if count >= MIN_ARTICLE_TAG_DOCS or tag in post_tags][:MAX_TAGS]
+        self.tags = kept
+        self.tag_ids = {tag: i for i, tag in enumerate(kept)}
+        display = {}
+        for spelling, _ in spellings.most_common():
+            display.setdefault(spelling.lower(), spelling)
+        self.display = [display.get(tag, tag) for tag in kept]
+
+        self.terms = {}
+        label_ids = {}
+        rows, cols, vals = [], [], []
+        pairs = []
+        label_rows, label_cols, label_vals = [], [], []
+        doc_tags = []
+        for document, counts, tags in zip(documents, tokens, tag_sets):
+            ids = sorted(self.tag_ids[tag] for tag in tags if tag in self.tag_ids)
+            if not ids:
+                continue
+            doc_tags.append((ids, document.weight))
+            for term, weight in term_weights(counts, self.idf).items():
+                term_id = self.terms.setdefault(term, len(self.terms))
+                rows.extend([term_id] * len(ids))
+                cols.extend(ids)
+                vals.extend([weight * document.weight] * len(ids))
+            for i, a in enumerate(ids):
+                for b in ids[i + 1:]:
+                    pairs.append((a, b, document.weight))
+            for label in document.labels:
+                if label:
+                    label_id = label_ids.setdefault(label, len(label_ids))
+                    label_rows.extend([label_id] * len(ids))
+                    label_cols.extend(ids)
+                    label_vals.extend([document.weight] * len(ids))
+
+        tag_count = len(kept)
+        # Sum duplicate (term, tag) entries, then order by term for the CSR row pointers
+        keys = np.asarray(rows, dtype=np.int64) * max(tag_count, 1) + np.asarray(cols, dtype=np.int64)
+        keys, inverse = np.unique(keys, return_inverse=True)
+        data = np.bincount(inverse, weights=np.asarray(vals, dtype=np.float64), minlength=len(keys))
+        term_of, self.indices = np.divmod(keys, max(tag_count, 1))
+        self.indices = self.indices.astype(np.int32)
+        # Normalize each tag's centroid so the score is a cosine similarity
+        norms = np.sqrt(np.bincount(self.indices, weights=data * data, minlength=tag_count))
+        self.data = (data / np.where(norms > 0, norms, 1)[self.indices]).astype(np.float32)
+        self.indptr = np.searchsorted(term_of, np.arange(len(self.terms) + 1)).astype(np.int64)
+
+        # P(b | a): how often tag b is used alongside tag a, weighted like the documents
+        usage = np.zeros(tag_count, dtype=np.float64)
+        for ids, weight in doc_tags:
+            usage[ids] += weight
+        self.cooccurrence = np.zeros((tag_count, tag_count), dtype=np.float32)
+        if pairs:
+            a, b, w = (np.asarray(column) for column in zip(*pairs))
+            np.add.at(self.cooccurrence, (a.astype(np.int64), b.astype(np.int64)), w)
+            np.add.at(self.cooccurrence, (b.astype(np.int64), a.astype(np.int64)), w)
+            self.cooccurrence /= np.where(usage > 0, usage, 1)[:, None].astype(np.float32)
+
+        # Per audience/theme/category: each tag's usage relative to that label's most used tag
+        self.label_ids = label_ids
+        self.label_usage = np.zeros((len(label_ids), tag_count), dtype=np.float32)
+        if label_vals:
+            np.add.at(self.label_usage, (np.asarray(label_rows), np.asarray(label_cols)), label_vals)
+            peak = self.label_usage.max(axis=1, keepdims=True)
+            self.label_usage /= np.where(peak > 0, peak, 1)
+
+        self.popularity = (np.log1p(usage) / math.log1p(usage.max())).astype(np.float32) if tag_count and usage.max() \
+            else np.zeros(tag_count, dtype=np.float32)
+        self.documents = len(doc_tags)
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    def __len__(self):
+        return len(self.tags)
+
+    def scores(self, text, labels=()):
+        """Score every tag for text written for labels (audience, theme); a float32 array in tag order."""
+        import numpy as np
+
+        counts = Counter(tokenize(text))
+        for label in labels:
+            # "Health & Fitness" counts as the words health and fitness
+            counts.update(tokenize(label or ""))
+        weights = term_weights(counts, self.idf)
+        scores = np.zeros(len(self.tags), dtype=np.float32)
+        if not len(self.tags):
+            return scores
+
+        ids = [(self.terms[term], weight) for term, weight in weights.items() if term in self.terms]
+        if ids:
+            term_ids = np.array([term_id for term_id, _ in ids], dtype=np.int64)
+            starts, ends = self.indptr[term_ids], self.indptr[term_ids + 1]
+            lengths = ends - starts
+            # Positions of every stored (term, tag) entry for the post's terms
+            positions = np.repeat(ends - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+            term_weight = np.repeat(np.array([weight for _, weight in ids], dtype=np.float32), lengths)
+            scores += CONTENT_WEIGHT * np.bincount(self.indices[positions], weights=self.data[positions] * term_weight,
+                                                   minlength=len(self.tags)).astype(np.float32)
+
+        direct = [self.tag_ids[term] for term in counts if term in self.tag_ids]
+        scores[direct] += DIRECT_WEIGHT
+
+        seeds = np.argsort(-scores, kind="stable")[:COOCCURRENCE_SEEDS]
+        seeds = seeds[scores[seeds] > 0]
+        if len(seeds):
+            boost = scores[seeds] @ self.cooccurrence[seeds]
+            peak = boost.max()
+            if peak > 0:
+                scores += COOCCURRENCE_WEIGHT * boost / peak
+
+        rows = [self.label_ids[label] for label in labels if label in self.label_ids]
+        if rows:
+            scores += LABEL_WEIGHT * self.label_usage[rows].mean(axis=0)
+        scores += POPULARITY_WEIGHT * self.popularity
+        return scores
+
+    def suggest(self, text, count, target_audience=None, theme=None, exclude=()):
+        """
+        Return up to count hashtags ("#tag") for a post, best first.
+
+        Only tags with some evidence from the post itself or from posts for
+        the same audience and theme are returned, so a small or unrelated
+        index returns fewer (possibly none). Tags in exclude are skipped.
+        """
+        import numpy as np
+
+        with span("hashtags.suggest", tags=len(self.tags)) as s:
+            scores = self.scores(text, (target_audience, theme))
+            # Popularity alone is not evidence
+            evidence = scores > POPULARITY_WEIGHT
+            skipped = [self.tag_ids[tag.lstrip("#").lower()] for tag in exclude if tag.lstrip("#").lower() in self.tag_ids]
+            evidence[skipped] = False
+            candidates = np.flatnonzero(evidence)
+            if len(candidates) > count:
+                candidates = candidates[np.argpartition(-scores[candidates], count - 1)[:count]]
+            best = candidates[np.argsort(-scores[candidates], kind="stable")]
+            s.set(suggested=len(best))
+            return ["#" + self.display[i] for i in best.tolist()]
+
+    def snapshot(self):
+        return {"tags": len(self.tags), "terms": len(self.terms), "documents": self.documents,
+                "build_ms": round(self.build_ms, 1)}
+
+
+def load_documents(max_posts=MAX_POSTS, max_articles=MAX_ARTICLES):
+    """Documents for the index: optimized posts from the chat history and articles from the archive."""
+    from archive import get_archive
+    from chat_store import get_chat_store
+
+    documents = []
+    for message in get_chat_store().recent("assistant", max_posts):
+        tags = extract_hashtags(message.get("content", ""))
+        if not tags:
+            continue
+        request = message.get("request") or {}
+        args = request.get("args") or []
+        # Audience and theme come right before tone and hashtag_count in both request kinds
+        labels = tuple(args[-4:-2]) if len(args) >= 5 else ()
+        documents.append(Document(message["content"], tags, labels, 1.0))
+    for title, body, category in get_archive().texts(max_articles):
+        documents.append(Document(f"{title}\n{body}", None, (category,), ARTICLE_WEIGHT))
+    return documents
+
+
+def build_index():
+    """Build a HashtagIndex from the chat history and the archive."""
+    with span("hashtags.build") as s:
+        index = HashtagIndex(load_documents())
+        s.set(**index.snapshot())
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+# Held while an index is built, so a caller that needs one waits for a build already running
+_build_lock = threading.Lock()
+_built_at = 0.0
+_refreshing = False
+_replaced = False
+
+
+def _store(index):
+    global _index, _built_at
+    with _index_lock:
+        if not _replaced:
+            _index, _built_at = index, time.time()
+
+
+def _refresh():
+    global _refreshing
+    try:
+        with _build_lock:
+            _store(build_index())
+    finally:
+        _refreshing = False
+
+
+def get_hashtag_index(wait=True):
+    """
+    Return the process-wide hashtag index.
+
+    The first call builds it (with wait=False, it starts the build in the
+    background and returns None). After INDEX_TTL the current index keeps
+    answering while a fresh one is built in the background.
+    """
+    global _refreshing
+    with _index_lock:
+        if _index is not None or not wait:
+            if not _replaced and not _refreshing and (_index is None or time.time() - _built_at > INDEX_TTL):
+                _refreshing = True
+                threading.Thread(target=_refresh, name="hashtag-index", daemon=True).start()
+            return _index
+    with _build_lock:
+        # A background build may have finished while this call waited for it
+        if _index is None:
+            _store(build_index())
+        return _index
+
+
+def set_hashtag_index(index):
+    """Replace the process-wide index (e.g. one built from benchmark data); it is kept until replaced again."""
+    global _index, _built_at, _replaced
+    with _index_lock:
+        previous, _index = _index, index
+        _built_at, _replaced = time.time(), index is not None
+        return previous
@@ -0,0 +1,110 @@
+import datetime
+import time
+
+import streamlit as st
+
+import tracing
+
+# Time windows offered on the page (seconds back from now, None for everything recorded)
+WINDOWS = {
+    "Last 15 minutes": 15 * 60,
+    "Last hour": 60 * 60,
+    "Last 24 hours": 24 * 60 * 60,
+    "Everything recorded": None
+}
+
+# Chart bucket width for each window (seconds)
+BUCKETS = {
+    "Last 15 minutes": 30,
+    "Last hour": 60,
+    "Last 24 hours": 15 * 60,
+    "Everything recorded": 15 * 60
+}
+
+def load_spans():
+    """Spans from the in-memory exporter, or from the JSONL file when only that one is active."""
+    memory = tracing.exporter("memory")
+    if memory is not None:
+        return memory.spans()
+    jsonl = tracing.exporter("jsonl")
+    return tracing.read_jsonl(jsonl.path if jsonl is not None else tracing.TRACE_PATH)
+
+def chart_data(series):
+    """Turn {stage: {bucket_start: value}} into chart columns keyed by local time."""
+    return {
+        stage: {datetime.datetime.fromtimestamp(bucket): value for bucket, value in points.items()}
+        for stage, points in series.items()
+    }
+
+def main():
+    st.set_page_config(
+        page_title="Think why? Latency Metrics",
+        page_icon="📈",
+        layout="wide"
+    )
+
+    st.title("📈 Latency Metrics")
+    st.caption("Where the time goes: search, rendering, thumbnails and Gemini, per stage, for this server process.")
+
+    if not tracing.enabled():
+        st.info("Tracing is off. Start the app with THINKWHY_TRACE=memory (or jsonl, otel) "
+                "to record spans from startup, or turn it on for this process now.")
+        if st.button("▶️ Enable tracing"):
+            tracing.enable(["memory"])
+            st.rerun()
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        window = st.selectbox("⏱️ Window", list(WINDOWS.keys()))
+    with col2:
+        st.write("")
+        if st.button("🔄 Refresh"):
+            st.rerun()
+
+    spans = load_spans()
+    if WINDOWS[window] is not None:
+        since = time.time() - WINDOWS[window]
+        spans = [s for s in spans if s["start"] >= since]
+
+    if not spans:
+        st.warning("No spans recorded in this window yet. Run a few searches or optimize a post, then refresh.")
+        return
+
+    stats = tracing.stage_stats(spans)
+    errors = sum(row["count"] * row["error_rate"] for row in stats)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Spans", len(spans))
+    c2.metric("Stages", len(stats))
+    c3.metric("Error rate", f"{errors / len(spans):.1%}")
+
+    st.subheader("Per stage")
+    st.dataframe(stats, hide_index=True)
+
+    series = tracing.timeline(spans, BUCKETS[window])
+    st.subheader("p95 latency (ms)")
+    st.line_chart(chart_data(series["p95_ms"]))
+    st.subheader("Error rate")
+    st.line_chart(chart_data(series["error_rate"]))
+    st.subheader(f"Throughput (spans per {BUCKETS[window]} s)")
+    st.bar_chart(chart_data(series["count"]))
+
+    with st.expander("🔍 Slowest recent spans"):
+        slowest = sorted(spans, key=lambda s: s["duration_ms"], reverse=True)[:50]
+        st.dataframe([
+            {
+                "stage": s["name"],
+                "started": datetime.datetime.fromtimestamp(s["start"]).strftime("%H:%M:%S"),
+                "duration_ms": round(s["duration_ms"], 1),
+                "error": s["error"],
+                "attributes": s["attributes"]
+            }
+            for s in slowest
+        ], hide_index=True)
+
+    memory = tracing.exporter("memory")
+    if memory is not None and st.button("🗑️ Clear recorded spans"):
+        memory.clear()
+        st.rerun()
+
+if __name__ == "__main__":
+    main()
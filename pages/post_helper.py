@@ -1,92 +1,171 @@
+import queue
+import uuid
+from concurrent.futures import wait
+
 import streamlit as st
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+from chat_store import get_chat_store
+from hashtags import get_hashtag_index
+from post_optimizer import (
+    HASHTAG_MODE,
+    MAX_VARIANTS,
+    edit_token_usage,
+    gemini_api_key,
+    optimize_edited_post,
+    optimize_instagram_post,
+    optimize_variants,
+    response_cache
+)
 
-# Configure the Gemini API
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+# Only the key is checked here; the Gemini SDK itself is loaded when the first post is optimized
+if not gemini_api_key():
     st.error("GEMINI_API_KEY not found in environment variables. Please set it in the .env file.")
 
-# Configure the Gemini model
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-2.0-flash')
-except Exception as e:
-    st.error(f"Error configuring Gemini API: {e}")
-
 # Minimum content length requirement
 MIN_CONTENT_LENGTH = 60
 
-def optimize_instagram_post(post_content, target_audience, theme, tone, hashtag_count):
+# Messages kept in memory and rendered (10 posts with their answers); older ones are loaded on demand.
+# Even, so the window always starts at a user message and user/assistant parity holds
+CHAT_WINDOW = 20
+
+# How hashtags are chosen (see post_optimizer.HASHTAG_MODES)
+HASHTAG_MODE_OPTIONS = {
+    "suggest": "Suggested from past posts",
+    "local": "Past posts only (fastest)",
+    "gemini": "Written by Gemini"
+}
+
+TONE_OPTIONS = ["Professional", "Casual", "Friendly", "Authoritative", "Inspirational",
+                "Humorous", "Serious", "Conversational", "Enthusiastic", "Informative"]
+
+def show_bot_message(slot, message_id, content):
+    """Render an optimized post bubble (with its copy button) into slot."""
+    slot.markdown(
+        f'''
+        <div class="bot-message">
+            <div id="{message_id}">{content}</div>
+            <button class="copy-btn" onclick="copyPostContent('{message_id}')">Copy</button>
+        </div>
+        ''', 
+        unsafe_allow_html=True
+    )
+
+def format_timing(timing):
+    """One-line summary of a generation's time to first token and total time."""
+    if timing.get("cached"):
+        return f"♻️ From cache in {timing['total_ms']} ms"
+    if timing.get("coalesced"):
+        return f"🤝 Shared an identical request's generation · complete after {timing['total_ms']} ms"
+    summary = f"⚡ First token after {timing['ttft_ms']} ms · complete after {timing['total_ms']} ms"
+    if "prompt_tokens" in timing:
+        summary += f" · {timing['prompt_tokens']} prompt tokens"
+        if "edit_mode" in timing:
+            summary += " (chat session)" if timing["edit_mode"] == "session" else " (full prompt)"
+    if timing.get("hashtag_mode", "gemini") != "gemini":
+        summary += f" · 🏷️ hashtags picked in {timing['hashtag_ms']} ms"
+    return summary
+
+def chat_session_id():
     """
-    Optimize Instagram post based on selected parameters
+    Return this conversation's id, kept in the ?session= query parameter.
+
+    The id survives reloads and server restarts, so the history can be read back from the chat store.
     """
-    if not post_content.strip():
-        return "Please enter some content to optimize."
-    
-    try:
-        prompt = f"""
-        Optimize the following Instagram post while maintaining its authentic voice:
-        
-        {post_content}
-        
-        Please enhance it based on these specifications:
-        1. Target audience: {target_audience}
-        2. Content theme: {theme}
-        3. Tone of voice: {tone}
-        4. Include exactly {hashtag_count} relevant hashtags
-        5. Include a natural call-to-action
-        6. Make it engaging while preserving the original message
-        7. Keep it within Instagram's character limits
-        8. Create a comprehensive and detailed post (at least 3-4 paragraphs)
-        
-        Return only the optimized post, don't explain your changes.
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"Error: {str(e)}"
+    if "chat_session_id" not in st.session_state:
+        st.session_state.chat_session_id = st.query_params.get("session") or uuid.uuid4().hex
+    if st.query_params.get("session") != st.session_state.chat_session_id:
+        st.query_params["session"] = st.session_state.chat_session_id
+    return st.session_state.chat_session_id
 
-def optimize_edited_post(original_post, optimized_post, edit_instructions, target_audience, theme, tone, hashtag_count):
+def load_chat():
+    """Load the most recent CHAT_WINDOW messages of this conversation into session state."""
+    session_id = chat_session_id()
+    total = get_chat_store().count(session_id)
+    start = max(0, total - CHAT_WINDOW)
+    start -= start % 2
+    st.session_state.chat_history = get_chat_store().load(session_id, start, total)
+    # Position of chat_history[0] in the whole conversation
+    st.session_state.chat_offset = start
+
+def save_message(index):
+    """Write chat_history[index] through to the chat store."""
+    get_chat_store().save(
+        chat_session_id(),
+        st.session_state.chat_offset + index,
+        st.session_state.chat_history[index]
+    )
+
+def append_message(message):
+    """Add a message to the conversation, keeping only the last CHAT_WINDOW in memory."""
+    st.session_state.chat_history.append(message)
+    save_message(len(st.session_state.chat_history) - 1)
+    while len(st.session_state.chat_history) > CHAT_WINDOW:
+        # Drop whole user/assistant pairs from the front; they stay in the store
+        del st.session_state.chat_history[:2]
+        st.session_state.chat_offset += 2
+        if st.session_state.editing_index is not None:
+            st.session_state.editing_index -= 2
+            if st.session_state.editing_index < 0:
+                st.session_state.editing_index = None
+
+def load_older_messages():
+    """Prepend up to CHAT_WINDOW older messages from the chat store."""
+    offset = st.session_state.chat_offset
+    start = max(0, offset - CHAT_WINDOW)
+    older = get_chat_store().load(chat_session_id(), start, offset)
+    st.session_state.chat_history[:0] = older
+    st.session_state.chat_offset = start
+    if st.session_state.editing_index is not None:
+        st.session_state.editing_index += len(older)
+
+def variant_tones(tone, count, vary_tone):
+    """Tones for count variants: the chosen tone first, then (if vary_tone) the others in order."""
+    if not vary_tone:
+        return [tone] * count
+    return ([tone] + [t for t in TONE_OPTIONS if t != tone])[:count]
+
+def stream_variants(slot, post_content, target_audience, theme, tones, hashtag_count, hashtag_mode):
     """
-    Re-optimize a post based on specific edit instructions
+    Generate one variant per tone concurrently, streaming each into its own column of slot.
+
+    Returns the variants as dicts with content, tone, timing and the request to regenerate them.
     """
-    try:
-        prompt = f"""
-        I need to improve an Instagram post based on specific feedback.
-        
-        ORIGINAL USER POST:
-        {original_post}
-        
-        CURRENT OPTIMIZED VERSION:
-        {optimized_post}
-        
-        EDIT INSTRUCTIONS FROM USER:
-        {edit_instructions}
-        
-        Please create a new optimized version with these specifications:
-        1. Target audience: {target_audience}
-        2. Content theme: {theme}
-        3. Tone of voice: {tone}
-        4. Include exactly {hashtag_count} relevant hashtags
-        5. Include a natural call-to-action
-        6. Make it engaging while preserving the original message
-        7. Keep it within Instagram's character limits
-        8. Create a comprehensive and detailed post (at least 3-4 paragraphs)
-        9. Focus specifically on addressing the edit instructions
-        
-        Return only the re-optimized post, don't explain your changes.
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"Error: {str(e)}"
+    updates = queue.Queue()
+    futures = optimize_variants(post_content, target_audience, theme, tones, hashtag_count,
+                                on_chunk=lambda index, text: updates.put((index, text)), hashtag_mode=hashtag_mode)
+    with slot.container():
+        st.markdown(f'<div class="user-message">{post_content}</div>', unsafe_allow_html=True)
+        columns = st.columns(len(futures))
+        bubbles = []
+        for index, column in enumerate(columns):
+            column.caption(f"Variant {index + 1} · {tones[index]}")
+            bubbles.append(column.empty())
+            bubbles[-1].caption("Optimizing...")
+
+        # Worker threads cannot draw, so the script thread drains their chunks until all are done
+        pending = set(futures)
+        while pending or not updates.empty():
+            try:
+                index, text = updates.get(timeout=0.05)
+            except queue.Empty:
+                pending = wait(pending, timeout=0)[1]
+                continue
+            show_bot_message(bubbles[index], f"variant_streaming_{index}", text)
+
+    variants = []
+    for index, future in enumerate(futures):
+        content, timing = future.result()
+        variants.append({
+            "content": content,
+            "tone": tones[index],
+            "timing": timing,
+            "request": {
+                "kind": "optimize",
+                "args": [post_content, target_audience, theme, tones[index], hashtag_count],
+                "kwargs": {"variant": index, "hashtag_mode": hashtag_mode}
+            }
+        })
+    return variants
 
 def main():
     st.set_page_config(
@@ -96,12 +175,16 @@ def main():
     )
     
     # Initialize session state variables
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-    
     if "editing_index" not in st.session_state:
         st.session_state.editing_index = None
     
+    # Only a window of recent messages is held in memory; the full conversation is in the chat store
+    if "chat_history" not in st.session_state:
+        load_chat()
+    
+    # Start building the hashtag index while the user writes, so the first post does not wait for it
+    get_hashtag_index(wait=False)
+    
     if "edit_content" not in st.session_state:
         st.session_state.edit_content = ""
         
@@ -419,12 +502,12 @@ def main():
         
         message = st.session_state.chat_history[index]
         st.session_state.editing_index = index
-        # Don't set edit_content directly since it's now a widget key
-        # Instead, use a separate initialization key
-        st.session_state["temp_edit_content"] = message["content"]
+        # The edit form is drawn later in this run, so its widget key can still be set here;
+        # otherwise the form would keep the empty value edit_content was initialized with
+        st.session_state.edit_content = message["content"]
     
     # Function to save edits - modified to use session state safely
-    def save_edit(edit_content, edit_instructions, target_audience, theme, tone, hashtag_count):
+    def save_edit(edit_content, edit_instructions, target_audience, theme, tone, hashtag_count, stream_slot=None):
         if st.session_state.editing_index is not None:
             if st.session_state.editing_index % 2 == 1:  # This is an AI response
                 # Get the original user post
@@ -432,30 +515,106 @@ def main():
                 original_post = st.session_state.chat_history[user_index]["content"]
                 
                 # Generate a new optimized version based on edit instructions
-                new_optimized_post = optimize_edited_post(
-                    original_post, 
-                    edit_content, 
-                    edit_instructions,
-                    target_audience,
-                    theme,
-                    tone,
-                    hashtag_count
-                )
+                # Successive edits of a message share a Gemini chat session, so they only send the new instructions
+                message = st.session_state.chat_history[st.session_state.editing_index]
+                session_id = message.setdefault("session_id", uuid.uuid4().hex)
+                # Hashtags are chosen the same way as for the post being edited
+                hashtag_mode = message.get("request", {}).get("kwargs", {}).get("hashtag_mode")
+                request = {
+                    "kind": "edit",
+                    "args": [original_post, edit_content, edit_instructions, target_audience, theme, tone, hashtag_count],
+                    "kwargs": {"session_id": session_id, "hashtag_mode": hashtag_mode}
+                }
+                timing = {}
+                on_chunk = None
+                if stream_slot is not None:
+                    on_chunk = lambda text: show_bot_message(stream_slot, "message_streaming", text)
+                new_optimized_post = optimize_edited_post(*request["args"], **request["kwargs"],
+                                                          on_chunk=on_chunk, timing=timing)
                 
-                st.session_state.chat_history[st.session_state.editing_index]["content"] = new_optimized_post
+                message["content"] = new_optimized_post
+                message["request"] = request
+                message["timing"] = timing
+                # The edit builds on the selected variant; the alternatives are no longer shown
+                message.pop("variants", None)
             else:
                 # This is a user message
                 st.session_state.chat_history[st.session_state.editing_index]["content"] = edit_content
+            save_message(st.session_state.editing_index)
             
             # Signal to reset the form on next rerun instead of directly modifying widget keys
             st.session_state.reset_form = True
             
+    # Function to fetch a fresh variant of an optimized post, bypassing the response cache
+    def regenerate_message(index, bubble):
+        message = st.session_state.chat_history[index]
+        request = message.get("request")
+        if request is None:
+            return
+        optimize = optimize_edited_post if request["kind"] == "edit" else optimize_instagram_post
+        timing = {}
+        message["content"] = optimize(
+            *request["args"],
+            **request.get("kwargs", {}),
+            regenerate=True,
+            on_chunk=lambda text: show_bot_message(bubble, f"message_{index}", text),
+            timing=timing
+        )
+        message["timing"] = timing
+        if "variants" in message:
+            message["variants"][message["selected"]].update(content=message["content"], timing=timing)
+        save_message(index)
+            
+    # Function to optimize one post, streaming it under the user's message, then show it in the history
+    def optimize_post(post_content, target_audience, theme, tone, hashtag_count, hashtag_mode):
+        # Get optimized post
+        request = {
+            "kind": "optimize",
+            "args": [post_content, target_audience, theme, tone, hashtag_count],
+            "kwargs": {"hashtag_mode": hashtag_mode}
+        }
+        # Stream the post into a bubble under the user's message as it is generated
+        timing = {}
+        with stream_slot.container():
+            st.markdown(f'<div class="user-message">{post_content}</div>', unsafe_allow_html=True)
+            bubble = st.empty()
+            bubble.caption("Optimizing your post...")
+            optimized_post = optimize_instagram_post(
+                *request["args"],
+                **request["kwargs"],
+                on_chunk=lambda text: show_bot_message(bubble, "message_streaming", text),
+                timing=timing
+            )
+        
+        # Add assistant response to chat history, with the request so it can be regenerated
+        append_message({
+            "role": "assistant",
+            "content": optimized_post,
+            "request": request,
+            "timing": timing
+        })
+        
+        # Rerun to update the UI with new messages
+        st.rerun()
+    
+    # Function to pick one of several variants as the post to edit, copy or regenerate
+    def select_variant(index, choice):
+        message = st.session_state.chat_history[index]
+        variant = message["variants"][choice]
+        message.update(content=variant["content"], request=variant["request"], timing=variant["timing"],
+                       selected=choice)
+        save_message(index)
+            
     # Display any error messages
     if st.session_state.error_message:
         st.markdown(f'<div class="error-message">{st.session_state.error_message}</div>', unsafe_allow_html=True)
         st.session_state.error_message = None
     
-    # Display chat history
+    # Display chat history (only the in-memory window; older messages are loaded on request)
+    if st.session_state.chat_offset > 0:
+        if st.button(f"⬆️ Load older messages ({st.session_state.chat_offset} more)", key="load_older"):
+            load_older_messages()
+            st.rerun()
     if st.session_state.chat_history:
         with st.container():
             st.markdown('<div class="chat-container">', unsafe_allow_html=True)
@@ -466,24 +625,58 @@ def main():
                     # Create a unique ID for each message
                     message_id = f"message_{i}"
                     
-                    # Add optimized post with copy button using HTML/JS approach
-                    st.markdown(
-                        f'''
-                        <div class="bot-message">
-                            <div id="{message_id}">{message["content"]}</div>
-                            <button class="copy-btn" onclick="copyPostContent('{message_id}')">Copy</button>
-                        </div>
-                        ''', 
-                        unsafe_allow_html=True
-                    )
+                    if "variants" in message:
+                        # Variants side by side; the selected one is what Edit and Regenerate act on
+                        columns = st.columns(len(message["variants"]))
+                        for j, (column, variant) in enumerate(zip(columns, message["variants"])):
+                            with column:
+                                selected = j == message["selected"]
+                                st.caption(f"{'✅ ' if selected else ''}Variant {j + 1} · {variant['tone']}")
+                                variant_bubble = st.empty()
+                                show_bot_message(variant_bubble, f"{message_id}_variant_{j}", variant["content"])
+                                if variant.get("timing"):
+                                    st.caption(format_timing(variant["timing"]))
+                                if selected:
+                                    bubble = variant_bubble
+                                elif st.button("Use this", key=f"use_{i}_{j}"):
+                                    select_variant(i, j)
+                                    st.rerun()
+                    else:
+                        # Add optimized post with copy button using HTML/JS approach
+                        bubble = st.empty()
+                        show_bot_message(bubble, message_id, message["content"])
+                        if message.get("timing"):
+                            st.caption(format_timing(message["timing"]))
                     
-                    # Add edit button for optimized posts
-                    col1, col2 = st.columns([1, 9])
+                    # Add edit and regenerate buttons for optimized posts
+                    col1, col2, col3 = st.columns([1, 2, 7])
                     with col1:
                         if st.button("Edit", key=f"edit_{i}"):
                             edit_message(i)
+                    with col2:
+                        if "request" in message and st.button("🔄 Regenerate", key=f"regenerate_{i}",
+                                                             help="Ask Gemini for a fresh variant instead of the cached one"):
+                            regenerate_message(i, bubble)
+                            st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
     
+    # Token usage of edits, to compare chat-session edits with full-prompt ones
+    usage = edit_token_usage()
+    if usage["session"]["edits"] or usage["full"]["edits"]:
+        with st.expander("📊 Edit token usage"):
+            st.json(usage)
+    
+    # Response cache counters shared by every session, including generations coalesced across sessions
+    with st.expander("⚡ Response cache statistics"):
+        st.json(response_cache().snapshot())
+        index = get_hashtag_index(wait=False)
+        if index is not None:
+            st.caption("Hashtag index")
+            st.json(index.snapshot())
+    
+    # New and re-optimized posts stream in here, below the chat history
+    stream_slot = st.empty()
+    
     # Edit form (shown only when editing)
     if st.session_state.editing_index is not None:
         with st.form(key="edit_form"):
@@ -491,12 +684,8 @@ def main():
             
             # Show different form elements based on whether we're editing a user message or AI response
             if st.session_state.editing_index % 2 == 1:  # This is an AI response
-                # Use the temp value for initial content if available
-                initial_content = st.session_state.get("temp_edit_content", 
-                                   st.session_state.chat_history[st.session_state.editing_index]["content"])
-                
+                # The initial content comes from session state, set by edit_message
                 edit_content = st.text_area("Current Optimized Content", 
-                                           value=initial_content, 
                                            height=150, 
                                            key="edit_content")
                 
@@ -526,8 +715,7 @@ def main():
                 with col2:
                     tone = st.selectbox(
                         "Tone of Voice",
-                        options=["Professional", "Casual", "Friendly", "Authoritative", "Inspirational", 
-                                "Humorous", "Serious", "Conversational", "Enthusiastic", "Informative"],
+                        options=TONE_OPTIONS,
                         key="edit_tone"
                     )
                     
@@ -547,7 +735,8 @@ def main():
                             target_audience,
                             theme,
                             tone,
-                            hashtag_count
+                            hashtag_count,
+                            stream_slot
                         )
                         st.rerun()
                     else:
@@ -555,12 +744,8 @@ def main():
                         st.rerun()
             else:
                 # Editing a user message
-                # Use the temp value for initial content if available
-                initial_content = st.session_state.get("temp_edit_content", 
-                                   st.session_state.chat_history[st.session_state.editing_index]["content"])
-                
+                # The initial content comes from session state, set by edit_message
                 edit_content = st.text_area("Edit your post", 
-                                           value=initial_content, 
                                            height=150, 
                                            key="edit_content")
                 
@@ -594,8 +779,7 @@ def main():
         with col2:
             tone = st.selectbox(
                 "Tone of Voice",
-                options=["Professional", "Casual", "Friendly", "Authoritative", "Inspirational", 
-                        "Humorous", "Serious", "Conversational", "Enthusiastic", "Informative"]
+                options=TONE_OPTIONS
             )
             
             hashtag_count = st.selectbox(
@@ -604,6 +788,25 @@ def main():
                 index=9  # Default to 10 hashtags
             )
         
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            variant_count = st.selectbox(
+                "Variants",
+                options=list(range(1, MAX_VARIANTS + 1)),
+                help="Generate several alternatives at once and compare them side by side"
+            )
+        with col2:
+            hashtag_mode = st.selectbox(
+                "Hashtags",
+                options=list(HASHTAG_MODE_OPTIONS),
+                index=list(HASHTAG_MODE_OPTIONS).index(HASHTAG_MODE),
+                format_func=HASHTAG_MODE_OPTIONS.get,
+                help="Pick hashtags from what worked in past posts and news for this audience and theme, "
+                     "so Gemini writes less and the tags stay consistent"
+            )
+        with col3:
+            vary_tone = st.checkbox("Use a different tone for each variant")
+        
         user_input = st.text_area(
             "Paste your Instagram post here:",
             height=150,
@@ -619,17 +822,32 @@ def main():
             st.rerun()
         else:
             # Add user message to chat history
-            st.session_state.chat_history.append({"role": "user", "content": user_input})
+            append_message({"role": "user", "content": user_input})
             
-            # Get optimized post
-            with st.spinner("Optimizing your post..."):
-                optimized_post = optimize_instagram_post(user_input, target_audience, theme, tone, hashtag_count)
+            if variant_count > 1:
+                # All variants are generated at once, so N take about as long as one
+                tones = variant_tones(tone, variant_count, vary_tone)
+                variants = stream_variants(stream_slot, user_input, target_audience, theme, tones, hashtag_count,
+                                           hashtag_mode)
+                first = variants[0]
+                append_message({
+                    "role": "assistant",
+                    "content": first["content"],
+                    "request": first["request"],
+                    "timing": first["timing"],
+                    "variants": variants,
+                    "selected": 0
+                })
+                st.rerun()
             
-            # Add assistant response to chat history
-            st.session_state.chat_history.append({"role": "assistant", "content": optimized_post})
-            
-            # Rerun to update the UI with new messages
-            st.rerun()
+            optimize_post(user_input, target_audience, theme, tone, hashtag_count, hashtag_mode)
+    
+    # An article handed over by "Create AI Post" on the news search page is optimized right away,
+    # with the form's current settings
+    article_post = st.session_state.pop("article_post", None)
+    if article_post is not None:
+        append_message({"role": "user", "content": article_post})
+        optimize_post(article_post, target_audience, theme, tone, hashtag_count, hashtag_mode)
     
 
 if __name__ == "__main__":
@@ -0,0 +1,516 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import get_cache, make_key
+from hashtags import get_hashtag_index, strip_hashtags
+from tracing import current_span, span, traced
+
+# Gemini model used for every optimization (part of the response cache key)
+GEMINI_MODEL = 'gemini-2.0-flash'
+
+# Optimized posts are reused for identical requests for this long (seconds)
+RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60
+
+# Settings used when a request leaves them out (the post form's defaults)
+DEFAULT_SETTINGS = {
+    "target_audience": "General",
+    "theme": "General",
+    "tone": "Professional",
+    "hashtag_count": 10
+}
+
+# Most variants generated side by side for one post
+MAX_VARIANTS = 5
+
+# Variant requests (from any session) that can generate at once; the shared pool has
+# VARIANT_REQUESTS * MAX_VARIANTS workers, so one request's variants never wait on another's
+VARIANT_REQUESTS = int(os.getenv("THINKWHY_VARIANT_REQUESTS", "8"))
+
+# How hashtags are chosen (override the default with THINKWHY_HASHTAG_MODE):
+# "suggest" puts the local index's suggestions in the prompt for Gemini to use,
+# "local" has Gemini write no hashtags and appends the suggestions itself,
+# "gemini" leaves them entirely to Gemini (the behavior before the index existed)
+HASHTAG_MODES = ("suggest", "local", "gemini")
+HASHTAG_MODE = os.getenv("THINKWHY_HASHTAG_MODE", "suggest")
+if HASHTAG_MODE not in HASHTAG_MODES:
+    raise ValueError(f"THINKWHY_HASHTAG_MODE must be one of {', '.join(HASHTAG_MODES)}, not {HASHTAG_MODE!r}")
+
+# Edit sessions idle for longer than this are dropped and the next edit sends the full prompt
+EDIT_SESSION_TTL = 30 * 60
+MAX_EDIT_SESSIONS = 256
+
+# The Gemini SDK takes about a second to import, so it is loaded and configured on first use
+_model = None
+_model_lock = threading.Lock()
+_env_loaded = False
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# session_id -> EditSession, least recently used first
+_edit_sessions = OrderedDict()
+_edit_sessions_lock = threading.Lock()
+
+# Prompt and output tokens spent on edits, per mode ("session" or "full")
+_edit_usage = {
+    "session": {"edits": 0, "prompt_tokens": 0, "output_tokens": 0},
+    "full": {"edits": 0, "prompt_tokens": 0, "output_tokens": 0}
+}
+
+
+def gemini_api_key():
+    """Return GEMINI_API_KEY, loading the .env file the first time."""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv("GEMINI_API_KEY")
+
+
+def get_model():
+    """Return the process-wide Gemini model, importing and configuring the SDK on first use."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            import google.generativeai as genai
+
+            genai.configure(api_key=gemini_api_key())
+            _model = genai.GenerativeModel(GEMINI_MODEL)
+        return _model
+
+
+def set_model(model):
+    """Replace the process-wide model (e.g. with a local stand-in); returns the previous one."""
+    global _model
+    with _model_lock:
+        previous, _model = _model, model
+        return previous
+
+
+def normalize_input(value):
+    """Collapse whitespace so trivially different submissions share a cache entry."""
+    return " ".join(str(value).split())
+
+
+def response_cache():
+    """The process-wide cache of Gemini answers (its snapshot counts coalesced generations)."""
+    return get_cache("gemini", max_entries=512)
+
+
+def generate_cached(kind, inputs, prompt, regenerate=False, on_chunk=None, timing=None, send=None):
+    """
+    Return Gemini's text for prompt, reusing an earlier answer to the same request.
+
+    The cache key is the model name, the kind of request and its normalized
+    inputs. With regenerate, the cache is skipped and the fresh answer
+    replaces the stored one. Errors propagate and are never cached.
+
+    Fresh answers are streamed: on_chunk(text_so_far) is called as each chunk
+    arrives (once with the whole text for a cache hit). If timing is a dict it
+    is filled with ttft_ms (time to first token), total_ms and cached, plus
+    prompt_tokens and output_tokens when Gemini reports usage.
+
+    An identical request arriving while one is already generating does not
+    call Gemini again: it streams the running answer (coalesced in timing).
+
+    send() may replace the default generate_content(prompt, stream=True)
+    call, e.g. to send a message on a chat session; it must return a
+    streaming response.
+    """
+    cache = response_cache()
+    key = make_key(GEMINI_MODEL, kind, {name: normalize_input(value) for name, value in inputs.items()})
+    start = time.perf_counter()
+    first_chunk_at = None
+    # Set when this call generated the answer itself or joined one being generated;
+    # neither means the answer came from the cache
+    generated = False
+    coalesced = False
+    usage = {}
+
+    def fetch():
+        nonlocal first_chunk_at, generated
+        generated = True
+        if not regenerate:
+            # Lets identical requests that join before the first chunk know they joined
+            cache.flight.publish(key, "")
+        text = ""
+        response = send() if send is not None else get_model().generate_content(prompt, stream=True)
+        for chunk in response:
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            # Chunks that only carry a finish reason have no parts (and .text raises)
+            if chunk.parts:
+                text += chunk.text
+                if on_chunk is not None:
+                    on_chunk(text)
+                if not regenerate:
+                    cache.flight.publish(key, text)
+        # Usage metadata is complete once the stream has been consumed
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None:
+            usage.update(prompt_tokens=metadata.prompt_token_count, output_tokens=metadata.candidates_token_count)
+        return text
+
+    def follow(text):
+        # Progress of an identical request that is already generating
+        nonlocal first_chunk_at, coalesced
+        coalesced = True
+        if not text:
+            return
+        if first_chunk_at is None:
+            first_chunk_at = time.perf_counter()
+        if on_chunk is not None:
+            on_chunk(text)
+
+    with span("gemini.generate", kind=kind) as s:
+        if regenerate:
+            text = fetch()
+            cache.set(key, text, RESPONSE_CACHE_TTL)
+        else:
+            text = cache.get_or_fetch(key, fetch, RESPONSE_CACHE_TTL, on_progress=follow)
+        cached = not generated and not coalesced
+        if first_chunk_at is None:
+            # A cache hit, or a stream that produced nothing before it ended
+            first_chunk_at = time.perf_counter()
+            if cached and on_chunk is not None:
+                on_chunk(text)
+        s.set(cached=cached, coalesced=coalesced, **usage)
+        if not cached:
+            s.set(ttft_ms=round((first_chunk_at - start) * 1000))
+
+    if timing is not None:
+        timing.update({
+            "ttft_ms": round((first_chunk_at - start) * 1000),
+            "total_ms": round((time.perf_counter() - start) * 1000),
+            "cached": cached,
+            "coalesced": coalesced,
+            **usage
+        })
+    return text
+
+
+def plan_hashtags(text, target_audience, theme, hashtag_count, mode=None, timing=None):
+    """
+    Return (instruction, appended, mode) for a post's prompt.
+
+    instruction is the prompt line about hashtags (naming the local index's
+    suggestions, if any) and appended the hashtags to add after Gemini's
+    text ("local" mode, when the index has enough of them). With too few
+    suggestions, Gemini is asked to complete the set; when the index has
+    none or fails, Gemini picks them all. mode is the mode actually used
+    ("gemini" after such a fallback, "suggest" for a "local" request Gemini
+    has to complete). timing, if given, gets hashtag_mode (that mode) and
+    hashtag_ms.
+    """
+    mode = mode or HASHTAG_MODE
+    if mode not in HASHTAG_MODES:
+        raise ValueError(f"unknown hashtag mode {mode!r}")
+    start = time.perf_counter()
+    hashtags = []
+    if mode != "gemini":
+        with span("hashtags.suggest") as s:
+            try:
+                hashtags = get_hashtag_index().suggest(strip_hashtags(text), hashtag_count, target_audience, theme)
+            except Exception as e:
+                # A broken index (e.g. an unreadable archive) must not fail the post
+                s.fail(e)
+    if not hashtags:
+        mode = "gemini"
+    elif len(hashtags) < hashtag_count:
+        mode = "suggest"
+    if timing is not None:
+        timing.update(hashtag_mode=mode, hashtag_ms=round((time.perf_counter() - start) * 1000, 2))
+
+    if mode == "gemini":
+        return f"Include exactly {hashtag_count} relevant hashtags", [], mode
+    listed = " ".join(hashtags)
+    if len(hashtags) < hashtag_count:
+        missing = hashtag_count - len(hashtags)
+        return f"Include exactly {hashtag_count} relevant hashtags: {listed} and {missing} more", [], mode
+    if mode == "local":
+        return "Do not include any hashtags (they are added separately)", hashtags, mode
+    return f"End with exactly these {hashtag_count} hashtags and no others: {listed}", [], mode
+
+
+def append_hashtags(text, appended, on_chunk=None):
+    """Add locally chosen hashtags after Gemini's text (and show the result through on_chunk)."""
+    if not appended:
+        return text
+    text = f"{strip_hashtags(text).rstrip()}\n\n{' '.join(appended)}"
+    if on_chunk is not None:
+        on_chunk(text)
+    return text
+
+
+@traced("post.optimize")
+def optimize_instagram_post(post_content, target_audience, theme, tone, hashtag_count, regenerate=False,
+                            on_chunk=None, timing=None, raise_errors=False, variant=None, hashtag_mode=None):
+    """
+    Optimize Instagram post based on selected parameters
+
+    Identical requests are answered from the response cache unless regenerate is set.
+    variant numbers alternatives of the same request so each gets its own cache entry.
+    on_chunk and timing are passed to generate_cached for streaming and latency.
+    hashtag_mode (one of HASHTAG_MODES, HASHTAG_MODE by default) picks how hashtags are chosen.
+    Failures are returned as an "Error: ..." string unless raise_errors is set.
+    """
+    if not post_content.strip():
+        return "Please enter some content to optimize."
+    
+    try:
+        timing = {} if timing is None else timing
+        hashtag_rule, appended, hashtag_mode = plan_hashtags(post_content, target_audience, theme, hashtag_count,
+                                                             hashtag_mode, timing)
+        prompt = f"""
+        Optimize the following Instagram post while maintaining its authentic voice:
+        
+        {post_content}
+        
+        Please enhance it based on these specifications:
+        1. Target audience: {target_audience}
+        2. Content theme: {theme}
+        3. Tone of voice: {tone}
+        4. {hashtag_rule}
+        5. Include a natural call-to-action
+        6. Make it engaging while preserving the original message
+        7. Keep it within Instagram's character limits
+        8. Create a comprehensive and detailed post (at least 3-4 paragraphs)
+        
+        Return only the optimized post, don't explain your changes.
+        """
+        
+        inputs = {
+            "post_content": post_content,
+            "target_audience": target_audience,
+            "theme": theme,
+            "tone": tone,
+            "hashtag_count": hashtag_count
+        }
+        # Keyed on the mode rather than the suggestions, which change as the index learns;
+        # "local" hashtags are appended after the lookup, so a cached answer gets current ones
+        if hashtag_mode != "gemini":
+            inputs["hashtag_mode"] = hashtag_mode
+        if variant is not None:
+            inputs["variant"] = variant
+        text = generate_cached("optimize", inputs, prompt, regenerate, on_chunk, timing)
+        return append_hashtags(text, appended, on_chunk)
+    except Exception as e:
+        current_span().fail(e)
+        if raise_errors:
+            raise
+        return f"Error: {str(e)}"
+
+
+class EditSession:
+    """
+    A Gemini chat that already holds the original post and the optimization rules.
+
+    History is kept to the opening turn plus the latest version, so an edit
+    only adds its instructions and the prompt does not grow with each round.
+    """
+
+    def __init__(self, original_post, reply):
+        self.original_post = normalize_input(original_post)
+        self.opening = f"""
+        Here is an Instagram post I wrote:
+
+        {original_post}
+
+        Whenever I ask for a new version, always:
+        1. Include a natural call-to-action
+        2. Make it engaging while preserving the original message
+        3. Keep it within Instagram's character limits
+        4. Create a comprehensive and detailed post (at least 3-4 paragraphs)
+        5. Return only the post, don't explain your changes.
+        """
+        self.chat = get_model().start_chat()
+        self.remember(reply)
+
+    def remember(self, reply):
+        """Make reply the latest version, dropping older turns."""
+        self.reply = normalize_input(reply)
+        self.chat.history = [
+            {"role": "user", "parts": [self.opening]},
+            {"role": "model", "parts": [reply]}
+        ]
+        self.last_used = time.time()
+
+    def matches(self, original_post, optimized_post):
+        """Whether this session's latest version is the post being edited."""
+        return (self.original_post == normalize_input(original_post)
+                and self.reply == normalize_input(optimized_post))
+
+
+def get_edit_session(session_id):
+    """Return the live edit session for session_id, or None if there is none or it expired."""
+    with _edit_sessions_lock:
+        session = _edit_sessions.get(session_id)
+        if session is not None and time.time() - session.last_used > EDIT_SESSION_TTL:
+            del _edit_sessions[session_id]
+            session = None
+        return session
+
+
+def save_edit_session(session_id, session):
+    with _edit_sessions_lock:
+        _edit_sessions[session_id] = session
+        _edit_sessions.move_to_end(session_id)
+        while len(_edit_sessions) > MAX_EDIT_SESSIONS:
+            _edit_sessions.popitem(last=False)
+
+
+def edit_token_usage():
+    """Return edit counts and average prompt/output tokens for session and full-prompt edits."""
+    with _edit_sessions_lock:
+        usage = {mode: dict(counts) for mode, counts in _edit_usage.items()}
+    for counts in usage.values():
+        edits = counts["edits"]
+        counts["avg_prompt_tokens"] = round(counts["prompt_tokens"] / edits) if edits else None
+        counts["avg_output_tokens"] = round(counts["output_tokens"] / edits) if edits else None
+    return usage
+
+
+@traced("post.edit")
+def optimize_edited_post(original_post, optimized_post, edit_instructions, target_audience, theme, tone, hashtag_count,
+                         regenerate=False, on_chunk=None, timing=None, raise_errors=False, session_id=None,
+                         hashtag_mode=None):
+    """
+    Re-optimize a post based on specific edit instructions
+
+    Identical requests are answered from the response cache unless regenerate is set.
+    on_chunk and timing are passed to generate_cached for streaming and latency.
+    Failures are returned as an "Error: ..." string unless raise_errors is set.
+
+    With a session_id, the conversation keeps a Gemini chat session: when its
+    latest version is the post being edited, only the instructions and
+    settings are sent. Otherwise (first edit, expired session, post changed
+    by hand) the full prompt is sent and the session is started afresh.
+    timing gets edit_mode ("session" or "full") alongside the token counts.
+    Hashtags are suggested for the edited post as in optimize_instagram_post.
+    """
+    try:
+        timing = {} if timing is None else timing
+        hashtag_rule, appended, hashtag_mode = plan_hashtags(f"{optimized_post}\n{edit_instructions}",
+                                                             target_audience, theme, hashtag_count, hashtag_mode,
+                                                             timing)
+        prompt = f"""
+        I need to improve an Instagram post based on specific feedback.
+        
+        ORIGINAL USER POST:
+        {original_post}
+        
+        CURRENT OPTIMIZED VERSION:
+        {optimized_post}
+        
+        EDIT INSTRUCTIONS FROM USER:
+        {edit_instructions}
+        
+        Please create a new optimized version with these specifications:
+        1. Target audience: {target_audience}
+        2. Content theme: {theme}
+        3. Tone of voice: {tone}
+        4. {hashtag_rule}
+        5. Include a natural call-to-action
+        6. Make it engaging while preserving the original message
+        7. Keep it within Instagram's character limits
+        8. Create a comprehensive and detailed post (at least 3-4 paragraphs)
+        9. Focus specifically on addressing the edit instructions
+        
+        Return only the re-optimized post, don't explain your changes.
+        """
+        
+        inputs = {
+            "original_post": original_post,
+            "optimized_post": optimized_post,
+            "edit_instructions": edit_instructions,
+            "target_audience": target_audience,
+            "theme": theme,
+            "tone": tone,
+            "hashtag_count": hashtag_count
+        }
+        if hashtag_mode != "gemini":
+            inputs["hashtag_mode"] = hashtag_mode
+        session = get_edit_session(session_id) if session_id is not None else None
+        send = None
+        mode = "full"
+        if session is not None and session.matches(original_post, optimized_post):
+            mode = "session"
+            message = f"""
+            EDIT INSTRUCTIONS FROM USER:
+            {edit_instructions}
+
+            Rewrite your latest version accordingly for target audience {target_audience}, content theme {theme}
+            and a {tone} tone of voice. {hashtag_rule}.
+            """
+            send = lambda: session.chat.send_message(message, stream=True)
+
+        text = generate_cached("edit", inputs, prompt, regenerate, on_chunk, timing, send)
+        timing["edit_mode"] = mode
+        current_span().set(edit_mode=mode)
+        if not timing["cached"] and not timing["coalesced"]:
+            with _edit_sessions_lock:
+                counts = _edit_usage[mode]
+                counts["edits"] += 1
+                counts["prompt_tokens"] += timing.get("prompt_tokens", 0)
+                counts["output_tokens"] += timing.get("output_tokens", 0)
+
+        # Sessions remember the post as shown, so the next edit of it still matches
+        text = append_hashtags(text, appended, on_chunk)
+        if session_id is not None:
+            if session is None or mode == "full":
+                session = EditSession(original_post, text)
+            else:
+                session.remember(text)
+            save_edit_session(session_id, session)
+        return text
+    except Exception as e:
+        current_span().fail(e)
+        if raise_errors:
+            raise
+        return f"Error: {str(e)}"
+
+
+def get_executor():
+    """
+    Return the process-wide pool used for concurrent Gemini generations.
+
+    It has room for VARIANT_REQUESTS full sets of variants at once; past that,
+    further requests queue. The workers mostly wait on Gemini's stream.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=VARIANT_REQUESTS * MAX_VARIANTS, thread_name_prefix="gemini")
+        return _executor
+
+
+def optimize_variants(post_content, target_audience, theme, tones, hashtag_count, on_chunk=None, hashtag_mode=None):
+    """
+    Start one optimization per entry in tones, all at once.
+
+    Returns futures in the same order, each resolving to (content, timing).
+    on_chunk(index, text_so_far) is called from the worker threads, so
+    Streamlit callers should hand the text to the script thread (e.g. with a queue).
+    """
+    def optimize(index, tone):
+        timing = {}
+        content = optimize_instagram_post(
+            post_content,
+            target_audience,
+            theme,
+            tone,
+            hashtag_count,
+            on_chunk=None if on_chunk is None else lambda text: on_chunk(index, text),
+            timing=timing,
+            variant=index,
+            hashtag_mode=hashtag_mode
+        )
+        return content, timing
+
+    executor = get_executor()
+    return [executor.submit(optimize, index, tone) for index, tone in enumerate(tones[:MAX_VARIANTS])]
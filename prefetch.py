@@ -0,0 +1,265 @@
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import CACHE_DIR
+from rate_limit import TokenBucket
+
+# Popularity scores halve after this many seconds without new searches
+POPULARITY_HALF_LIFE = 24 * 60 * 60
+
+# How many of the most searched combinations are kept warm
+HOT_COMBINATIONS = 12
+
+# Global budget for background refreshes, in searches per minute (with a small burst)
+PREFETCH_SEARCHES_PER_MINUTE = 6
+PREFETCH_BURST = 3
+
+# How often the schedule is rebuilt from the popularity table (seconds)
+SCHEDULE_INTERVAL = 30
+
+# Refresh the most popular combination at this fraction of its TTL, the least
+# popular hot one at REFRESH_AT_LATEST; everything is refreshed before it expires
+REFRESH_AT_EARLIEST = 0.5
+REFRESH_AT_LATEST = 0.9
+
+# Searched when nothing has been recorded yet: the page's default selections
+DEFAULT_COMBINATIONS = [("World News", "wt-wt", "d", 10)]
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+class PopularityTracker:
+    """
+    Time-decayed search counts per (category, region, time_filter, max_results).
+
+    Stored in SQLite so the Streamlit app and a separate prefetch process share it.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, "prefetch.sqlite3")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS popularity ("
+                "category TEXT, region TEXT, time_filter TEXT, max_results INTEGER, "
+                "score REAL, updated_at REAL, "
+                "PRIMARY KEY (category, region, time_filter, max_results))"
+            )
+            self._db.commit()
+
+    def _decay(self, score, updated_at, now):
+        return score * 0.5 ** ((now - updated_at) / POPULARITY_HALF_LIFE)
+
+    def record(self, category, region, time_filter, max_results):
+        """Count one interactive search for this combination."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT score, updated_at FROM popularity "
+                "WHERE category = ? AND region = ? AND time_filter = ? AND max_results = ?",
+                (category, region, time_filter, max_results),
+            ).fetchone()
+            score = 1.0 + (self._decay(row[0], row[1], now) if row else 0.0)
+            self._db.execute(
+                "INSERT OR REPLACE INTO popularity VALUES (?, ?, ?, ?, ?, ?)",
+                (category, region, time_filter, max_results, score, now),
+            )
+            self._db.commit()
+
+    def top(self, n=HOT_COMBINATIONS):
+        """Return the n most popular combinations as [(combo, score)], best first."""
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT category, region, time_filter, max_results, score, updated_at FROM popularity"
+            ).fetchall()
+        scored = [(tuple(row[:4]), self._decay(row[4], row[5], now)) for row in rows]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:n]
+
+
+class PrefetchScheduler:
+    """
+    Keeps the most searched combinations warm in the news cache.
+
+    Every SCHEDULE_INTERVAL the hot set is re-read from the popularity
+    tracker. Each hot combination gets a refresh deadline before its cache
+    TTL runs out, and more popular ones are refreshed earlier. A worker
+    refreshes due combinations in deadline order. Every refresh spends one
+    token from a global bucket, which keeps us under DuckDuckGo's rate limits.
+
+    refresh(combo) fetches and caches one combination; ttl_for(combo) returns
+    its cache TTL in seconds.
+    """
+
+    def __init__(self, refresh, ttl_for, tracker=None, hot=HOT_COMBINATIONS,
+                 searches_per_minute=PREFETCH_SEARCHES_PER_MINUTE, burst=PREFETCH_BURST):
+        self.refresh = refresh
+        self.ttl_for = ttl_for
+        self.tracker = tracker or get_tracker()
+        self.hot = hot
+        self.budget = TokenBucket(searches_per_minute / 60.0, burst)
+        self.last_refresh = {}
+        self.last_error = {}
+        self.stats = {"refreshes": 0, "errors": 0}
+        self._queue = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _next_due(self, combo, rank, count):
+        """When combo should next be refreshed, given its popularity rank among count hot ones."""
+        fraction = REFRESH_AT_EARLIEST
+        if count > 1:
+            fraction += (REFRESH_AT_LATEST - REFRESH_AT_EARLIEST) * rank / (count - 1)
+        last = self.last_refresh.get(combo)
+        if last is None:
+            return time.time()
+        return last + self.ttl_for(combo) * fraction
+
+    def reschedule(self):
+        """Rebuild the refresh queue from the current popularity ranking."""
+        hot = [combo for combo, _ in self.tracker.top(self.hot)] or list(DEFAULT_COMBINATIONS)
+        with self._lock:
+            self._queue = [(self._next_due(combo, rank, len(hot)), combo) for rank, combo in enumerate(hot)]
+            heapq.heapify(self._queue)
+
+    def run_once(self):
+        """Refresh every combination that is due now. Returns how many were refreshed."""
+        refreshed = 0
+        while not self._stop.is_set():
+            with self._lock:
+                if not self._queue or self._queue[0][0] > time.time():
+                    return refreshed
+                _, combo = heapq.heappop(self._queue)
+            # Wait for budget, but wake up regularly so stop() is honoured
+            while not self.budget.acquire(timeout=1.0):
+                if self._stop.is_set():
+                    return refreshed
+            try:
+                self.refresh(combo)
+                self.stats["refreshes"] += 1
+                self.last_error.pop(combo, None)
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.last_error[combo] = str(e)
+            # Failed refreshes are retried on the next schedule rather than immediately
+            self.last_refresh[combo] = time.time()
+            refreshed += 1
+        return refreshed
+
+    def run_forever(self):
+        """Schedule and refresh until stop() is called."""
+        next_schedule = 0.0
+        while not self._stop.is_set():
+            if time.time() >= next_schedule:
+                self.reschedule()
+                next_schedule = time.time() + SCHEDULE_INTERVAL
+            self.run_once()
+            with self._lock:
+                next_due = self._queue[0][0] if self._queue else next_schedule
+            self._stop.wait(max(0.5, min(next_due, next_schedule) - time.time()))
+
+    def start(self):
+        """Run the scheduler in a daemon thread (no-op if it is already running)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name="prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        """Return queue depth, per-combination due and last refresh times, and counters."""
+        now = time.time()
+        with self._lock:
+            queue = sorted(self._queue)
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queue_depth": len(queue),
+            "due_now": sum(1 for due, _ in queue if due <= now),
+            "budget_tokens": round(self.budget.available(), 2),
+            "refreshes": self.stats["refreshes"],
+            "errors": self.stats["errors"],
+            "combinations": [
+                {
+                    "category": combo[0],
+                    "region": combo[1],
+                    "time_filter": combo[2],
+                    "max_results": combo[3],
+                    "due_in_s": round(due - now, 1),
+                    "last_refresh": time.strftime("%H:%M:%S", time.localtime(self.last_refresh[combo]))
+                    if combo in self.last_refresh else None,
+                    "last_error": self.last_error.get(combo)
+                }
+                for due, combo in queue
+            ]
+        }
+
+
+def get_tracker():
+    """Return the process-wide popularity tracker."""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = PopularityTracker()
+        return _tracker
+
+
+def record_search(category, region, time_filter, max_results):
+    """Count an interactive search towards the prefetch popularity ranking."""
+    get_tracker().record(category, region, time_filter, max_results)
+
+
+def get_scheduler(refresh, ttl_for):
+    """Return the process-wide scheduler, creating it with the given callbacks on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrefetchScheduler(refresh, ttl_for)
+        return _scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep popular news searches warm in the shared cache.")
+    parser.add_argument("--hot", type=int, default=HOT_COMBINATIONS,
+                        help="number of most searched combinations to keep warm")
+    parser.add_argument("--searches-per-minute", type=float, default=PREFETCH_SEARCHES_PER_MINUTE,
+                        help="global DuckDuckGo budget for background refreshes")
+    parser.add_argument("--report-every", type=float, default=60,
+                        help="seconds between status lines")
+    args = parser.parse_args()
+
+    # Imported here so the scheduler module itself stays free of Streamlit
+    from searcher import news_combo_ttl, refresh_news_combo
+
+    scheduler = PrefetchScheduler(
+        refresh_news_combo,
+        news_combo_ttl,
+        hot=args.hot,
+        searches_per_minute=args.searches_per_minute
+    ).start()
+    try:
+        while True:
+            time.sleep(args.report_every)
+            print(json.dumps(scheduler.snapshot()), flush=True)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
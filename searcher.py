@@ -1,7 +1,18 @@
 import streamlit as st
-from duckduckgo_search import DDGS
 import datetime
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from archive import get_archive
+from article import normalize
+from article_text import get_text_fetcher, post_from_article
+from cache import get_cache, make_key
+from ddgs_client import POOL_SIZE, get_client
+from dedup import StreamingDeduplicator, collapse_duplicates, simhash_fingerprints
+from facets import SORTS, WINDOWS, FacetIndex
+from prefetch import get_scheduler, record_search
+from thumbnails import THUMBNAIL_WIDTH, get_thumbnail_cache
+from tracing import current_span, span, traced
 
 # Define regions dictionary with region codes for DuckDuckGo
 REGIONS = {
@@ -17,28 +28,672 @@ REGIONS = {
     "Global": "wt-wt"
 }
 
+# News categories/areas offered in the category dropdown
+NEWS_AREAS = [
+    "World News",
+    "Technology",
+    "Business",
+    "Politics",
+    "Sports",
+    "Entertainment",
+    "Science",
+    "Health",
+    "Environment",
+    "Education"
+]
+
+# Region selector entry that fans the search out to every region at once
+ALL_REGIONS = "All regions"
+
+# Search modes offered at the top of the page
+LIVE_MODE = "🌐 Live news"
+ARCHIVE_MODE = "🗄️ Local archive"
+
+# Date windows for archive searches (days back from now, None for no limit)
+ARCHIVE_WINDOWS = {
+    "Any time": None,
+    "Last 24 hours": 1,
+    "Last week": 7,
+    "Last month": 30
+}
+
+# Bounds of the results-per-page slider (also enforced by the HTTP API)
+MIN_RESULTS = 5
+MAX_RESULTS = 30
+
+# Session state keys of the facet widgets, cleared when a new search starts
+FACET_KEYS = ("facet_sources", "facet_window", "facet_keyword", "facet_sort")
+
+# Full text of the top results shown is fetched in the background, ready for "Create AI Post"
+ARTICLE_PREFETCH = 20
+
+# How long "Create AI Post" waits for a page that is still downloading before using the snippet (seconds)
+POST_TEXT_WAIT = 3
+
+# Upper bound on concurrent region queries in multi-region mode: one per region, as long as the
+# DuckDuckGo pool has a connection for each (otherwise regions would wait for each other)
+MULTI_REGION_WORKERS = min(len(REGIONS), POOL_SIZE)
+
+# How long cached results stay fresh for each time filter (seconds).
+# Narrower time windows change faster, so they expire sooner.
+NEWS_CACHE_TTLS = {
+    "d": 10 * 60,
+    "w": 60 * 60,
+    "m": 6 * 60 * 60
+}
+
+# Expired results are still served (and refreshed in the background) for this many TTLs
+NEWS_CACHE_STALE_FACTOR = 6
+
+# Set THINKWHY_PREFETCH=1 to keep popular searches warm from a background thread
+PREFETCH_ENABLED = os.getenv("THINKWHY_PREFETCH") == "1"
+
+def build_query(topic, keywords=""):
+    """Format the search query to focus on news from the selected topic with optional keywords."""
+    query = f"{topic} news"
+    if keywords.strip():
+        query = f"{query} {keywords.strip()}"
+    return query
+
+def fetch_news(query, region="wt-wt", time_filter="d", max_results=10):
+    """Fetch news articles straight from DuckDuckGo as Article records, raising on failure."""
+    return normalize(get_client().news(query, region, time_filter, max_results))
+
+def news_cache_key(query, region, time_filter, max_results):
+    """Cache key shared by the batch and streaming search paths."""
+    # "articles": entries hold Article records, not the raw dicts stored under "news" keys
+    return make_key("articles", query.lower(), region, time_filter, max_results)
+
+def fetch_and_archive(query, region="wt-wt", time_filter="d", max_results=10, category=None):
+    """Fetch news live and queue the results for the local archive."""
+    results = fetch_news(query, region, time_filter, max_results)
+    get_archive().ingest(results, region=region, category=category)
+    return results
+
+def cached_news(query, region="wt-wt", time_filter="d", max_results=10, category=None):
+    """Return news for an already-built query through the shared cache, raising on failure."""
+    ttl = NEWS_CACHE_TTLS.get(time_filter, NEWS_CACHE_TTLS["d"])
+    return get_cache("news").get_or_fetch(
+        news_cache_key(query, region, time_filter, max_results),
+        lambda: fetch_and_archive(query, region, time_filter, max_results, category),
+        ttl=ttl,
+        stale_ttl=ttl * NEWS_CACHE_STALE_FACTOR,
+        stale_if_error=True
+    )
+
+def news_combo_ttl(combo):
+    """Cache TTL for a (category, region, time_filter, max_results) combination."""
+    return NEWS_CACHE_TTLS.get(combo[2], NEWS_CACHE_TTLS["d"])
+
+def refresh_news_combo(combo):
+    """Fetch a (category, region, time_filter, max_results) search and store it in the cache."""
+    category, region, time_filter, max_results = combo
+    query = build_query(category)
+    ttl = news_combo_ttl(combo)
+    get_cache("news").set(
+        news_cache_key(query, region, time_filter, max_results),
+        fetch_and_archive(query, region, time_filter, max_results, category),
+        ttl,
+        ttl * NEWS_CACHE_STALE_FACTOR
+    )
+
 def get_news(topic, keywords="", region="wt-wt", time_filter="d", max_results=10):
     """Fetch news articles related to the given topic using DuckDuckGo search."""
-    try:
-        with DDGS() as ddgs:
-            # Format the search query to focus on news from the selected topic with optional keywords
-            query = f"{topic} news"
-            if keywords.strip():
-                query = f"{query} {keywords.strip()}"
+    with span("news.get_news", region=region, max_results=max_results) as s:
+        try:
+            results = cached_news(build_query(topic, keywords), region, time_filter, max_results, category=topic)
+            s.set(results=len(results))
+            return results
+        except Exception as e:
+            s.fail(e)
+            st.error(f"Error fetching news: {e}")
+            return []
+
+def stream_news(topic, keywords="", region="wt-wt", time_filter="d", max_results=10):
+    """
+    Yield news articles one at a time as DuckDuckGo returns them, raising on failure.
+
+    Cached results are replayed immediately. A completed live stream is stored
+    in the same cache entry that get_news uses. Concurrent identical searches
+    (streamed or not) share one live fetch.
+    """
+    query = build_query(topic, keywords)
+    key = news_cache_key(query, region, time_filter, max_results)
+    ttl = NEWS_CACHE_TTLS.get(time_filter, NEWS_CACHE_TTLS["d"])
+    cache = get_cache("news")
+
+    cached, state = cache.lookup(key)
+    if state is not None:
+        if state == "stale":
+            cache.refresh_in_background(
+                key,
+                lambda: fetch_and_archive(query, region, time_filter, max_results, topic),
+                ttl,
+                ttl * NEWS_CACHE_STALE_FACTOR
+            )
+        # Fingerprinting a whole page at once leaves StreamingDeduplicator.add() only memo lookups
+        simhash_fingerprints(cached)
+        yield from cached
+        return
+
+    # While DuckDuckGo is failing, serve whatever we last stored for this search
+    if get_client().breaker.rejecting():
+        stored = cache.peek(key)
+        if stored is not None:
+            simhash_fingerprints(stored)
+            yield from stored
+            return
+
+    def fetch(publish):
+        results = []
+        for page in get_client().iter_news_pages(query, region, time_filter):
+            page = normalize(page[:max_results - len(results)])
+            simhash_fingerprints(page)
+            results.extend(page)
+            publish(list(results))
+            if len(results) >= max_results:
+                break
+        cache.set(key, results, ttl, ttl * NEWS_CACHE_STALE_FACTOR)
+        get_archive().ingest(results, region=region, category=topic)
+        return results
+
+    # Sessions running the same search at once follow one DuckDuckGo fetch,
+    # which finishes (and fills the cache) even if this reader stops early
+    flight = cache.flight.start(key, fetch)
+    sent = 0
+    for results in flight.updates():
+        yield from results[sent:]
+        sent = len(results)
+    yield from flight.result()[sent:]
+
+class NewsCursor:
+    """
+    Pages through one single-region search, keeping the DuckDuckGo client and
+    page position alive between "Load more" clicks.
+
+    The first page goes through stream_news (and therefore the cache). Later
+    pages continue DuckDuckGo's pagination right after the first page's
+    results, from one live page iterator kept for the rest of the search,
+    skipping any article already returned. The iterator holds no connection
+    between pages; each page borrows one from the shared client pool.
+    Latency for every page is kept in self.pages.
+    """
+
+    def __init__(self, topic, keywords="", region="wt-wt", time_filter="d"):
+        self.topic = topic
+        self.keywords = keywords
+        self.region = region
+        self.time_filter = time_filter
+        self.pages = []
+        self.exhausted = False
+        self._seen_urls = set()
+        self._live = None
+
+    def _live_articles(self, offset):
+        pages = get_client().iter_news_pages(build_query(self.topic, self.keywords), self.region, self.time_filter,
+                                             offset)
+        for page in pages:
+            page = normalize(page)
+            get_archive().ingest(page, region=self.region, category=self.topic)
+            simhash_fingerprints(page)
+            yield from page
+
+    def next_page(self, page_size):
+        """Yield up to page_size articles that earlier pages did not return."""
+        if self.pages:
+            if self._live is None:
+                # The first page was DuckDuckGo's first results, so pick up right after them
+                self._live = self._live_articles(self.pages[0]["articles"])
+            source = self._live
+        else:
+            source = stream_news(self.topic, self.keywords, self.region, self.time_filter, page_size)
+
+        start = time.perf_counter()
+        first_article_ms = None
+        count = 0
+        try:
+            for article in source:
+                if article.url in self._seen_urls:
+                    continue
+                self._seen_urls.add(article.url)
+                count += 1
+                if first_article_ms is None:
+                    first_article_ms = (time.perf_counter() - start) * 1000
+                yield article
+                if count >= page_size:
+                    break
+            else:
+                # DuckDuckGo has no more results for this search
+                self.exhausted = True
+        finally:
+            self.pages.append({
+                "page": len(self.pages) + 1,
+                "articles": count,
+                "first_article_ms": round(first_article_ms, 1) if first_article_ms is not None else None,
+                "total_ms": round((time.perf_counter() - start) * 1000, 1)
+            })
+
+def article_sort_key(article):
+    """Sort key that orders articles by publication date (undated articles last)."""
+    return article.timestamp if article.timestamp is not None else float("-inf")
+
+@traced("news.multi_region")
+def get_news_multi_region(topic, keywords="", regions=None, time_filter="d", max_results=10):
+    """
+    Search several regions concurrently and merge the results.
+
+    Returns (articles, reports): articles are deduplicated by URL and sorted
+    newest first, and reports holds one dict per region with its result
+    count, latency and error (if any).
+    """
+    if regions is None:
+        regions = REGIONS
+    query = build_query(topic, keywords)
+
+    def search_region(region_name):
+        client = get_client()
+        start = time.perf_counter()
+        waited_before = client.pool_wait_ms()
+        with span("news.region", region=regions[region_name]) as s:
+            try:
+                results = cached_news(query, regions[region_name], time_filter, max_results, category=topic)
+                error = None
+            except Exception as e:
+                s.fail(e)
+                results = []
+                error = str(e)
+        # Time spent waiting for a pooled connection is not the region's latency
+        latency_ms = (time.perf_counter() - start) * 1000 - (client.pool_wait_ms() - waited_before)
+        return region_name, results, latency_ms, error
+
+    articles = []
+    reports = []
+    seen_urls = set()
+    with ThreadPoolExecutor(max_workers=min(MULTI_REGION_WORKERS, len(regions))) as executor:
+        # map() keeps region order, so ties in the merged list are deterministic
+        for region_name, results, latency_ms, error in executor.map(search_region, regions):
+            reports.append({
+                "region": region_name,
+                "results": len(results),
+                "latency_ms": round(latency_ms, 1),
+                "error": error
+            })
+            for article in results:
+                if article.canonical_url in seen_urls:
+                    continue
+                seen_urls.add(article.canonical_url)
+                articles.append(article.replace(region=region_name))
+
+    # Exact duplicates across regions are dropped here; near-duplicates are collapsed later
+    articles.sort(key=article_sort_key, reverse=True)
+    return articles, reports
+
+def format_alternates(alternates):
+    """Markdown line listing the other outlets that ran the same story."""
+    return "Also reported by: " + ", ".join(f"[{alt['source']}]({alt['url']})" for alt in alternates)
+
+def show_thumbnail(slot, article, thumbnail):
+    """Draw a card image from its local thumbnail, falling back to the remote image."""
+    if thumbnail:
+        slot.image(thumbnail, width=THUMBNAIL_WIDTH)
+    elif article.image:
+        slot.image(article.image, width=THUMBNAIL_WIDTH)
+    else:
+        # Placeholder image if none available
+        slot.markdown("📄")
+
+@traced("render.card")
+def render_article(i, article, thumbnail=None, thumbnail_pending=False):
+    """
+    Render one news card.
+
+    Returns (image_slot, alternates_slot) so a thumbnail that is still
+    downloading, or duplicates that arrive later, can be added to the card.
+    """
+    with st.container():
+        st.markdown(f'<div class="news-item">', unsafe_allow_html=True)
+        
+        # Create responsive layout for article display
+        # For mobile: stack image and content vertically on small screens
+        # For desktop: keep side-by-side layout
+        img_col, content_col = st.columns([1, 3])
+        
+        with img_col:
+            st.markdown(f"**#{i}**")
+            image_slot = st.empty()
+            if thumbnail_pending:
+                image_slot.markdown("🖼️")
+            else:
+                show_thumbnail(image_slot, article, thumbnail)
+        
+        with content_col:
+            # Dates are parsed and formatted once, when the record is built
+            title = article.title or "No title"
+            url = article.url or "#"
+            body = article.body or "No description available"
             
-            # Search for news articles
-            results = list(ddgs.news(
-                query, 
-                region=region, 
-                safesearch="off", 
-                timelimit=time_filter,
-                max_results=max_results
-            ))
+            st.markdown(f"### [{title}]({url})")
+            st.markdown(f"**Source:** {article.source} | **Published:** {article.display_date}")
             
-            return results
+            # List the other outlets that ran the same story
+            alternates_slot = st.empty()
+            if article.alternates:
+                alternates_slot.caption(format_alternates(article.alternates))
+            
+            # Show snippet of the article body with "Read more" option
+            if len(body) > 150:  # Reduced preview length for mobile
+                with st.expander("Article Preview"):
+                    st.markdown(body)
+            else:
+                st.markdown(body)
+            
+            # Replace simple link with a styled button
+            st.markdown(f"""
+            <a href="{url}" target="_blank" style="
+                display: inline-block;
+                background-color: #4CAF50;
+                color: white;
+                text-align: center;
+                padding: 8px 16px;
+                text-decoration: none;
+                font-weight: bold;
+                border-radius: 4px;
+                margin-top: 8px;
+                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+                transition: all 0.2s ease;
+            ">Read Full Article</a>
+            """, unsafe_allow_html=True)
+            
+            if st.button("✍️ Create AI Post", key=f"create_post_{i}", help="Write an Instagram post about this article"):
+                create_post(article)
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+    
+    return image_slot, alternates_slot
+
+@traced("render.stream")
+def stream_cards(articles, deduplicator, alternates_slots):
+    """
+    Render cards for articles as they arrive, collapsing duplicates on the fly.
+
+    Returns (fetched_count, first_article_ms).
+    """
+    thumbnail_cache = get_thumbnail_cache()
+    pending_thumbnails = []
+    fetched_count = 0
+    first_article_ms = None
+    start = time.perf_counter()
+    try:
+        for article in articles:
+            fetched_count += 1
+            lead = deduplicator.add(article)
+            if lead is None:
+                if first_article_ms is None:
+                    first_article_ms = (time.perf_counter() - start) * 1000
+                # Cards render right away; thumbnails download in the background
+                card = deduplicator.leads[-1]
+                future = thumbnail_cache.submit(card.image) if card.image else None
+                image_slot, alternates_slot = render_article(
+                    len(deduplicator.leads), card, thumbnail_pending=future is not None
+                )
+                alternates_slots.append(alternates_slot)
+                if future is not None:
+                    pending_thumbnails.append((future, image_slot, card))
+            else:
+                # A syndicated copy of a story already on screen
+                alternates_slots[lead].caption(format_alternates(deduplicator.leads[lead].alternates))
+            
+            # Fill in thumbnails that finished downloading meanwhile
+            still_pending = []
+            for future, image_slot, card in pending_thumbnails:
+                if future.done():
+                    show_thumbnail(image_slot, card, future.result())
+                else:
+                    still_pending.append((future, image_slot, card))
+            pending_thumbnails = still_pending
     except Exception as e:
+        current_span().fail(e)
         st.error(f"Error fetching news: {e}")
-        return []
+    for future, image_slot, card in pending_thumbnails:
+        show_thumbnail(image_slot, card, future.result())
+    return fetched_count, first_article_ms
+
+def facet_filters():
+    """The facet widgets' current values, as FacetIndex.query arguments."""
+    state = st.session_state
+    return {
+        "sources": state.get("facet_sources", []),
+        "window": WINDOWS[state.get("facet_window", "Any time")],
+        "keyword": state.get("facet_keyword", ""),
+        "sort": SORTS[state.get("facet_sort", "Relevance")]
+    }
+
+def facets_active(filters):
+    """Whether any facet filter or a non-default sort is set."""
+    return bool(filters["sources"] or filters["window"] is not None or filters["keyword"].strip()
+                or filters["sort"] != "relevance")
+
+def show_facet_controls(slot, index, view):
+    """Facet widgets over the fetched results, with how many articles each choice would show."""
+    with slot.container():
+        with st.expander("🧮 Filter and sort these results", expanded=facets_active(facet_filters())):
+            col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+            with col1:
+                st.multiselect("📰 Sources", list(index.source_totals()), key="facet_sources",
+                               format_func=lambda source: f"{source} ({view.source_counts.get(source, 0)})")
+            with col2:
+                st.selectbox("⏱️ Published", list(WINDOWS), key="facet_window",
+                             format_func=lambda window: f"{window} ({view.window_counts[window]})")
+            with col3:
+                st.text_input("🔎 Within results", key="facet_keyword", placeholder="e.g., tariffs")
+            with col4:
+                st.selectbox("↕️ Sort by", list(SORTS), key="facet_sort")
+            st.caption(f"Showing {len(view.articles)} of {len(index)} articles • filtered in {view.elapsed_ms:.1f} ms, "
+                       "without searching again")
+
+def create_post(article):
+    """Hand the article's text (usually prefetched already) to the post helper and switch to it."""
+    text = get_text_fetcher().get(article.url, timeout=POST_TEXT_WAIT)
+    st.session_state.article_post = post_from_article(article, text)
+    st.switch_page("pages/post_helper.py")
+
+def prefetch_article_text(articles):
+    """Start fetching the full text of the first results on screen while they are being read."""
+    get_text_fetcher().prefetch(article.url for article in articles[:ARTICLE_PREFETCH])
+
+def request_more_results():
+    """Button callback: fetch the next page on the following (fragment) rerun."""
+    st.session_state.news_search["load_pending"] = True
+
+@st.fragment
+@traced("render.results")
+def show_results():
+    """
+    Render the current search results from session state.
+
+    Runs as a fragment, so "Load more" and the facet widgets only rerun this
+    section. Earlier cards are redrawn from session state and only the new
+    page is fetched. While a facet filter or sort is set, the cards shown
+    are the matching articles from the facet index.
+    """
+    search = st.session_state.get("news_search")
+    if search is None:
+        return
+    
+    keyword_note = ' with keywords: ' + search["keywords"] if search["keywords"] else ''
+    summary = st.empty()
+    controls = st.empty()
+    filters = facet_filters()
+    filtering = facets_active(filters)
+    index = search["facets"]
+    
+    if search["multi_region"]:
+        if search["load_pending"]:
+            search["load_pending"] = False
+            with st.spinner("🔄 Searching for latest news..."):
+                # Get news results (served from the cache when the same search ran recently)
+                search_start = time.perf_counter()
+                news_results, region_reports = get_news_multi_region(
+                    search["area"], 
+                    keywords=search["keywords"], 
+                    time_filter=search["time_code"], 
+                    max_results=search["page_size"]
+                )
+                search_ms = (time.perf_counter() - search_start) * 1000
+                
+                # Collapse syndicated copies of the same story into one card
+                dedup_start = time.perf_counter()
+                search["fetched_count"] = len(news_results)
+                with span("news.dedup", articles=len(news_results)):
+                    search["articles"] = collapse_duplicates(news_results)
+                dedup_ms = (time.perf_counter() - dedup_start) * 1000
+                search["region_reports"] = region_reports
+                search["timing"] = f"Fetched in {search_ms:.0f} ms • {search['fetched_count'] - len(search['articles'])} duplicates collapsed in {dedup_ms:.0f} ms"
+        
+        news_results = search["articles"]
+        
+        # Report each region's failure and latency separately
+        for report in search["region_reports"]:
+            if report["error"]:
+                st.warning(f"{report['region']}: {report['error']}")
+        with st.expander("🌎 Per-region results"):
+            st.dataframe(search["region_reports"])
+        
+        view = index.sync(news_results).query(**filters)
+        shown = view.articles if filtering else news_results
+        
+        # Cards render right away; thumbnails that are not on disk yet download in the background
+        thumbnail_cache = get_thumbnail_cache()
+        pending_thumbnails = []
+        for i, article in enumerate(shown, 1):
+            thumbnail = thumbnail_cache.cached_path(article.image) if article.image else None
+            future = thumbnail_cache.submit(article.image) if article.image and thumbnail is None else None
+            image_slot, _ = render_article(i, article, thumbnail, thumbnail_pending=future is not None)
+            if future is not None:
+                pending_thumbnails.append((future, image_slot, article))
+        prefetch_article_text(shown)
+        for future, image_slot, article in pending_thumbnails:
+            show_thumbnail(image_slot, article, future.result())
+        timing = search["timing"]
+    else:
+        cursor = search["cursor"]
+        deduplicator = search["deduplicator"]
+        thumbnail_cache = get_thumbnail_cache()
+        
+        if filtering:
+            # Filtered views are drawn from the facet index, after any new page is in
+            if search["load_pending"]:
+                search["load_pending"] = False
+                with st.spinner("🔄 Searching for latest news..."):
+                    for article in cursor.next_page(search["page_size"]):
+                        search["fetched_count"] += 1
+                        deduplicator.add(article)
+            view = index.sync(deduplicator.leads).query(**filters)
+            for i, article in enumerate(view.articles, 1):
+                thumbnail = thumbnail_cache.cached_path(article.image) if article.image else None
+                render_article(i, article, thumbnail)
+        else:
+            # Earlier pages are redrawn from session state; their thumbnails are already on disk
+            alternates_slots = []
+            for i, article in enumerate(deduplicator.leads, 1):
+                thumbnail = thumbnail_cache.cached_path(article.image) if article.image else None
+                alternates_slots.append(render_article(i, article, thumbnail)[1])
+            
+            if search["load_pending"]:
+                search["load_pending"] = False
+                # Stream the new page so each card shows up as soon as its page arrives
+                status = st.empty()
+                status.info("🔄 Searching for latest news...")
+                fetched_count, _ = stream_cards(cursor.next_page(search["page_size"]), deduplicator, alternates_slots)
+                search["fetched_count"] += fetched_count
+                status.empty()
+            view = index.sync(deduplicator.leads).query(**filters)
+        prefetch_article_text(view.articles if filtering else deduplicator.leads)
+        
+        news_results = deduplicator.leads
+        last_page = cursor.pages[-1] if cursor.pages else None
+        timing = ""
+        if last_page and last_page["first_article_ms"] is not None:
+            timing = f"Page {last_page['page']}: first article after {last_page['first_article_ms']:.0f} ms • page in {last_page['total_ms']:.0f} ms • "
+        timing += f"{search['fetched_count'] - len(news_results)} duplicates collapsed"
+        
+        if news_results and not cursor.exhausted:
+            st.button("⬇️ Load more results", on_click=request_more_results)
+        if cursor.pages:
+            with st.expander("📄 Page fetch latency"):
+                st.dataframe(cursor.pages)
+    
+    if filtering and news_results and not view.articles:
+        st.info("No fetched articles match these filters. Widen them to see more.")
+    
+    if news_results:
+        show_facet_controls(controls, index, view)
+        with summary.container():
+            st.success(f"Found {len(news_results)} news articles for '{search['area']}'{keyword_note}")
+            
+            # Display filtering message
+            st.markdown(f"*Showing results for {search['area']} from {search['region']}, {search['time_label'].lower()}*")
+            st.caption(timing)
+    else:
+        summary.warning(f"No news found for '{search['area']}'{keyword_note}. Try another topic or check your connection.")
+
+def show_archive_search():
+    """Full-text search over every article fetched so far, without touching DuckDuckGo."""
+    archive = get_archive()
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        text = st.text_input("🔍 Search archived articles", 
+                             placeholder="e.g., election results, chip exports",
+                             key="archive_text")
+        sources = st.multiselect("📰 Sources", archive.top_sources(), key="archive_sources")
+    with col2:
+        window = st.selectbox("⏱️ Published", list(ARCHIVE_WINDOWS.keys()), key="archive_window")
+        limit = st.slider("📊 Maximum Number of Results", 5, 100, 20, key="archive_limit")
+    
+    since = None
+    if ARCHIVE_WINDOWS[window] is not None:
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=ARCHIVE_WINDOWS[window])
+    
+    search_start = time.perf_counter()
+    results = archive.search(text, since=since, sources=sources, limit=limit)
+    search_ms = (time.perf_counter() - search_start) * 1000
+    
+    if results:
+        st.success(f"Found {len(results)} archived articles{' matching: ' + text if text.strip() else ''}")
+        st.caption(f"Searched {archive.snapshot()['articles']} archived articles in {search_ms:.1f} ms")
+        
+        # Only locally cached thumbnails are used; archive search stays offline
+        thumbnail_cache = get_thumbnail_cache()
+        for i, article in enumerate(results, 1):
+            thumbnail = thumbnail_cache.cached_path(article.image) if article.image else None
+            render_article(i, article, thumbnail)
+    else:
+        st.info("No archived articles match. Articles are archived as you run live searches.")
+
+def show_footer():
+    """Search tips and shared cache counters."""
+    st.markdown("---")
+    with st.expander("💡 Tips for better searching"):
+        st.markdown("""
+        - Try using specific keywords to narrow down your search
+        - Change the region to get localized news
+        - Adjust the time period to find historical news
+        - Use the local archive to look up stories you've already seen, instantly
+        """)
+    
+    # Cache counters shared by every session in this process
+    with st.expander("⚡ Cache and client statistics"):
+        stats = {
+            "duckduckgo": get_client().snapshot(),
+            "news": get_cache("news").snapshot(),
+            "thumbnails": get_thumbnail_cache().snapshot(),
+            "article_text": get_text_fetcher().snapshot(),
+            "archive": get_archive().snapshot()
+        }
+        if PREFETCH_ENABLED:
+            stats["prefetch"] = get_scheduler(refresh_news_combo, news_combo_ttl).snapshot()
+        st.json(stats)
 
 def main():
     # Set page config with custom theme
@@ -156,26 +811,23 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
+    # Background refreshes of popular searches (one scheduler thread per process)
+    if PREFETCH_ENABLED:
+        get_scheduler(refresh_news_combo, news_combo_ttl).start()
+    
+    # Live DuckDuckGo search or offline search over the local archive
+    search_mode = st.radio("Search mode", [LIVE_MODE, ARCHIVE_MODE], horizontal=True, label_visibility="collapsed")
+    if search_mode == ARCHIVE_MODE:
+        show_archive_search()
+        show_footer()
+        return
+    
     # Create responsive columns for the search filters
     col1, col2 = st.columns([1, 1])
     
     with col1:
-        # List of news categories/areas
-        news_areas = [
-            "World News",
-            "Technology",
-            "Business",
-            "Politics",
-            "Sports",
-            "Entertainment",
-            "Science",
-            "Health",
-            "Environment",
-            "Education"
-        ]
-        
         # Dropdown for selecting news area
-        selected_area = st.selectbox("📋 Select News Category", news_areas)
+        selected_area = st.selectbox("📋 Select News Category", NEWS_AREAS)
         
         # Keywords input
         keywords = st.text_input("🔍 Add Specific Keywords (optional)", 
@@ -184,7 +836,7 @@ def main():
     with col2:
         # Region selection
         selected_region = st.selectbox("🌎 Select Region", 
-                                       list(REGIONS.keys()), 
+                                       list(REGIONS.keys()) + [ALL_REGIONS], 
                                        index=list(REGIONS.keys()).index("Global"))
         
         # Time filter
@@ -197,110 +849,46 @@ def main():
                                    list(time_options.keys()),
                                    index=0)
     
-    # Number of results slider
-    max_results = st.slider("📊 Maximum Number of Results", 5, 30, 10)
+    # Number of results slider (per page; "Load more" fetches further pages)
+    max_results = st.slider("📊 Maximum Number of Results", MIN_RESULTS, MAX_RESULTS, 10)
     
     # Search button - take full width
     search_button = st.button("🔎 Search News")
     
-    # Search results section
+    # Start a new search; results and the paging cursor live in the session
     if search_button:
-        # Convert user selections to API parameters
-        region_code = REGIONS[selected_region]
-        time_code = time_options[time_filter]
+        # Plain category searches count towards what the prefetch scheduler keeps warm
+        if not keywords.strip():
+            searched_regions = REGIONS.values() if selected_region == ALL_REGIONS else [REGIONS[selected_region]]
+            for region_code in searched_regions:
+                record_search(selected_area, region_code, time_options[time_filter], max_results)
         
-        with st.spinner("🔄 Searching for latest news..."):
-            # Get news results
-            news_results = get_news(
-                selected_area, 
-                keywords=keywords, 
-                region=region_code, 
-                time_filter=time_code, 
-                max_results=max_results
-            )
-            
-            if news_results:
-                st.success(f"Found {len(news_results)} news articles for '{selected_area}'{' with keywords: ' + keywords if keywords else ''}")
-                
-                # Display filtering message
-                st.markdown(f"*Showing results for {selected_area} from {selected_region}, {time_filter.lower()}*")
-                
-                # Display results
-                for i, article in enumerate(news_results, 1):
-                    with st.container():
-                        st.markdown(f'<div class="news-item">', unsafe_allow_html=True)
-                        
-                        # Create responsive layout for article display
-                        # For mobile: stack image and content vertically on small screens
-                        # For desktop: keep side-by-side layout
-                        img_col, content_col = st.columns([1, 3])
-                        
-                        with img_col:
-                            st.markdown(f"**#{i}**")
-                            if "image" in article and article["image"]:
-                                st.image(article["image"], width=150)
-                            else:
-                                # Placeholder image if none available
-                                st.markdown("📄")
-                        
-                        with content_col:
-                            title = article.get("title", "No title")
-                            url = article.get("url", "#")
-                            source = article.get("source", "Unknown source")
-                            date = article.get("date", "Unknown date")
-                            body = article.get("body", "No description available")
-                            
-                            # Format the date if it's in ISO format
-                            formatted_date = date
-                            try:
-                                if date != "Unknown date":
-                                    # Parse the ISO 8601 timestamp
-                                    dt = datetime.datetime.fromisoformat(date.replace('Z', '+00:00'))
-                                    # Format it as a readable string
-                                    formatted_date = dt.strftime("%b %d, %Y • %I:%M %p")
-                            except:
-                                # If parsing fails, use the original date string
-                                formatted_date = date
-                            
-                            st.markdown(f"### [{title}]({url})")
-                            st.markdown(f"**Source:** {source} | **Published:** {formatted_date}")
-                            
-                            # Show snippet of the article body with "Read more" option
-                            if len(body) > 150:  # Reduced preview length for mobile
-                                with st.expander("Article Preview"):
-                                    st.markdown(body)
-                            else:
-                                st.markdown(body)
-                            
-                            # Replace simple link with a styled button
-                            st.markdown(f"""
-                            <a href="{url}" target="_blank" style="
-                                display: inline-block;
-                                background-color: #4CAF50;
-                                color: white;
-                                text-align: center;
-                                padding: 8px 16px;
-                                text-decoration: none;
-                                font-weight: bold;
-                                border-radius: 4px;
-                                margin-top: 8px;
-                                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                                transition: all 0.2s ease;
-                            ">Read Full Article</a>
-                            """, unsafe_allow_html=True)
-                        
-                        st.markdown('</div>', unsafe_allow_html=True)
-            else:
-                st.warning(f"No news found for '{selected_area}'{' with keywords: ' + keywords if keywords else ''}. Try another topic or check your connection.")
+        # Facet choices belong to the previous result set
+        for key in FACET_KEYS:
+            st.session_state.pop(key, None)
+        
+        st.session_state.news_search = {
+            "area": selected_area,
+            "keywords": keywords,
+            "region": selected_region,
+            "time_label": time_filter,
+            "page_size": max_results,
+            "multi_region": selected_region == ALL_REGIONS,
+            "cursor": None if selected_region == ALL_REGIONS else NewsCursor(
+                selected_area, keywords, REGIONS[selected_region], time_options[time_filter]
+            ),
+            "time_code": time_options[time_filter],
+            "deduplicator": StreamingDeduplicator(),
+            "facets": FacetIndex(),
+            "fetched_count": 0,
+            "load_pending": True
+        }
+    
+    # Search results section
+    show_results()
     
     # Footer with tips
-    st.markdown("---")
-    with st.expander("💡 Tips for better searching"):
-        st.markdown("""
-        - Try using specific keywords to narrow down your search
-        - Change the region to get localized news
-        - Adjust the time period to find historical news
-        """)
+    show_footer()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,139 @@
+import threading
+
+
+class Flight:
+    """
+    One in-flight call. Callers that arrive while it runs wait for its
+    result (and can follow its progress) instead of making their own call.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.done = False
+        self.value = None
+        self.error = None
+        self.progress = None
+        self._version = 0
+
+    def publish(self, progress):
+        """Make partial output (e.g. the text or articles so far) visible to followers."""
+        with self._cond:
+            self.progress = progress
+            self._version += 1
+            self._cond.notify_all()
+
+    def finish(self, value=None, error=None):
+        with self._cond:
+            self.value = value
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def updates(self):
+        """Yield the published progress each time it changes, until the call finishes."""
+        seen = 0
+        while True:
+            with self._cond:
+                while self._version == seen and not self.done:
+                    self._cond.wait()
+                if self._version == seen:
+                    return
+                seen = self._version
+                progress = self.progress
+            # Yield outside the lock so a slow reader never blocks the producer
+            yield progress
+
+    def result(self):
+        """Wait for the call and return its value, raising its exception if it failed."""
+        with self._cond:
+            while not self.done:
+                self._cond.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    call, everyone arriving before it finishes shares that result (or error).
+    Nothing is kept once the call finishes; caching is the caller's job.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def _join(self, key):
+        """Return (flight, leader), registering a new flight when none is running for key."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.stats["coalesced"] += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.stats["calls"] += 1
+            return flight, True
+
+    def _finish(self, key, flight, value=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(value, error)
+
+    def do(self, key, fn, on_progress=None):
+        """
+        Return fn() for key, running it only if no call for key is in flight.
+
+        Callers that join a running call get its result; on_progress(progress)
+        is called in the joining caller's thread for each publish() of the
+        running call.
+        """
+        flight, leader = self._join(key)
+        if not leader:
+            if on_progress is not None:
+                for progress in flight.updates():
+                    on_progress(progress)
+            return flight.result()
+        try:
+            value = fn()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, value)
+        return value
+
+    def start(self, key, fn):
+        """
+        Run fn(publish) for key in a background thread unless a call for key is
+        already in flight, and return the Flight to follow either way.
+
+        Unlike do(), the call runs to completion even if the caller stops
+        reading, so nobody following it is left waiting.
+        """
+        flight, leader = self._join(key)
+        if leader:
+            def run():
+                try:
+                    value = fn(flight.publish)
+                except BaseException as e:
+                    self._finish(key, flight, error=e)
+                    return
+                self._finish(key, flight, value)
+
+            threading.Thread(target=run, daemon=True).start()
+        return flight
+
+    def publish(self, key, progress):
+        """Publish progress for the call in flight for key (no-op if there is none)."""
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is not None:
+            flight.publish(progress)
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
@@ -0,0 +1,202 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import CACHE_DIR
+from tracing import span
+
+# Thumbnails are stored at the card width used by searcher.render_article
+THUMBNAIL_WIDTH = 150
+THUMBNAIL_QUALITY = 80
+
+# Total size of stored thumbnails before the least recently used ones are evicted
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+# Remote images larger than this are not downloaded at all
+MAX_SOURCE_BYTES = 15 * 1024 * 1024
+
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = (3, 8)  # (connect, read) seconds
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+class ThumbnailCache:
+    """
+    Downloads article images, shrinks them to card size and keeps them on disk.
+
+    Thumbnails are content-addressed: each file is named after the SHA-256 of
+    its bytes, so the same picture reused by several outlets is stored once.
+    A SQLite index maps source URLs to digests and tracks sizes and last use
+    for eviction.
+    """
+
+    def __init__(self, directory=None, width=THUMBNAIL_WIDTH, max_bytes=MAX_CACHE_BYTES, workers=FETCH_WORKERS):
+        self.directory = directory or os.path.join(CACHE_DIR, "thumbnails")
+        self.width = width
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        # requests and Pillow are imported here rather than at module level to keep app start-up light
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        # One pooled session shared by every fetch keeps connections alive per host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (compatible; ThinkWhyNewsAgent/1.0)"
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sources (url TEXT, width INTEGER, digest TEXT, "
+                "PRIMARY KEY (url, width))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, last_used REAL)"
+            )
+            self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        self.stats = {"hits": 0, "fetched": 0, "failed": 0, "bytes_downloaded": 0, "bytes_stored": 0, "evicted": 0}
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, digest[:2], f"{digest}.webp")
+
+    def cached_path(self, url):
+        """Return the local thumbnail path for url if it is already cached, else None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest FROM sources WHERE url = ? AND width = ?", (url, self.width)
+            ).fetchone()
+            if row is None:
+                return None
+            path = self._blob_path(row[0])
+            if not os.path.exists(path):
+                return None
+            self._db.execute("UPDATE blobs SET last_used = ? WHERE digest = ?", (time.time(), row[0]))
+            self._db.commit()
+            self.stats["hits"] += 1
+        return path
+
+    def _download(self, url):
+        with self.session.get(url, timeout=FETCH_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) > MAX_SOURCE_BYTES:
+                    raise ValueError("image too large")
+        return bytes(data)
+
+    def _shrink(self, data):
+        from PIL import Image
+
+        with Image.open(io.BytesIO(data)) as image:
+            # draft() lets JPEG decode at reduced scale, which is much cheaper for big photos
+            image.draft("RGB", (self.width * 2, self.width * 2))
+            image = image.convert("RGB")
+            if image.width > self.width:
+                height = max(1, round(image.height * self.width / image.width))
+                image = image.resize((self.width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, format="WEBP", quality=THUMBNAIL_QUALITY, method=4)
+        return out.getvalue()
+
+    def _store(self, url, thumbnail):
+        digest = hashlib.sha256(thumbnail).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(thumbnail)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            is_new = self._db.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone() is None
+            self._db.execute(
+                "INSERT OR REPLACE INTO blobs (digest, size, last_used) VALUES (?, ?, ?)",
+                (digest, len(thumbnail), time.time()),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (url, width, digest) VALUES (?, ?, ?)",
+                (url, self.width, digest),
+            )
+            self._db.commit()
+            if is_new:
+                self._total_bytes += len(thumbnail)
+                self.stats["bytes_stored"] += len(thumbnail)
+        self._evict()
+        return path
+
+    def _evict(self):
+        """Delete least recently used thumbnails until the cache fits in max_bytes."""
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return
+            rows = self._db.execute("SELECT digest, size FROM blobs ORDER BY last_used").fetchall()
+            for digest, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                self._db.execute("DELETE FROM sources WHERE digest = ?", (digest,))
+                self._total_bytes -= size
+                self.stats["evicted"] += 1
+            self._db.commit()
+
+    def get(self, url):
+        """Return a local thumbnail path for url, downloading it if needed (None on failure)."""
+        path = self.cached_path(url)
+        if path is not None:
+            return path
+        try:
+            with span("thumbnail.fetch"):
+                data = self._download(url)
+                path = self._store(url, self._shrink(data))
+        except Exception:
+            with self._lock:
+                self.stats["failed"] += 1
+            return None
+        with self._lock:
+            self.stats["fetched"] += 1
+            self.stats["bytes_downloaded"] += len(data)
+        return path
+
+    def submit(self, url):
+        """Start fetching a thumbnail in the background and return its future."""
+        return self.executor.submit(self.get, url)
+
+    def get_many(self, urls):
+        """Fetch thumbnails for several URLs concurrently; returns {url: path or None}."""
+        unique = list(dict.fromkeys(u for u in urls if u))
+        return dict(zip(unique, self.executor.map(self.get, unique)))
+
+    def snapshot(self):
+        """Return counters plus the current on-disk size."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["cache_bytes"] = self._total_bytes
+        return stats
+
+
+def get_thumbnail_cache():
+    """Return the process-wide thumbnail cache."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = ThumbnailCache()
+        return _instance
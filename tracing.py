@@ -0,0 +1,333 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from cache import CACHE_DIR
+
+# Exporters to enable at startup, comma separated: "memory", "jsonl", "otel" ("1" means memory).
+# Tracing is off when this is unset.
+TRACE_EXPORTERS = os.getenv("THINKWHY_TRACE", "")
+
+# Where the jsonl exporter appends spans (override with THINKWHY_TRACE_PATH)
+TRACE_PATH = os.getenv("THINKWHY_TRACE_PATH", os.path.join(CACHE_DIR, "traces.jsonl"))
+
+# Spans kept by the in-memory exporter (the metrics page reads from here)
+RING_SIZE = 20000
+
+# None while tracing is disabled; span() and traced() only check this
+_tracer = None
+_tracer_lock = threading.Lock()
+
+_current = contextvars.ContextVar("thinkwhy_span", default=None)
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, exc):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """
+    One timed stage. Used as a context manager; an exception leaving the
+    block marks the span as failed (and is re-raised).
+
+    Nested spans in the same thread share trace_id and point at their
+    parent through parent_id.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration_ms", "error", "attributes",
+                 "_tracer", "_started", "_token")
+
+    def __init__(self, tracer, name, attributes):
+        self._tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.error = None
+        self.duration_ms = None
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = os.urandom(8).hex()
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self._tracer.export(self)
+        return False
+
+    def set(self, **attributes):
+        """Add attributes, e.g. results that are only known inside the block."""
+        self.attributes.update(attributes)
+
+    def fail(self, exc):
+        """Mark the span as failed for an exception that is handled inside the block."""
+        self.error = type(exc).__name__
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class RingBufferExporter:
+    """Keeps the most recent spans in memory, as dicts."""
+
+    name = "memory"
+
+    def __init__(self, size=RING_SIZE):
+        self._spans = deque(maxlen=size)
+
+    def export(self, span):
+        # deque.append is atomic, so no lock is needed
+        self._spans.append(span.to_dict())
+
+    def spans(self):
+        return list(self._spans)
+
+    def clear(self):
+        self._spans.clear()
+
+
+class JsonlExporter:
+    """Appends one JSON object per span to a file."""
+
+    name = "jsonl"
+
+    def __init__(self, path=TRACE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def spans(self, limit=RING_SIZE):
+        return read_jsonl(self.path, limit)
+
+
+class OpenTelemetryExporter:
+    """
+    Re-emits finished spans through the OpenTelemetry API, so whatever SDK
+    and exporter (OTLP, Jaeger, console...) the process configured receives
+    them. Needs the opentelemetry-api package.
+
+    Spans are exported once they end, after their children, so nesting is
+    carried in the thinkwhy.trace_id / thinkwhy.parent_id attributes rather
+    than in OpenTelemetry's own context.
+    """
+
+    name = "otel"
+
+    def __init__(self, tracer=None):
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer("thinkwhy")
+
+    def export(self, span):
+        attributes = {key: value for key, value in span.attributes.items()
+                      if isinstance(value, (str, bool, int, float))}
+        attributes["thinkwhy.trace_id"] = span.trace_id
+        attributes["thinkwhy.span_id"] = span.span_id
+        if span.parent_id is not None:
+            attributes["thinkwhy.parent_id"] = span.parent_id
+        start_ns = int(span.start * 1e9)
+        otel_span = self._tracer.start_span(span.name, start_time=start_ns, attributes=attributes)
+        if span.error is not None:
+            otel_span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error))
+        otel_span.end(end_time=start_ns + int(span.duration_ms * 1e6))
+
+
+EXPORTERS = {
+    "memory": RingBufferExporter,
+    "jsonl": JsonlExporter,
+    "otel": OpenTelemetryExporter
+}
+
+
+class Tracer:
+    """Creates spans and hands each finished one to every exporter."""
+
+    def __init__(self, exporters):
+        self.exporters = list(exporters)
+
+    def span(self, name, attributes):
+        return Span(self, name, attributes)
+
+    def export(self, span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                # A broken exporter must never break the traced code
+                pass
+
+
+def span(name, **attributes):
+    """
+    Context manager timing a stage: `with span("news.fetch", region=region) as s: ...`.
+
+    While tracing is disabled this returns a shared no-op object, so the
+    cost is one global lookup.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP
+    return tracer.span(name, attributes)
+
+
+def current_span():
+    """The innermost open span in this thread (a no-op span when there is none)."""
+    if _tracer is None:
+        return _NOOP
+    return _current.get() or _NOOP
+
+
+def traced(name):
+    """Decorator wrapping each call of the function in span(name)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return fn(*args, **kwargs)
+            with tracer.span(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def configure(exporters):
+    """Start tracing to the given exporter objects (an empty list disables tracing)."""
+    global _tracer
+    with _tracer_lock:
+        _tracer = Tracer(exporters) if exporters else None
+
+
+def enable(names):
+    """Start tracing to the named exporters ("memory", "jsonl", "otel")."""
+    configure([EXPORTERS[name]() for name in names])
+
+
+def enabled():
+    return _tracer is not None
+
+
+def exporter(name):
+    """Return the active exporter with this name, or None."""
+    tracer = _tracer
+    if tracer is None:
+        return None
+    return next((e for e in tracer.exporters if e.name == name), None)
+
+
+def read_jsonl(path=TRACE_PATH, limit=RING_SIZE):
+    """Return the last limit spans written by the jsonl exporter."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except json.JSONDecodeError:
+            # A line cut short by a crash
+            continue
+    return spans
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def stage_stats(spans):
+    """
+    Per-stage latency summary of span dicts: count, error rate,
+    p50/p95/p99/max in milliseconds and throughput (spans per minute over
+    the time the spans cover). Sorted by total time spent, largest first.
+    """
+    by_name = {}
+    for s in spans:
+        by_name.setdefault(s["name"], []).append(s)
+    if not spans:
+        return []
+    window_minutes = max((max(s["start"] for s in spans) - min(s["start"] for s in spans)) / 60, 1 / 60)
+
+    rows = []
+    for name, group in by_name.items():
+        durations = sorted(s["duration_ms"] for s in group)
+        errors = sum(1 for s in group if s["error"])
+        rows.append({
+            "stage": name,
+            "count": len(group),
+            "error_rate": round(errors / len(group), 3),
+            "p50_ms": round(_percentile(durations, 0.50), 1),
+            "p95_ms": round(_percentile(durations, 0.95), 1),
+            "p99_ms": round(_percentile(durations, 0.99), 1),
+            "max_ms": round(durations[-1], 1),
+            "per_minute": round(len(group) / window_minutes, 2),
+            "total_ms": round(sum(durations), 1)
+        })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+
+def timeline(spans, bucket_seconds=60):
+    """
+    Bucket span dicts by start time. Returns {metric: {stage: {bucket_start: value}}}
+    for the metrics "p95_ms", "error_rate" and "count".
+    """
+    buckets = {}
+    for s in spans:
+        bucket = int(s["start"] // bucket_seconds * bucket_seconds)
+        buckets.setdefault((s["name"], bucket), []).append(s)
+
+    series = {"p95_ms": {}, "error_rate": {}, "count": {}}
+    for (name, bucket), group in buckets.items():
+        durations = sorted(s["duration_ms"] for s in group)
+        series["p95_ms"].setdefault(name, {})[bucket] = round(_percentile(durations, 0.95), 1)
+        series["error_rate"].setdefault(name, {})[bucket] = round(sum(1 for s in group if s["error"]) / len(group), 3)
+        series["count"].setdefault(name, {})[bucket] = len(group)
+    return series
+
+
+if TRACE_EXPORTERS:
+    enable(["memory" if name.strip() == "1" else name.strip() for name in TRACE_EXPORTERS.split(",") if name.strip()])